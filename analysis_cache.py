@@ -0,0 +1,164 @@
+""" Keeps the linked node lists of previous runs on disk, keyed by the
+    contents of the ELF file, the identity of the objdump utility and the
+    analysis options. Opening an unchanged ELF file skips objdump entirely.
+
+    The latest run of each ELF file is also found by its location, so a
+    rebuilt file can be analyzed relative to its previous contents.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import time
+from enum import IntEnum
+from pathlib import Path
+
+
+# Bumped whenever the cached state or its key changes
+CACHE_VERSION = 6
+
+# Eviction limits, the oldest entries are removed first
+CACHE_SIZE = 512 * 1024 * 1024 # bytes
+CACHE_AGE = 30 * 24 * 60 * 60 # seconds
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_file_hash(filename):
+    """ Returns the SHA-256 digest of a file's contents
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_tool_identity(tool):
+    """ Returns a description of an external tool that changes when the tool
+        is replaced; its resolved location, size and modification time
+    """
+    location = shutil.which(str(tool))
+    if location is None:
+        return str(tool)
+
+    status = os.stat(location)
+    return '{}:{}:{}'.format(Path(location).resolve(), status.st_size, status.st_mtime_ns)
+
+
+class StatePickler(pickle.Pickler):
+    """ Saves enum members as plain integers. A member refers to its class
+        by module, which is '__main__' in whichever script is run, so an
+        entry could only be read back by the same script.
+    """
+    def reducer_override(self, obj):
+        if isinstance(obj, IntEnum):
+            return int, (int(obj),)
+        return NotImplemented
+
+
+class AnalysisCache:
+    """ Directory of cache entries, one pickled state per key
+    """
+    def __init__(self, path, max_size=CACHE_SIZE, max_age=CACHE_AGE):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def get_key(self, infile, tool, options):
+        """ Returns the key of an analysis
+
+            options: sequence of the option values affecting the result
+        """
+        digest = hashlib.sha256()
+        for field in [CACHE_VERSION, get_file_hash(infile), get_tool_identity(tool)] + list(options):
+            digest.update(repr(field).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get_source_key(self, infile, tool, options):
+        """ Returns the key of the latest analysis of a file location,
+            whatever its contents
+        """
+        digest = hashlib.sha256()
+        for field in [CACHE_VERSION, str(Path(infile).resolve()), get_tool_identity(tool)] + list(options):
+            digest.update(repr(field).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get_file(self, key):
+        return self.path / (key + '.pickle')
+
+    def get_latest_file(self, source):
+        return self.path / (source + '.latest')
+
+    def load(self, key):
+        """ Returns the state saved under a key, or None
+        """
+        filename = self.get_file(key)
+        try:
+            with open(filename, 'rb') as handle:
+                state = pickle.load(handle)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+        # Recently used entries are the last to be evicted
+        os.utime(filename)
+        return state
+
+    def load_latest(self, source):
+        """ Returns the state saved by the latest analysis of a file
+            location, or None
+        """
+        try:
+            key = self.get_latest_file(source).read_text()
+        except OSError:
+            return None
+        return self.load(key)
+
+    def save(self, key, state, source=None):
+        """ Saves a state under a key, then evicts old entries. Enum members
+            are read back as integers.
+
+            source: key of the file location, the state becomes its latest
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        filename = self.get_file(key)
+        temporary = filename.with_suffix('.tmp')
+        with open(temporary, 'wb') as handle:
+            StatePickler(handle, protocol=pickle.HIGHEST_PROTOCOL).dump(state)
+        # Readers never see a partially written entry
+        os.replace(temporary, filename)
+
+        if source is not None:
+            latest = self.get_latest_file(source)
+            temporary = latest.with_suffix('.tmp')
+            temporary.write_text(key)
+            os.replace(temporary, latest)
+        self.evict()
+
+    def evict(self):
+        """ Removes entries unused for longer than the age limit, then the
+            least recently used entries until the size limit is met
+        """
+        now = time.time()
+        entries = []
+        for filename in self.path.glob('*.pickle'):
+            status = filename.stat()
+            if now - status.st_mtime > self.max_age:
+                filename.unlink()
+            else:
+                entries.append((status.st_mtime, status.st_size, filename))
+
+        entries.sort()
+        total = sum(size for mtime, size, filename in entries)
+        for mtime, size, filename in entries[:-1]:
+            if total <= self.max_size:
+                break
+            filename.unlink()
+            total -= size
+
+        # Forget the latest run of a location once its state is evicted
+        for latest in self.path.glob('*.latest'):
+            if not self.get_file(latest.read_text()).exists():
+                latest.unlink()
@@ -0,0 +1,305 @@
+""" Extracts direct branches and calls from ARM and Thumb-2 machine code,
+    bypassing the text disassembly. Instructions are decoded in bulk over
+    NumPy arrays of halfwords (Thumb) or words (ARM).
+"""
+import numpy as np
+
+from elf_reader import SectionFlag
+
+
+def sign_extend(value, bits):
+    """ Sign extends a vector of unsigned fields of the given width
+    """
+    return value - ((value >> (bits - 1)) & 1) * (1 << bits)
+
+
+def get_boundaries(hw):
+    """ Returns masks of the 16-bit instructions and of the first halfword
+        of the 32-bit instructions in a block of Thumb halfwords
+    """
+    index = np.arange(len(hw))
+
+    # Halfwords 0b11101, 0b11110 and 0b11111 begin a 32-bit instruction.
+    # The halfword preceding any run of such prefixes ends an instruction,
+    # so every run begins on an instruction boundary and alternates between
+    # first and second halfwords from there.
+    prefix = (hw >> 11) >= 0x1D
+    run_start = np.maximum.accumulate(np.where(prefix, 0, index + 1))
+    first = prefix & ((index - run_start) % 2 == 0)
+    first[-1:] = False
+    narrow = ~prefix
+    narrow[1:] &= ~first[:-1]
+    return narrow, first
+
+
+def decode_thumb(data, address):
+    """ Returns (sites, targets) for each direct branch in a block of Thumb
+        code: B, B<c>, CBZ, CBNZ, B.W, B<c>.W, BL and BLX.
+
+        data: contents starting on an instruction boundary
+        address: address of the first byte of data
+    """
+    hw = np.frombuffer(data, dtype='<u2', count=len(data) // 2).astype(np.int64)
+    index = np.arange(len(hw))
+    pc = address + 2 * index + 4
+    narrow, first = get_boundaries(hw)
+
+    sites = []
+    targets = []
+
+    # B T2, unconditional
+    match = narrow & ((hw & 0xF800) == 0xE000)
+    sites.append(index[match])
+    targets.append(pc[match] + 2 * sign_extend(hw[match] & 0x7FF, 11))
+
+    # B<c> T1, excluding UDF and SVC
+    cond = (hw >> 8) & 0xF
+    match = narrow & ((hw & 0xF000) == 0xD000) & (cond < 0xE)
+    sites.append(index[match])
+    targets.append(pc[match] + 2 * sign_extend(hw[match] & 0xFF, 8))
+
+    # CBZ, CBNZ, forward only
+    match = narrow & ((hw & 0xF500) == 0xB100)
+    value = hw[match]
+    sites.append(index[match])
+    targets.append(pc[match] + (((value >> 9) & 1) << 6) + (((value >> 3) & 0x1F) << 1))
+
+    # 32-bit branches share the first halfword encoding 0b11110
+    position = index[first]
+    first[first] = (hw[position] & 0xF800) == 0xF000
+    position = index[first]
+    h1 = hw[position]
+    h2 = hw[position + 1]
+    sign = (h1 >> 10) & 1
+    j1 = (h2 >> 13) & 1
+    j2 = (h2 >> 11) & 1
+
+    # B.W T4, BL and BLX share the 25 bit offset
+    i1 = 1 - (j1 ^ sign)
+    i2 = 1 - (j2 ^ sign)
+    offset = sign_extend((sign << 24) | (i1 << 23) | (i2 << 22) |
+                         ((h1 & 0x3FF) << 12) | ((h2 & 0x7FF) << 1), 25)
+
+    match = ((h2 & 0xD000) == 0x9000) | ((h2 & 0xD000) == 0xD000)
+    sites.append(position[match])
+    targets.append(pc[position[match]] + offset[match])
+
+    # BLX switches to ARM state, target is word aligned
+    match = (h2 & 0xD001) == 0xC000
+    sites.append(position[match])
+    targets.append((pc[position[match]] & ~3) + offset[match])
+
+    # B<c>.W T3, excluding other instructions in condition field 0b111x
+    cond = (h1 >> 6) & 0xF
+    match = ((h2 & 0xD000) == 0x8000) & (cond < 0xE)
+    offset = sign_extend((sign << 20) | (j2 << 19) | (j1 << 18) |
+                         ((h1 & 0x3F) << 12) | ((h2 & 0x7FF) << 1), 21)
+    sites.append(position[match])
+    targets.append(pc[position[match]] + offset[match])
+
+    return order(address + 2 * np.concatenate(sites), np.concatenate(targets))
+
+
+def decode_arm(data, address):
+    """ Returns (sites, targets) for each direct branch in a block of ARM
+        code: B, BL and BLX (immediate).
+    """
+    word = np.frombuffer(data, dtype='<u4', count=len(data) // 4).astype(np.int64)
+    site = address + 4 * np.arange(len(word))
+
+    match = ((word >> 25) & 0x7) == 0x5
+    word = word[match]
+    site = site[match]
+    offset = sign_extend(word & 0xFFFFFF, 24) << 2
+
+    # BLX encodes half of the target offset in place of the link bit
+    blx = (word >> 28) == 0xF
+    offset += np.where(blx, ((word >> 24) & 1) << 1, 0)
+
+    return order(site, site + 8 + offset)
+
+
+def order(sites, targets):
+    """ Sorts branches by the address of the instruction
+    """
+    index = np.argsort(sites, kind='stable')
+    return sites[index], targets[index]
+
+
+def get_branches(elf, section, start, end, state):
+    """ Returns (sites, targets) for each direct branch in a code region of
+        an ELF file.
+    """
+    offset = section.offset + start - section.address
+    data = memoryview(elf.image)[offset:offset + end - start]
+
+    if state == 't':
+        return decode_thumb(data, start)
+    return decode_arm(data, start)
+
+
+def get_instructions(elf, section, start, end):
+    """ Returns (sites, codes, branch) for each instruction in a Thumb code
+        region of an ELF file; its address, its first halfword, and whether
+        it is a direct branch. The first halfword is what the disassembly
+        reader tokenizes an instruction to.
+    """
+    offset = section.offset + start - section.address
+    data = memoryview(elf.image)[offset:offset + end - start]
+    hw = np.frombuffer(data, dtype='<u2', count=len(data) // 2).astype(np.int64)
+    narrow, first = get_boundaries(hw)
+    index = np.flatnonzero(narrow | first)
+
+    sites = start + 2 * index
+    branches, targets = decode_thumb(data, start)
+    return sites, hw[index], contains(np.unique(branches), sites)
+
+
+def get_owners(owners, sites):
+    """ Returns the nearest owner address at or below each site, or -1
+
+        owners: sorted list of node addresses
+    """
+    owners = np.asarray(owners, dtype=np.int64)
+    if len(owners) == 0:
+        return np.full(len(sites), -1, dtype=np.int64)
+    index = np.searchsorted(owners, sites, side='right') - 1
+    return np.where(index >= 0, owners[np.maximum(index, 0)], -1)
+
+
+def get_literal_code(elf, owners, functions):
+    """ Yields (site, code, branch, owner) for each Thumb instruction of the
+        functions holding a literal pool load, LDR rt, [pc, #imm], in
+        address order; see get_instructions().
+
+        owners: sorted list of node addresses
+        functions: sorted list of function addresses
+    """
+    for section, start, end, state in elf.get_code_regions():
+        if state != 't':
+            continue
+
+        sites, codes, branches = get_instructions(elf, section, start, end)
+        callers = get_owners(owners, sites)
+        traced = np.unique(callers[(codes & 0xF800) == 0x4800])
+        traced = traced[contains(functions, traced)]
+        selected = contains(traced, callers)
+        yield from zip(sites[selected].tolist(), codes[selected].tolist(),
+                       branches[selected].tolist(), callers[selected].tolist())
+
+
+def within(starts, stops, values):
+    """ Returns a mask of the values inside one of the sorted, disjoint
+        [start, stop) ranges
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    index = np.searchsorted(starts, values, side='right') - 1
+    valid = index >= 0
+    valid[valid] = values[valid] < stops[index[valid]]
+    return valid
+
+
+def get_edges(elf, owners):
+    """ Yields (caller, target) for each direct branch in the executable
+        sections of an ELF file, in address order. The caller is the nearest
+        owner address at or below the branch.
+
+        owners: sorted list of node addresses
+    """
+    owners = np.asarray(owners, dtype=np.int64)
+    if len(owners) == 0:
+        return
+
+    for section, start, end, state in elf.get_code_regions():
+        if state == 'd':
+            continue
+
+        sites, targets = get_branches(elf, section, start, end, state)
+
+        index = np.searchsorted(owners, sites, side='right') - 1
+        valid = index >= 0
+        callers = owners[index[valid]]
+        yield from zip(callers.tolist(), targets[valid].tolist())
+
+
+def contains(keys, values):
+    """ Returns a mask of the values present in a sorted array of keys
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    if len(keys) == 0:
+        return np.zeros(len(values), dtype=bool)
+    index = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+    return keys[index] == values
+
+
+def get_words(elf, start, end):
+    """ Returns (sites, words) for each aligned 32-bit word within an
+        address range of an ELF file
+    """
+    start = (start + 3) & ~3
+    data = elf.read(start, max(end - start, 0))
+    words = np.frombuffer(data, dtype=elf.endian + 'u4', count=len(data) // 4)
+    sites = start + 4 * np.arange(len(words), dtype=np.int64)
+    return sites, words.astype(np.int64)
+
+
+def get_owned_words(elf, regions, owners):
+    """ Returns (sites, owners, words) for each aligned 32-bit word in the
+        regions, paired with the nearest owner address at or below the word.
+        Words without an owner in the same region are dropped.
+
+        regions: list of (start, end) address ranges
+        owners: sorted list of node addresses
+    """
+    owners = np.asarray(owners, dtype=np.int64)
+    result = ([], [], [])
+    for start, end in regions:
+        sites, words = get_words(elf, start, end)
+        index = np.searchsorted(owners, sites, side='right') - 1
+        valid = index >= 0
+        valid[valid] = owners[index[valid]] >= start
+        result[0].append(sites[valid])
+        result[1].append(owners[index[valid]])
+        result[2].append(words[valid])
+
+    if not regions:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in result)
+    return tuple(np.concatenate(column) for column in result)
+
+
+def get_data_regions(elf, sections):
+    """ Returns the (start, end) address range of each named section
+    """
+    return [(section.address, section.address + section.size)
+            for section in elf.sections if section.name in sections]
+
+
+def get_literal_regions(elf):
+    """ Returns the (start, end) address ranges holding data within the
+        executable sections. Sections without data mapping symbols are
+        returned whole, as literal pools cannot be told apart from code.
+    """
+    regions = []
+    mapped = set()
+    for section, start, end, state in elf.get_code_regions():
+        if state == 'd':
+            regions.append((start, end))
+            mapped.add(section.name)
+
+    for section in elf.sections:
+        if section.flags & SectionFlag.execinstr and section.size and not section.name in mapped:
+            regions.append((section.address, section.address + section.size))
+    return sorted(regions)
+
+
+def get_function_pointers(words, functions, addresses):
+    """ Returns the function each word points to, or -1. Pointers to Thumb
+        functions have the least significant bit set.
+
+        functions: sorted list of function addresses
+        addresses: sorted list of all node addresses
+    """
+    arm = contains(functions, words)
+    thumb = ~contains(addresses, words) & contains(functions, words - 1)
+    return np.where(arm, words, np.where(thumb, words - 1, -1))
@@ -0,0 +1,400 @@
+""" Micro-benchmarks for the analysis hot paths. Runs without an ARM
+    toolchain, using the recorded objdump transcripts of the unit tests or
+    synthetic transcripts.
+
+    python benchmark.py > bench_output.txt
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from pathlib import Path
+
+import binary_format as bf
+import fixtures
+import node_generator as ng
+from converter import Converter, jsonKeys2int
+from search_index import SearchIndex
+from stack_analyzer import StackAnalyzer
+from transcript_generator import Transcript, TranscriptNode
+
+
+def helper_record(line):
+    """ Classifies a raw line the way link() did before the tokenizer;
+        decode, then the chain of string helpers
+    """
+    line = str(line, encoding='utf-8')
+    if ng.is_node_start(line):
+        return (ng.LineType.header, ng.get_node_address(line), -1, -1)
+    address = ng.get_line_address(line, ':')
+    pointer = ng.get_pointer(line)
+    if ng.is_node_branch(line):
+        return (ng.LineType.branch, address, pointer, ng.get_branch_address(line))
+    if pointer != -1:
+        return (ng.LineType.word, address, pointer, -1)
+    return (ng.LineType.other, address, pointer, -1)
+
+
+def helper_symbol(line):
+    """ Decodes a raw symbol line the way build() did before the tokenizer
+    """
+    line = str(line, encoding='utf-8')
+    if ng.is_symbol_line(line):
+        return (ng.get_symbol_address(line), ng.get_symbol_section(line),
+                ng.get_symbol_size(line), ng.get_symbol_name(line))
+    return None
+
+
+def list_link(nodes, parent, child):
+    """ Links a branch the way link_to_function() did before the edge sets;
+        a linear search of the branch list
+    """
+    if child != -1:
+        child = child if child % 2 == 0 else child - 1
+        if child in nodes:
+            if nodes[child]['type'] == ng.NodeType.function:
+                if ( not child in nodes[parent]['branch'] ):
+                    nodes[parent]['branch'].append(child)
+                    nodes[child]['root'] = False
+
+
+def get_dispatcher(callees):
+    """ Returns a node list holding one dispatcher function, at address 0,
+        and its callees
+    """
+    nodes = {}
+    for address in range(0, 4 * (callees + 1), 4):
+        nodes[address] = {'name': 'f' + str(address), 'section': '.text',
+            'size': 4, 'type': ng.NodeType.function,
+            'scope': ng.SymbolScope.glb, 'root': True, 'branch': []}
+    return nodes
+
+
+def get_layers(count):
+    """ Returns a node list of layers holding two functions, each calling
+        both functions of the next layer; 2^count call paths
+    """
+    nodes = {}
+    for layer in range(count):
+        for address in (2 * layer, 2 * layer + 1):
+            nodes[address] = {'name': 'f' + str(address), 'section': '.text',
+                'size': 4, 'type': ng.NodeType.function,
+                'scope': ng.SymbolScope.glb, 'root': layer == 0,
+                'branch': [2 * layer + 2, 2 * layer + 3] if layer + 1 < count else []}
+    return nodes
+
+
+def get_firmware(count):
+    """ Returns a node list of count functions, each calling up to four
+        functions at higher addresses
+    """
+    random.seed(0)
+    nodes = {}
+    for address in range(0x08000000, 0x08000000 + 4 * count, 4):
+        nodes[address] = {'name': 'HAL_Function_' + hex(address),
+            'section': '.text', 'size': 4, 'type': ng.NodeType.function,
+            'scope': ng.SymbolScope.glb, 'root': True, 'branch': [],
+            'stack': random.randint(0, 256)}
+    addresses = list(nodes)
+    for index, address in enumerate(addresses[:-1]):
+        for child in random.sample(addresses[index + 1:], min(4, len(addresses) - index - 1)):
+            nodes[address]['branch'].append(child)
+            nodes[child]['root'] = False
+    return nodes
+
+
+def measure(function, repeat):
+    """ Returns the best wall time of several runs, in seconds
+    """
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def report(name, baseline, result):
+    """ Prints one benchmark result
+    """
+    print("{:<24} baseline: {:9.3f} ms   result: {:9.3f} ms   speedup: {:5.2f}x".format(
+        name, baseline * 1000, result * 1000, baseline / result))
+
+
+def bench_tokenize(scale, repeat):
+    lines = list(fixtures.read_fixture(fixtures.DISASSEMBLY)) * scale
+    baseline = measure(lambda: [helper_record(line) for line in lines], repeat)
+    result = measure(lambda: [ng.tokenize(line) for line in lines], repeat)
+    report("tokenize", baseline, result)
+
+
+def bench_tokenize_symbol(scale, repeat):
+    lines = list(fixtures.read_fixture(fixtures.SYMBOLS)) * scale
+    baseline = measure(lambda: [helper_symbol(line) for line in lines], repeat)
+    result = measure(lambda: [ng.tokenize_symbol(line) for line in lines], repeat)
+    report("tokenize_symbol", baseline, result)
+
+
+def bench_link_to_function(scale, repeat):
+    # A generated state machine; one function calling every callee from
+    # several call sites, in Thumb state
+    callees = 10 * scale
+    random.seed(0)
+    calls = [4 * random.randint(1, callees) + 1 for _ in range(4 * callees)]
+
+    def baseline():
+        nodes = get_dispatcher(callees)
+        for child in calls:
+            list_link(nodes, 0, child)
+
+    def result():
+        node = ng.Node()
+        node.nodes = get_dispatcher(callees)
+        for child in calls:
+            node.link_to_function(0, child)
+
+    report("link_to_function", measure(baseline, repeat), measure(result, repeat))
+
+
+def bench_worst_case(scale, repeat):
+    # Expanding every path is exponential in depth, keep it bounded
+    nodes = get_layers(14)
+
+    def baseline():
+        graph = Converter()
+        graph.set_nodes(nodes)
+        graph.to_call_list()
+
+    def result():
+        analyzer = StackAnalyzer(nodes)
+        for root in analyzer.get_roots():
+            analyzer.get_worst(root)
+
+    report("worst_case", measure(baseline, repeat), measure(result, repeat))
+
+
+def bench_search(scale, repeat):
+    # Names assembled from common firmware words, 100 per scale step
+    words = ['HAL', 'UART', 'I2C', 'SPI', 'DMA', 'Init', 'Transmit', 'Receive',
+             'IRQHandler', 'Callback', 'Start', 'Stop', 'Config', 'GPIO', 'TIM']
+    random.seed(0)
+    nodes = {}
+    for address in range(0, 400 * scale, 4):
+        name = '_'.join(random.sample(words, 3)) + str(address)
+        nodes[address] = {'name': name, 'type': ng.NodeType.function,
+                          'root': True, 'branch': []}
+    index = SearchIndex(nodes)
+    queries = ['uart_dma', 'callback', 'IRQHandler_Init', 'spi_tran', 'zzz']
+
+    def baseline():
+        for text in queries:
+            text = text.lower()
+            [(node['name'], key) for key, node in nodes.items()
+             if text in node['name'].lower()][:100]
+
+    def result():
+        for text in queries:
+            index.find(text)
+
+    report("search", measure(baseline, repeat), measure(result, repeat))
+
+
+def report_size(name, baseline, result):
+    """ Prints the size of one benchmark's files
+    """
+    print("{:<24} baseline: {:9.1f} kB   result: {:9.1f} kB   ratio: {:7.2f}x".format(
+        name, baseline / 1000, result / 1000, baseline / result))
+
+
+def bench_serialize(scale, repeat):
+    nodes = get_firmware(10 * scale)
+    graph = Converter()
+    graph.set_nodes(get_layers(14))
+    graph.to_call_list()
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory)
+        for name, data, save, load in (
+            ('nodes', nodes, bf.save_nodes, bf.load_nodes),
+            ('graph', graph.get_graph(), bf.save_graph, bf.load_graph)):
+            text = root / (name + '.json')
+            binary = root / (name + '.bin')
+            compressed = root / (name + '.zbin')
+
+            def save_json():
+                with open(text, 'w') as handle:
+                    json.dump(data, handle, indent=4)
+
+            def load_json():
+                with open(text, 'r') as handle:
+                    return json.load(handle, object_hook=jsonKeys2int)
+
+            json_save = measure(save_json, repeat)
+            report(name + " save", json_save, measure(lambda: save(binary, data), repeat))
+            report(name + " save compressed", json_save,
+                   measure(lambda: save(compressed, data, True), repeat))
+
+            # Node lists are read on access, as from a mapped file; call
+            # graphs are rebuilt in full
+            json_load = measure(load_json, repeat)
+            report(name + " load", json_load, measure(lambda: load(binary), repeat))
+            report(name + " load compressed", json_load, measure(lambda: load(compressed), repeat))
+
+            report_size(name + " size", text.stat().st_size, binary.stat().st_size)
+            report_size(name + " size compressed", text.stat().st_size,
+                        compressed.stat().st_size)
+
+
+def report_phase(name, wall, peak):
+    """ Prints the wall time and peak memory of one analysis phase, when
+        the peak is known
+    """
+    if peak is None:
+        print("{:<24} wall: {:9.3f} ms   peak:       n/a".format(name, wall * 1000))
+    else:
+        print("{:<24} wall: {:9.3f} ms   peak: {:9.1f} MB".format(
+            name, wall * 1000, peak / 1000000))
+
+
+def bench_phases(scale, repeat):
+    # 10 functions per scale step, -s 100 to -s 50000 spans 1k to 500k
+    # functions. The transcripts are streamed from files, as from objdump.
+    transcript = Transcript(10 * scale)
+    phases = [
+        ('build', lambda node: node.build()),
+        ('link', lambda node: node.link()),
+        ('stack analysis', lambda node: StackAnalyzer(node.get_nodes()).analyze()),
+        ('compact', lambda node: node.compact()),
+        ('search index', lambda node: SearchIndex(node.get_nodes())),
+        ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        transcript.save(directory)
+
+        walls = {name: float('inf') for name, phase in phases}
+        for _ in range(repeat):
+            node = TranscriptNode(transcript, directory)
+            for name, phase in phases:
+                start = timeit.default_timer()
+                phase(node)
+                walls[name] = min(walls[name], timeit.default_timer() - start)
+
+        # Memory is traced in a run of its own, tracing slows every
+        # allocation
+        peaks = {}
+        node = TranscriptNode(transcript, directory)
+        tracemalloc.start()
+        for name, phase in phases:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            phase(node)
+            peaks[name] = tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+
+    print("{} functions, {} nodes".format(len(transcript.names), len(node.get_nodes())))
+    for name, phase in phases:
+        report_phase(name, walls[name], peaks[name])
+
+
+def bench_indirect(scale, repeat):
+    # 10 functions and one dispatch table per scale step
+    node = TranscriptNode(Transcript(10 * scale, tables=scale))
+    node.build()
+    node.link()
+
+    def baseline():
+        # Nested loops over the dictionaries, as once sketched in link()
+        indirect = {}
+        for address, target in zip(*node.loads):
+            for site, entry in node.dispatch_table.items():
+                if site != target:
+                    continue
+                targets = indirect.setdefault(address, [])
+                for other, candidate in node.dispatch_table.items():
+                    if other == site or (site == entry['table'] and
+                                         candidate['table'] == site):
+                        if not candidate['function'] in targets:
+                            targets.append(candidate['function'])
+        return indirect
+
+    report("indirect", measure(baseline, repeat),
+           measure(lambda: node.set_indirect(node.loads), repeat))
+
+
+def bench_call_list(scale, repeat):
+    # Independent roots, each over layers of its own; 10 roots per scale step
+    nodes = {}
+    for root in range(10 * scale):
+        for key, node in get_layers(8).items():
+            node['branch'] = [child + 100 * root for child in node['branch']]
+            nodes[key + 100 * root] = node
+    jobs = os.cpu_count() or 1
+
+    def call_list(jobs):
+        graph = Converter()
+        graph.set_nodes(nodes)
+        graph.to_call_list(jobs)
+
+    report("call_list {} jobs".format(jobs), measure(lambda: call_list(1), repeat),
+           measure(lambda: call_list(jobs), repeat))
+
+
+def bench_startup(scale, repeat):
+    # Fresh interpreters; the report mode against the modules the viewer
+    # mode adds. Peak memory as reported by the interpreter itself, where
+    # the resource module is available.
+    def start(modules):
+        code = ("try:\n    import resource\nexcept ImportError:\n    resource = None\n"
+                "import " + modules + "\n"
+                "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else -1)")
+        start = timeit.default_timer()
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        wall = timeit.default_timer() - start
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            return wall, None, lines[-1] if lines else "exit status {}".format(result.returncode)
+        peak = int(result.stdout)
+        return wall, peak * 1024 if peak >= 0 else None, None
+
+    for name, modules in (('startup report', 'stack_checker'),
+                          ('startup viewer', 'stack_checker, viewer, graphviz')):
+        # Optional modules, such as graphviz, may not be installed
+        runs = [start(modules)]
+        if runs[0][2] is not None:
+            print("{:<24} skipped: {}".format(name, runs[0][2]))
+            continue
+        runs += [start(modules) for _ in range(repeat - 1)]
+        peaks = [run[1] for run in runs if run[1] is not None]
+        report_phase(name, min(run[0] for run in runs), min(peaks) if peaks else None)
+
+
+BENCHMARKS = {
+    'tokenize': bench_tokenize,
+    'tokenize_symbol': bench_tokenize_symbol,
+    'link_to_function': bench_link_to_function,
+    'worst_case': bench_worst_case,
+    'search': bench_search,
+    'serialize': bench_serialize,
+    'phases': bench_phases,
+    'indirect': bench_indirect,
+    'call_list': bench_call_list,
+    'startup': bench_startup,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis hot paths.")
+    parser.add_argument('-s', '--scale', type=int, default=1000,
+        help="Number of times each input is replicated")
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+        help="Number of runs, the best is reported")
+    parser.add_argument('benchmark', nargs='*', choices=[[]] + list(BENCHMARKS),
+        help="Benchmarks to run, all by default")
+    args = parser.parse_args()
+
+    for name in args.benchmark or BENCHMARKS:
+        BENCHMARKS[name](args.scale, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
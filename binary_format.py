@@ -0,0 +1,284 @@
+""" Compact binary files for node lists and call graphs, in place of the
+    indented JSON files written by Node.save() and Converter.save().
+
+    A file holds a header then named blocks, each the raw contents of an
+    array. Blocks are aligned to 8 bytes, so an uncompressed file is memory
+    mapped and its arrays are read in place, without parsing or copying.
+    Compressed files are inflated into memory first.
+
+    Also converts files between this format and JSON:
+    python binary_format.py -i something.graph.json -o something.graph.bin
+"""
+import argparse
+import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+from node_table import NodeTable
+
+
+MAGIC_NODES = b'SCNODES\0'
+MAGIC_GRAPH = b'SCGRAPH\0'
+VERSION = 1
+
+# magic, version, flags, number of blocks
+HEADER = struct.Struct('<8sBBxxI')
+# name, array typecode, length in bytes
+BLOCK = struct.Struct('<4ssxxxQ')
+
+FLAG_COMPRESSED = 1
+FLAG_BIG_ENDIAN = 2
+
+# Node table columns, by block name
+COLUMNS = {
+    b'addr': 'addresses',
+    b'ordr': 'order',
+    b'name': 'names',
+    b'sect': 'sections',
+    b'size': 'sizes',
+    b'type': 'types',
+    b'scop': 'scopes',
+    b'root': 'roots',
+    b'offs': 'offsets',
+    b'targ': 'targets',
+    }
+
+# Attributes given to every entry of a call graph by the converter
+ENTRY_KEYS = ('level', 'address', 'recursion')
+
+
+def get_padding(length):
+    return -length % 8
+
+
+def write_blocks(filename, magic, blocks, compress=False):
+    """ Writes a file of named blocks
+
+        blocks: sequence of (name, array), bytes are written as typecode 'B'
+    """
+    payload = bytearray()
+    for name, data in blocks:
+        if isinstance(data, (bytes, bytearray)):
+            data = array('B', data)
+        raw = data.tobytes()
+        payload += BLOCK.pack(name, data.typecode.encode(), len(raw))
+        payload += raw
+        payload += bytes(get_padding(len(raw)))
+
+    flags = FLAG_BIG_ENDIAN if sys.byteorder == 'big' else 0
+    if compress:
+        flags |= FLAG_COMPRESSED
+        payload = zlib.compress(payload)
+
+    with open(filename, 'wb') as handle:
+        handle.write(HEADER.pack(magic, VERSION, flags, len(blocks)))
+        handle.write(payload)
+
+
+def read_blocks(filename, magic):
+    """ Returns {name: array or memoryview} read from a file of named blocks.
+        Uncompressed blocks in native byte order are views of the memory
+        mapped file.
+    """
+    with open(filename, 'rb') as handle:
+        header = handle.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError("Not a binary file: " + str(filename))
+        file_magic, version, flags, count = HEADER.unpack(header)
+        if file_magic != magic:
+            raise ValueError("Unexpected file type: " + str(filename))
+        if version != VERSION:
+            raise ValueError("Unsupported version {}: {}".format(version, filename))
+
+        if flags & FLAG_COMPRESSED:
+            image = zlib.decompress(handle.read())
+            base = 0
+        else:
+            # The map outlives the file handle
+            image = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            base = HEADER.size
+
+    swap = bool(flags & FLAG_BIG_ENDIAN) != (sys.byteorder == 'big')
+    view = memoryview(image)
+    blocks = {}
+    offset = base
+    for _ in range(count):
+        name, typecode, length = BLOCK.unpack_from(view, offset)
+        offset += BLOCK.size
+        data = view[offset:offset + length]
+        typecode = typecode.decode()
+        if swap and typecode != 'B':
+            data = array(typecode, data.tobytes())
+            data.byteswap()
+        else:
+            data = data.cast(typecode)
+        blocks[name] = data
+        offset += length + get_padding(length)
+    return blocks
+
+
+def get_table_blocks(table):
+    """ Returns the blocks holding a node table
+    """
+    blocks = [(name, getattr(table, column)) for name, column in COLUMNS.items()]
+    blocks.append((b'strs', '\0'.join(table.strings).encode('utf-8')))
+    extra = {str(address): attributes for address, attributes in table.extra.items()}
+    blocks.append((b'xtra', json.dumps(extra, separators=(',', ':')).encode('utf-8')))
+    return blocks
+
+
+def set_table_blocks(table, blocks):
+    """ Sets the columns of a node table from blocks
+    """
+    for name, column in COLUMNS.items():
+        setattr(table, column, blocks[name])
+    strings = bytes(blocks[b'strs']).decode('utf-8')
+    table.strings = strings.split('\0') if len(table.addresses) else []
+    extra = json.loads(bytes(blocks[b'xtra']).decode('utf-8'))
+    table.extra = {int(address): attributes for address, attributes in extra.items()}
+    return table
+
+
+def save_nodes(filename, nodes, compress=False):
+    """ Saves a node list, a NodeTable or dictionary of nodes
+    """
+    if not isinstance(nodes, NodeTable):
+        nodes = NodeTable(nodes)
+    write_blocks(filename, MAGIC_NODES, get_table_blocks(nodes), compress)
+
+
+def load_nodes(filename):
+    """ Returns the NodeTable saved in a file
+    """
+    return set_table_blocks(NodeTable(), read_blocks(filename, MAGIC_NODES))
+
+
+def save_graph(filename, graph, compress=False):
+    """ Saves a call graph, as generated by Converter.to_call_list()
+
+        Entries are stored in depth first order, as the address, level,
+        number of children and recursion flag of each. The attributes
+        copied from the node list are stored once per address, in a node
+        table.
+    """
+    nodes = {}
+    addresses = array('q')
+    levels = array('I')
+    counts = array('I')
+    recursion = array('B')
+
+    work = list(reversed(graph.values()))
+    while work:
+        entry = work.pop()
+        children = [child for child in entry.values() if isinstance(child, dict)]
+        address = entry['address']
+        addresses.append(address)
+        levels.append(entry['level'])
+        counts.append(len(children))
+        recursion.append(entry['recursion'])
+        if not address in nodes:
+            node = {key: value for key, value in entry.items()
+                    if not key in ENTRY_KEYS and not isinstance(value, dict)}
+            node['root'] = False
+            node['branch'] = []
+            nodes[address] = node
+        work.extend(reversed(children))
+
+    blocks = get_table_blocks(NodeTable(nodes))
+    blocks += [(b'tadr', addresses), (b'tlev', levels), (b'tcnt', counts),
+               (b'trec', recursion)]
+    write_blocks(filename, MAGIC_GRAPH, blocks, compress)
+
+
+def load_graph(filename):
+    """ Returns the call graph saved in a file, as nested dictionaries keyed
+        by address
+    """
+    blocks = read_blocks(filename, MAGIC_GRAPH)
+    table = set_table_blocks(NodeTable(), blocks)
+
+    graph = {}
+    # [entry, number of children still to be read], the graph is never
+    # exhausted
+    work = [[graph, -1]]
+    for address, level, count, recursion in zip(blocks[b'tadr'], blocks[b'tlev'],
+                                                blocks[b'tcnt'], blocks[b'trec']):
+        parent = work[-1]
+        entry = table[address]
+        del entry['branch']
+        del entry['root']
+        entry['level'] = level
+        entry['address'] = address
+        entry['recursion'] = bool(recursion)
+        parent[0][address] = entry
+        parent[1] -= 1
+
+        if count:
+            work.append([entry, count])
+        else:
+            while work[-1][1] == 0:
+                work.pop()
+    return graph
+
+
+def is_binary(filename):
+    """ Returns True if a file is in this format
+    """
+    with open(filename, 'rb') as handle:
+        return handle.read(8) in (MAGIC_NODES, MAGIC_GRAPH)
+
+
+def to_binary(infile, outfile, compress=False):
+    """ Converts a JSON node list or call graph to this format
+    """
+    # Imported here, the converter imports this module
+    from converter import jsonKeys2int
+
+    with open(infile, 'r') as handle:
+        data = json.load(handle, object_hook=jsonKeys2int)
+
+    # Call graph entries have a level, nodes a branch list
+    if any('level' in entry for entry in data.values()):
+        save_graph(outfile, data, compress)
+    else:
+        save_nodes(outfile, data, compress)
+
+
+def to_json(infile, outfile):
+    """ Converts a node list or call graph in this format to JSON, as Node
+        and Converter save them
+    """
+    with open(infile, 'rb') as handle:
+        magic = handle.read(8)
+    if magic == MAGIC_GRAPH:
+        data = load_graph(infile)
+    else:
+        data = dict(load_nodes(infile))
+
+    with open(outfile, 'w') as handle:
+        json.dump(data, handle, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert node lists and call graphs between JSON and binary files.")
+    parser.add_argument('-i', '--infile', required=True, type=Path,
+        help="Input file, JSON or binary; the other format is written")
+    parser.add_argument('-o', '--outfile', required=True, type=Path,
+        help="Output file")
+    parser.add_argument('-c', '--compress', action='store_true',
+        help="Compress the binary file")
+    args = parser.parse_args()
+
+    if is_binary(args.infile):
+        to_json(args.infile, args.outfile)
+    else:
+        to_binary(args.infile, args.outfile, args.compress)
+
+
+if __name__ == "__main__":
+    main()
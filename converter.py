@@ -2,12 +2,14 @@
 """
 import argparse
 import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import binary_format
 from node_generator import NodeType
+from stack_analyzer import StackAnalyzer
 from pathlib import Path
 from enum import auto, Enum
 
-from graphviz import Digraph
-
 
 class RecursionType(Enum):
     none = auto()
@@ -24,14 +26,17 @@ def validate_input():
     """ Validate user input by verifying file can be opened.
     """
     parser.add_argument('-i', '--infile', 
-                        help="input file, JSON format", metavar="FILE",
+                        help="input file, JSON or binary format", metavar="FILE",
                         type=argparse.FileType('r', encoding='UTF-8'), 
                         required=True)
 
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Number of processes generating the call graph")
+
     args = parser.parse_args()
     args.infile.close()
 
-    return Path(args.infile.name).absolute()
+    return Path(args.infile.name).absolute(), args.jobs
 
 def jsonKeys2int(x):
     """ JSON stores integer keys as a string. This method converts string
@@ -40,47 +45,254 @@ def jsonKeys2int(x):
     return {int(k) if k.lstrip('-').isdigit() else k: v for k, v in x.items()}
 
 
+def get_graph_files(infile):
+    """ Returns the call graph saved for a node list, and the copy of the
+        node list it was generated from
+    """
+    fn = Path(infile).with_suffix('')
+    suffix = '.bin' if binary_format.is_binary(infile) else '.json'
+    return fn.with_suffix('.graph' + suffix), fn.with_suffix('.graph.nodes' + suffix)
+
+
+def get_changed(previous, nodes):
+    """ Returns the address of each node added, removed or modified between
+        two node lists
+    """
+    changed = {address for address in previous if not address in nodes}
+    changed.update(address for address, node in nodes.items()
+                   if previous.get(address) != node)
+    return changed
+
+
+# Converter shared with the worker processes of a parallel call graph
+shard_converter = None
+
+def init_call_list_worker(nodes, cycle):
+    """ Prepares a worker process to generate the call graphs of roots
+    """
+    global shard_converter
+    shard_converter = Converter()
+    shard_converter.nodes = nodes
+    shard_converter.cycle = cycle
+
+def call_list_shard(roots):
+    """ Generates the call graph of each root in a worker process
+    """
+    shard_converter.call_graph = {}
+    for key in roots:
+        shard_converter.add_call_list(key)
+    return shard_converter.call_graph
+
+
 class Converter:
     """ Converts nodes from a flat list into a call graph
     """
     def __init__(self):
         self.nodes = {}
         self.call_graph = {}
+        self.cycles = [] # list, members of each recursion cycle
+        self.cycle = {} # index into cycles, by member address
+        self.analyzer = None # condensed node list, once cycles are labeled
+        self.links = {} # list, (child, recursion) of each function, on request
 
     def set_nodes(self, nodes):
         """ References a node list from a memory location
         """
         self.nodes = nodes
+        self.analyzer = None
+        self.links = {}
 
     def load(self, infile):
-        """ Loads a node list from an external file
+        """ Loads a node list from an external file, JSON or binary
         """
         fn = Path(infile)
-        with open(fn, 'r') as handle:
-            self.nodes = json.load(handle, object_hook=jsonKeys2int)
-        handle.close()
+        if binary_format.is_binary(fn):
+            self.nodes = binary_format.load_nodes(fn)
+        else:
+            with open(fn, 'r') as handle:
+                self.nodes = json.load(handle, object_hook=jsonKeys2int)
+            handle.close()
+        self.analyzer = None
+        self.links = {}
         print("Number of nodes loaded: " + str(len(self.nodes)) )        
 
+    def load_previous(self, infile):
+        """ Loads the call graph saved for a node list, with the node list
+            it was generated from. Returns that node list, or None when
+            either file is missing.
+        """
+        graph, snapshot = get_graph_files(infile)
+        if not graph.exists() or not snapshot.exists():
+            return None
+
+        if binary_format.is_binary(infile):
+            self.call_graph = binary_format.load_graph(graph)
+            return dict(binary_format.load_nodes(snapshot))
+        with open(graph, 'r') as handle:
+            self.call_graph = json.load(handle, object_hook=jsonKeys2int)
+        with open(snapshot, 'r') as handle:
+            return json.load(handle, object_hook=jsonKeys2int)
+
+    def get_nodes(self):
+        """ Return reference to internal node list
+        """
+        return self.nodes
+
     def get_graph(self):
         """ Return reference to internal call graph
         """
         return self.call_graph
 
-    def save(self, outfile):
-        """ Save the internal call graph to file
+    def save(self, outfile, binary=False, compress=False):
+        """ Save the internal call graph to file, JSON or binary
         """
         # Typical input filename would be 'something.node.json'
         # Expected output filename will be 'something.graph.json'
         fn = Path(outfile)
         fn = fn.with_suffix('') # Remove '.json'
-        fn = fn.with_suffix('.graph.json') # Replace '.node'
 
         print("Saving to file...", end="", flush=True)
-        with open( fn, 'w') as handle:
-            json.dump(self.call_graph, handle, indent=4)
-        handle.close()
+        if binary:
+            binary_format.save_graph(fn.with_suffix('.graph.bin'), self.call_graph, compress)
+        else:
+            with open( fn.with_suffix('.graph.json'), 'w') as handle:
+                json.dump(self.call_graph, handle, indent=4)
+            handle.close()
         print("done.")
 
+    def set_cycles(self):
+        """ Labels each direct and indirect recursion cycle once, from the
+            strongly connected components of the node list
+        """
+        self.analyzer = StackAnalyzer(self.nodes)
+        self.analyzer.analyze()
+        graph = self.analyzer.graph
+
+        self.cycles = []
+        self.cycle = {}
+        self.links = {}
+        for component in self.analyzer.components:
+            if len(component) > 1 or component[0] in graph[component[0]]:
+                for member in component:
+                    self.cycle[member] = len(self.cycles)
+                self.cycles.append(component)
+
+    def get_cycle(self, address):
+        """ Returns the members of the recursion cycle a node belongs to, or
+            an empty list
+        """
+        if address in self.cycle:
+            return list(self.cycles[self.cycle[address]])
+        return []
+
+    def get_entry(self, address, level, recursion):
+        """ Returns a node as it is inserted into the call graph, without
+            its branches
+        """
+        entry = self.nodes[address].copy()
+        del entry['branch']
+        del entry['root']
+        entry['level'] = level
+        entry['address'] = address
+        entry['recursion'] = recursion
+        return entry
+
+    def get_roots(self):
+        """ Returns each root node of the call graph, without its branches.
+            See get_children().
+        """
+        if self.analyzer is None:
+            self.set_cycles()
+
+        return [self.get_entry(key, 0, self.analyzer.is_recursive(key))
+                for key in self.analyzer.get_roots()]
+
+    def get_children(self, path):
+        """ Returns the branches of a node in the call graph, as to_call_list()
+            would insert them, without expanding the graph.
+
+            path: address of the root node, followed by the address of each
+            branch leading to the node
+
+            A branch is flagged for recursion when it is on the path, or when
+            a recursion cycle can be reached from it. Only the branches of
+            functions within a cycle depend on the path, the branches of all
+            other functions are evaluated once.
+        """
+        level = len(path)
+        return [self.get_entry(child, level, recursion)
+                for child, recursion in self.get_path_links(path)]
+
+    def has_children(self, path):
+        """ Returns True if a node in the call graph has branches. See
+            get_children().
+        """
+        return len(self.get_path_links(path)) > 0
+
+    def get_path_links(self, path):
+        """ Returns (child, recursion) for the branches of a node in the call
+            graph, memoized for functions outside of a cycle
+        """
+        if self.analyzer is None:
+            self.set_cycles()
+
+        address = path[-1]
+        if address in self.cycle:
+            return self.get_links(address, path[:-1])
+
+        links = self.links.get(address)
+        if links is None:
+            links = self.get_links(address, ())
+            self.links[address] = links
+        return links
+
+    def get_links(self, address, ancestors):
+        """ Returns (child, recursion) for the branches of a node, given the
+            addresses on the path leading to it
+        """
+        if address in ancestors and ancestors[-1] != address:
+            # Indirect recursion, the branch was inserted without traversing
+            return []
+
+        nested = len(ancestors) > 0
+        ancestors = set(ancestors)
+        recursive = []
+        branches = []
+        pending = True
+        for child in self.nodes[address]['branch']:
+            if child in ancestors:
+                if child == address:
+                    # Direct recursion, pending branches are discarded
+                    return recursive
+                # Indirect recursion is inserted without traversing
+                recursive.append((child, True))
+            elif pending:
+                branches.append((child, self.analyzer.is_recursive(child)))
+                if child == address and nested:
+                    # Traversing the branch finds direct recursion, which
+                    # also discards the branches that follow it, below the
+                    # root node
+                    pending = False
+        return recursive + branches
+
+    def get_recursion_levels(self, path, space, parent, child, level):
+        """ Returns the level at which a child is found on the active call
+            path, if any, as a sequence of zero or one level
+
+            A child can only be on the path when it shares a recursion cycle
+            with its parent. Otherwise, the path is not searched.
+        """
+        cycle = self.cycle.get(child)
+        if cycle is None or cycle != self.cycle.get(parent):
+            return ()
+
+        # The path records the latest level of each address; it is on the
+        # active path if that level has not since been replaced
+        found = path.get(child)
+        if found is not None and found <= level and space[found]['address'] == child:
+            return (found,)
+        return ()
+
     def insert_branch_node(self, parent, level, child, recursion=RecursionType.none):
         """ Inserts a child (branch) node into its parent, nested dictionary
         """
@@ -106,9 +318,18 @@ class Converter:
                 parent[index]['recursion'] = True
 
 
-    def to_call_list(self):
+    def to_call_list(self, jobs=1):
         """ Generate an interal representation of a call graph
+
+            With more than one job, roots are distributed across a process
+            pool and their call graphs merged in the order of the node list.
         """
+        self.set_cycles()
+
+        if jobs > 1:
+            self.to_call_list_shards(jobs)
+            return
+
         # For each root node, generate a call graph
         for key, node in self.nodes.items():
             if (node['type'] == NodeType.function or
@@ -116,97 +337,164 @@ class Converter:
             #if key == 134272696: # TODO remove, single branch with one direct regression
             #if key == 134342576: # TODO remove, multi-branch with one direct regression
                 if node['root']:
-                    # Found a root node
-                    #print("Level: 0 " + node['name']) # TODO remove
-                    level = 0
-                    queue = {}
-                    queue[level] = node['branch'].copy()
-
-                    # Record root node
-                    self.call_graph[key] = node.copy()
-                    space = {}
-                    space[level] = self.call_graph[key]
-                    del space[level]['branch']
-                    del space[level]['root']
-                    space[level]['level'] = level
-                    space[level]['address'] = key
-                    space[level]['recursion'] = False
-
-                    while ( queue[level] or level > 0):
-                        if not queue[level]:
-                            # Empty call list. 
-                            # Step back one level and resume traversing list
-                            level -= 1
-                            continue
-
-                        # Extract a node for traversing
-                        _branch = queue[level].pop(0)
-                        #print("Level: " + str(level + 1) + " " + self.nodes[_branch]['name']) # TODO remove
-                        
-                        # Insert child node into parent node
-                        self.insert_branch_node(space, level, _branch)
-
-                        # Does the child node branch anywere
-                        if self.nodes[_branch]['branch']:
-                            # Edge node detected.
-                            
-                            # Check for direct or indirect recursion
-                            recursion = RecursionType.none
-                            queue[level + 1] = []
-                            for __branch in self.nodes[_branch]['branch']:
-                                recursion = RecursionType.none
-                                for key in range(0,level + 1):
-                                    if __branch == space[key]['address']:
-                                        # Recursion detected
-                                        if ( __branch == _branch ):
-                                            recursion = RecursionType.direct
-                                        else:
-                                            recursion = RecursionType.indirect
-
-                                        # Insert recursion branch 
-                                        # directly into parent node, without traversing
-                                        # 1. Advance reference to parent node
-                                        # 2. Insert recursion branch
-                                        # 3. Reset reference back to original state
-                                        level += 1
-                                        space[level] = space[level - 1][_branch]
-
-                                        self.insert_branch_node(space, level, __branch, recursion)
-                                        
-                                        level -= 1
-
-                                        # For direct recursion, branch path(s)
-                                        # have already been analysed. Discard
-                                        # pending information.
-                                        if ( recursion == RecursionType.direct ):
-                                            queue[level + 1] = []
-                                            break
-
-                                else:
-                                    if recursion == RecursionType.none:
-                                        # Save new branch for traversing
-                                        queue[level + 1].append(__branch)
-                                    continue  # only executed if the inner loop did NOT break
-                                break  # only executed if the inner loop DID break
-
-
-                            if recursion != RecursionType.direct:
-                                # Setup new reference to the last object inserted
-                                level += 1
-                                space[level] = space[level - 1][_branch]
+                    self.add_call_list(key)
 
+    def to_call_list_shards(self, jobs):
+        """ Generates the call graphs of the roots across a process pool.
+            Must follow set_cycles().
+        """
+        roots = [key for key, node in self.nodes.items()
+                 if (node['type'] == NodeType.function or
+                     node['type'] == NodeType.vector_table) and node['root']]
+
+        # The cost of a root varies by orders of magnitude, small shards
+        # even out the load
+        size = max(len(roots) // (jobs * 8), 1)
+        shards = [roots[index:index + size] for index in range(0, len(roots), size)]
+
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=init_call_list_worker,
+                                 initargs=(self.nodes, self.cycle)) as pool:
+            for call_graph in pool.map(call_list_shard, shards):
+                self.call_graph.update(call_graph)
+
+    def add_call_list(self, key):
+        """ Generates the call graph of a root node. Must follow set_cycles()
+        """
+        node = self.nodes[key]
+        # Found a root node
+        #print("Level: 0 " + node['name']) # TODO remove
+        level = 0
+        queue = {}
+        queue[level] = node['branch'].copy()
+
+        # Record root node
+        self.call_graph[key] = node.copy()
+        space = {}
+        space[level] = self.call_graph[key]
+        del space[level]['branch']
+        del space[level]['root']
+        space[level]['level'] = level
+        space[level]['address'] = key
+        space[level]['recursion'] = False
+        path = {key: level}
+
+        while ( queue[level] or level > 0):
+            if not queue[level]:
+                # Empty call list. 
+                # Step back one level and resume traversing list
+                level -= 1
+                continue
+
+            # Extract a node for traversing
+            _branch = queue[level].pop(0)
+            #print("Level: " + str(level + 1) + " " + self.nodes[_branch]['name']) # TODO remove
+
+            # Insert child node into parent node
+            self.insert_branch_node(space, level, _branch)
+
+            # Does the child node branch anywere
+            if self.nodes[_branch]['branch']:
+                # Edge node detected.
+
+                # Check for direct or indirect recursion
+                recursion = RecursionType.none
+                queue[level + 1] = []
+                for __branch in self.nodes[_branch]['branch']:
+                    recursion = RecursionType.none
+                    for key in self.get_recursion_levels(path, space, _branch, __branch, level):
+                        if __branch == space[key]['address']:
+                            # Recursion detected
+                            if ( __branch == _branch ):
+                                recursion = RecursionType.direct
                             else:
-                                # Direct recursion detected, treat as leaf node.
-                                # Step back one level and resume traversing
-                                if level > 0:
-                                    level -= 1
-                        elif not queue[level]:
-                            # Leaf node detected, no branching. 
-                            # Step back one level and resume traversing
-                            if level > 0:
-                                level -= 1
+                                recursion = RecursionType.indirect
+
+                            # Insert recursion branch 
+                            # directly into parent node, without traversing
+                            # 1. Advance reference to parent node
+                            # 2. Insert recursion branch
+                            # 3. Reset reference back to original state
+                            level += 1
+                            space[level] = space[level - 1][_branch]
 
+                            self.insert_branch_node(space, level, __branch, recursion)
 
+                            level -= 1
+
+                            # For direct recursion, branch path(s)
+                            # have already been analysed. Discard
+                            # pending information.
+                            if ( recursion == RecursionType.direct ):
+                                queue[level + 1] = []
+                                break
+
+                    else:
+                        if recursion == RecursionType.none:
+                            # Save new branch for traversing
+                            queue[level + 1].append(__branch)
+                        continue  # only executed if the inner loop did NOT break
+                    break  # only executed if the inner loop DID break
+
+
+                if recursion != RecursionType.direct:
+                    # Setup new reference to the last object inserted
+                    level += 1
+                    space[level] = space[level - 1][_branch]
+                    path[_branch] = level
+
+                else:
+                    # Direct recursion detected, treat as leaf node.
+                    # Step back one level and resume traversing
+                    if level > 0:
+                        level -= 1
+            elif not queue[level]:
+                # Leaf node detected, no branching. 
+                # Step back one level and resume traversing
+                if level > 0:
+                    level -= 1
+
+
+
+    def update(self, nodes, changed):
+        """ References a new node list, generating the call graph of only
+            the roots reaching a changed node. The call graphs of the other
+            roots are kept, each node they reach is unchanged.
+
+            changed: addresses of the nodes added, removed or modified since
+            the call graph was generated, see get_changed()
+
+            Returns the address of each root whose call graph was generated.
+        """
+        callers = {}
+        for key, node in nodes.items():
+            for branch in node['branch']:
+                callers.setdefault(branch, []).append(key)
+
+        # Every node reaching a changed node
+        affected = set(changed)
+        work = list(affected)
+        while work:
+            for caller in callers.get(work.pop(), []):
+                if not caller in affected:
+                    affected.add(caller)
+                    work.append(caller)
+
+        self.set_nodes(nodes)
+        self.set_cycles()
+
+        previous = self.call_graph
+        self.call_graph = {}
+        generated = []
+        for key, node in self.nodes.items():
+            if ((node['type'] == NodeType.function or
+                 node['type'] == NodeType.vector_table) and node['root']):
+                if key in affected or not key in previous:
+                    self.add_call_list(key)
+                    generated.append(key)
+                else:
+                    self.call_graph[key] = previous[key]
+        return generated
 
     def to_dot(self, infile):
         """ Convert flat list into a dot format call graph.
@@ -214,6 +502,9 @@ class Converter:
             JSON file to Graphviz dot format
             https://www.graphviz.org/pdf/dotguide.pdf
         """
+        # Imported here, graphviz is only needed for this format
+        from graphviz import Digraph
+
         fn = Path(infile)
         dot = Digraph(filename=fn + '.gv',
             node_attr={'color': 'lightblue2', 'style': 'filled'})
@@ -231,13 +522,21 @@ class Converter:
 
 def main():
     print("Converter")
-    filename = validate_input()
+    filename, jobs = validate_input()
 
     graph = Converter()
     graph.load(filename)
-    graph.to_call_list()
+    # A rebuilt node list only regenerates the roots reaching a change
+    previous = graph.load_previous(filename)
+    if previous is None:
+        graph.to_call_list(jobs)
+    else:
+        generated = graph.update(graph.get_nodes(), get_changed(previous, graph.get_nodes()))
+        print("Roots regenerated: " + str(len(generated)))
     #graph.to_dot() # TODO re-evaluate need to keep dot format
-    graph.save(filename)
+    # The call graph is saved in the format of the node list
+    graph.save(filename, binary=binary_format.is_binary(filename))
+    shutil.copyfile(filename, get_graph_files(filename)[1])
     
 
 if __name__ == "__main__":
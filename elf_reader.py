@@ -0,0 +1,350 @@
+""" Reads symbols and section contents directly from an ELF binary file,
+    removing the need to run an external toolchain utility.
+"""
+import mmap
+import shutil
+import struct
+import subprocess
+from collections import namedtuple
+from enum import IntEnum
+from pathlib import Path
+
+try:
+    import cxxfilt
+except ImportError:
+    cxxfilt = None
+
+
+class ElfClass(IntEnum):
+    elf32 = 1
+    elf64 = 2
+
+class SectionType(IntEnum):
+    null = 0
+    progbits = 1
+    symtab = 2
+    strtab = 3
+    nobits = 8
+
+class SectionFlag(IntEnum):
+    write = 0x1
+    alloc = 0x2
+    execinstr = 0x4
+
+class SymbolBinding(IntEnum):
+    local = 0
+    glb = 1
+    weak = 2
+    unique = 10
+
+class SymbolType(IntEnum):
+    notype = 0
+    obj = 1
+    func = 2
+    section = 3
+    file = 4
+    common = 5
+    tls = 6
+    ifunc = 10
+    arm_tfunc = 13
+
+class SectionIndex(IntEnum):
+    undef = 0
+    abs = 0xfff1
+    common = 0xfff2
+
+EM_ARM = 40
+
+Section = namedtuple('Section',
+    'name type flags address offset size link entsize')
+
+# Symbol scope and type are reported using objdump's --syms flag characters,
+# allowing either source of symbols to feed the same node classification.
+SCOPE_FLAG = {
+    SymbolBinding.local: 'l',
+    SymbolBinding.glb: 'g',
+    SymbolBinding.unique: 'u',
+    }
+
+TYPE_FLAG = {
+    SymbolType.notype: ' ',
+    SymbolType.obj: 'O',
+    SymbolType.common: 'O',
+    SymbolType.tls: 'O',
+    SymbolType.func: 'F',
+    SymbolType.ifunc: 'F',
+    SymbolType.arm_tfunc: 'F',
+    SymbolType.file: 'f',
+    }
+
+SECTION_NAME = {
+    SectionIndex.undef: '*UND*',
+    SectionIndex.abs: '*ABS*',
+    SectionIndex.common: '*COM*',
+    }
+
+
+def demangle(name):
+    """ Returns the demangled C++ name when a demangler is available
+    """
+    if cxxfilt is None or not name.startswith('_Z'):
+        return name
+    try:
+        return cxxfilt.demangle(name)
+    except cxxfilt.InvalidName:
+        return name
+
+
+def get_demangler(objdump=None):
+    """ Returns the demangler available; 'cxxfilt' for the module, else the
+        path of the c++filt utility of the toolchain objdump belongs to, or
+        of the one found on the PATH. None when neither is found.
+    """
+    if cxxfilt is not None:
+        return 'cxxfilt'
+
+    if objdump is not None:
+        objdump = Path(objdump)
+        name = objdump.name.replace('objdump', 'c++filt')
+        if name != objdump.name and (objdump.parent / name).is_file():
+            return str(objdump.parent / name)
+
+    return shutil.which('c++filt')
+
+
+def demangle_all(names, demangler):
+    """ Returns the demangled names, in order. The c++filt utility is run
+        once, for every mangled name. Names stay mangled should it fail.
+
+        demangler: as returned by get_demangler()
+    """
+    if demangler == 'cxxfilt':
+        return [demangle(name) for name in names]
+
+    mangled = sorted({name for name in names if name.startswith('_Z')})
+    if demangler is None or not mangled:
+        return list(names)
+
+    try:
+        output = subprocess.run([demangler], input='\n'.join(mangled) + '\n',
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return list(names)
+
+    demangled = output.splitlines()
+    if len(demangled) != len(mangled):
+        return list(names)
+    table = dict(zip(mangled, demangled))
+    return [table.get(name, name) for name in names]
+
+
+class ElfFile:
+    """ Memory maps an ELF file and decodes its structures in place
+    """
+    def __init__(self, infile):
+        self.infile = Path(infile)
+        self.handle = open(self.infile, 'rb')
+        self.image = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.image[0:4] != b'\x7fELF':
+            self.close()
+            raise ValueError("Not an ELF file: " + str(self.infile))
+
+        self.elf_class = self.image[4]
+        self.endian = '<' if self.image[5] == 1 else '>'
+
+        if self.elf_class == ElfClass.elf32:
+            header = struct.unpack_from(self.endian + 'HHIIIIIHHHHHH', self.image, 16)
+            self.section_format = self.endian + 'IIIIIIIIII'
+            self.symbol_format = self.endian + 'IIIBBH'
+        else:
+            header = struct.unpack_from(self.endian + 'HHIQQQIHHHHHH', self.image, 16)
+            self.section_format = self.endian + 'IIQQQQIIQQ'
+            self.symbol_format = self.endian + 'IBBHQQ'
+
+        (self.file_type, self.machine, _, self.entry, _, shoff, self.flags,
+            _, _, _, shentsize, shnum, shstrndx) = header
+
+        self.sections = self.get_sections(shoff, shentsize, shnum, shstrndx)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Release the memory map and file handle
+        """
+        self.image.close()
+        self.handle.close()
+
+    def get_string(self, offset):
+        """ Returns a null terminated string located at the file offset
+        """
+        end = self.image.find(b'\0', offset)
+        return str(self.image[offset:end], encoding='utf-8', errors='replace')
+
+    def get_sections(self, shoff, shentsize, shnum, shstrndx):
+        """ Decode the section header table
+        """
+        if shoff == 0:
+            return []
+
+        if shnum == 0:
+            # Extended numbering, real count is held by the first header
+            shnum = struct.unpack_from(self.section_format, self.image, shoff)[5]
+
+        headers = [struct.unpack_from(self.section_format, self.image,
+                    shoff + index * shentsize) for index in range(shnum)]
+
+        names = headers[shstrndx][4] if shstrndx < shnum else 0
+        sections = []
+        for (name, sh_type, flags, address, offset, size, link, _, _,
+                entsize) in headers:
+            sections.append(Section(self.get_string(names + name), sh_type,
+                flags, address, offset, size, link, entsize))
+        return sections
+
+    def get_section(self, name):
+        """ Returns the first section matching the name, or None
+        """
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def get_contents(self, section):
+        """ Returns a zero-copy view of the section's file contents
+        """
+        if section.type == SectionType.nobits:
+            return memoryview(b'')
+        return memoryview(self.image)[section.offset:section.offset + section.size]
+
+    def read(self, address, size):
+        """ Returns a zero-copy view of the contents at a memory address, or
+            an empty view if the address is not backed by the file
+        """
+        for section in self.sections:
+            if (section.flags & SectionFlag.alloc and
+                section.type != SectionType.nobits and
+                section.address <= address < section.address + section.size):
+                offset = section.offset + address - section.address
+                size = min(size, section.address + section.size - address)
+                return memoryview(self.image)[offset:offset + size]
+        return memoryview(b'')
+
+    def get_words(self, address, size):
+        """ Returns the 32-bit words stored at a memory address
+        """
+        data = self.read(address, size)
+        data = data[:len(data) - len(data) % 4]
+        return [word for word, in struct.iter_unpack(self.endian + 'I', data)]
+
+    def get_raw_symbols(self):
+        """ Yields (name, value, size, binding, type, section index) for each
+            entry of the symbol table, without interpretation. The name is a
+            file offset to the null terminated string.
+        """
+        for symtab in self.sections:
+            if symtab.type != SectionType.symtab:
+                continue
+
+            strtab = self.sections[symtab.link].offset
+            entsize = struct.calcsize(self.symbol_format)
+            table = self.get_contents(symtab)
+            # Skip the reserved null symbol
+            table = table[entsize:len(table) - len(table) % entsize]
+
+            for entry in struct.iter_unpack(self.symbol_format, table):
+                if self.elf_class == ElfClass.elf32:
+                    name, value, size, info, _, shndx = entry
+                else:
+                    name, info, _, shndx, value, size = entry
+
+                yield (strtab + name, value, size, info >> 4, info & 0xf, shndx)
+
+    def get_symbols(self, demangle_names=True, demangler='cxxfilt'):
+        """ Yields (address, scope, type, section, size, name) for each entry
+            of the symbol table, in table order.
+
+            Scope and type are objdump --syms flag characters. Names are
+            demangled by the given demangler, see get_demangler(). The
+            c++filt utility demangles every name at once, so the symbols are
+            then read before the first is yielded.
+        """
+        if demangle_names and demangler != 'cxxfilt':
+            symbols = list(self.get_symbols(False))
+            names = demangle_all([symbol[5] for symbol in symbols], demangler)
+            for symbol, name in zip(symbols, names):
+                yield symbol[:5] + (name,)
+            return
+
+        for name, value, size, binding, sym_type, shndx in self.get_raw_symbols():
+            if shndx in SECTION_NAME:
+                section = SECTION_NAME[shndx]
+            elif shndx < len(self.sections):
+                section = self.sections[shndx].name
+            else:
+                section = ""
+
+            if shndx == SectionIndex.common:
+                # Value holds the alignment for common symbols
+                value, size = size, value
+
+            if (shndx == SectionIndex.undef or
+                shndx == SectionIndex.common) and binding != SymbolBinding.local:
+                scope = ' '
+            else:
+                scope = SCOPE_FLAG.get(binding, ' ')
+
+            # Thumb functions carry the state in the least significant bit
+            if (self.machine == EM_ARM and
+                TYPE_FLAG.get(sym_type) == 'F'):
+                value &= ~1
+
+            symbol = self.get_string(name)
+            if demangle_names and demangler == 'cxxfilt':
+                symbol = demangle(symbol)
+
+            yield (value, scope, TYPE_FLAG.get(sym_type, 'd'), section,
+                    size, symbol)
+
+    def get_code_regions(self):
+        """ Yields (section, start, end, state) for each region of the
+            executable sections, where state is 'a' for ARM code, 't' for
+            Thumb code or 'd' for data (literal pools).
+
+            Regions come from the ARM mapping symbols ($a, $t, $d). Sections
+            without mapping symbols fall back to the state recorded in the
+            least significant bit of each function symbol.
+        """
+        mapping = {}
+        functions = {}
+        for name, value, size, binding, sym_type, shndx in self.get_raw_symbols():
+            if shndx >= len(self.sections) or shndx == SectionIndex.undef:
+                continue
+            if not self.sections[shndx].flags & SectionFlag.execinstr:
+                continue
+
+            if self.image[name:name + 1] == b'$':
+                state = self.image[name + 1:name + 2]
+                if state in (b'a', b't', b'd') and self.image[name + 2] in (0, ord('.')):
+                    mapping.setdefault(shndx, {})[value] = state.decode()
+            elif TYPE_FLAG.get(sym_type) == 'F':
+                state = 't' if value & 1 or sym_type == SymbolType.arm_tfunc else 'a'
+                functions.setdefault(shndx, {})[value & ~1] = state
+
+        for shndx, section in enumerate(self.sections):
+            if not section.flags & SectionFlag.execinstr or section.size == 0:
+                continue
+
+            regions = mapping.get(shndx) or functions.get(shndx)
+            if not regions:
+                continue
+
+            starts = sorted(regions)
+            ends = starts[1:] + [section.address + section.size]
+            for start, end in zip(starts, ends):
+                if end > start:
+                    yield (section, start, end, regions[start])
@@ -0,0 +1,74 @@
+""" Recorded objdump transcripts of a small STM32 startup image, shared by
+    the test cases so that no ARM toolchain is needed to run them.
+"""
+import node_generator as ng
+
+
+SYMBOLS = 'test_node_generator.syms.txt'
+DISASSEMBLY = 'test_node_generator.dis.txt'
+CONTENTS = 'test_node_generator.contents.txt'
+
+
+def read_fixture(filename):
+    """ Streams a recorded objdump transcript one raw line at a time
+    """
+    with open(filename, 'rb') as handle:
+        for line in handle:
+            yield line.rstrip(b'\r\n')
+
+
+def filter_sections(lines, sections):
+    """ Limits a disassembly to the named sections, as objdump does for
+        executable sections with --disassemble
+    """
+    enabled = True
+    for line in lines:
+        if line.startswith(b'Disassembly of section '):
+            enabled = line[len(b'Disassembly of section '):-1].decode() in sections
+        if enabled:
+            yield line
+
+
+def filter_range(lines, start, stop):
+    """ Limits a disassembly to an address range, as objdump does for
+        --start-address and --stop-address
+    """
+    for line in lines:
+        line_type, address, pointer, target = ng.tokenize(line)
+        if line_type == ng.LineType.other and not line.startswith(b' '):
+            address = None
+
+        if address is None or ((start is None or address >= start) and
+                               (stop is None or address < stop)):
+            yield line
+
+
+class FixtureNode(ng.Node):
+    """ Sources objdump output from recorded transcripts, counting the
+        disassembly passes
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('vector', 'g_pfnVectors')
+        kwargs.setdefault('symbol_reader', 'objdump')
+        super().__init__(**kwargs)
+        self.passes = 0
+
+    def get_symbols(self):
+        return read_fixture(SYMBOLS)
+
+    def get_lines(self):
+        """ Returns the recorded disassembly of every section
+        """
+        return read_fixture(DISASSEMBLY)
+
+    def get_disassembly(self, start=None, stop=None):
+        self.passes += 1
+        lines = self.get_lines()
+        if self.disassemble == 'code':
+            lines = filter_sections(lines, self.code_sections)
+        if start is None and stop is None:
+            return lines
+        return filter_range(lines, start, stop)
+
+    def get_contents(self, sections):
+        return read_fixture(CONTENTS)
@@ -2,6 +2,10 @@
     information to file.
 """
 import argparse
+from bisect import bisect_right
+import hashlib
+from array import array
+from itertools import chain
 from pathlib import Path
 
 import json
@@ -9,6 +13,11 @@ import json
 from enum import auto, IntEnum
 
 import subprocess, sys
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis_cache import AnalysisCache
+from elf_reader import ElfFile, get_demangler
+from stack_usage import StackUsage
 
 
 class SymbolScope(IntEnum):
@@ -34,6 +43,17 @@ class NodeType(IntEnum):
     vector_table = auto()
     vtable = auto()
 
+class LineType(IntEnum):
+    other = auto()
+    header = auto()
+    branch = auto()
+    word = auto()
+
+# Members bound once, keeping enum lookups out of the tokenizer loop
+OTHER, HEADER, BRANCH, WORD = LineType
+SCOPE_INDEX = int(SymbolScope.index)
+TYPE_INDEX = int(NodeType.index)
+
 
 parent_parser = argparse.ArgumentParser(
     add_help=False,
@@ -67,6 +87,35 @@ parent_parser.add_argument("-v", "--vector", nargs='?',
     default="",
     help="Symbol that identifies a vector table for ISRs")
 
+parent_parser.add_argument('-sr', '--symbol_reader',
+    choices=['elf', 'objdump'],
+    default='elf',
+    help="Read symbols directly from the ELF file, or by running objdump")
+
+parent_parser.add_argument('-br', '--branch_reader',
+    choices=['objdump', 'elf'],
+    default='objdump',
+    help="Find branches in the objdump disassembly, or decode them directly "
+         "from the ELF file (requires NumPy)")
+
+parent_parser.add_argument('-cs', '--code_sections', nargs='+',
+    default=['.text'],
+    help="Sections holding functions implemented in assembly code")
+
+parent_parser.add_argument('-da', '--disassemble',
+    choices=['all', 'code'],
+    default='all',
+    help="Disassemble every section, or only executable sections and the "
+         "contents of object symbols")
+
+parent_parser.add_argument('-j', '--jobs', type=int,
+    default=1,
+    help="Number of processes used for analysis")
+
+parent_parser.add_argument('-nc', '--no_cache', action='store_true',
+    help="Always analyze the input file, ignoring the linked node lists "
+         "cached in --output_path")
+
 
 
 def is_symbol_line(s):
@@ -208,6 +257,9 @@ def get_branch_address(s):
         return -1
 
 def get_pointer(s):
+    """ Returns the first word of machine code/data following the line
+        address, or -1 if not present
+    """
     begin = s.find('\t')
     end = s.find(' ', begin)
 
@@ -221,6 +273,258 @@ def get_pointer(s):
         return -1
 
 
+def tokenize(line):
+    """ Classifies a raw (bytes) line of disassembly in a single step,
+        replacing the chain of is_node_start(), is_node_branch(),
+        get_branch_address(), get_pointer() and get_line_address().
+
+        Returns (type, address, pointer, target). For a node header, address
+        is the node address. Otherwise address is the line address, pointer
+        is the first word of machine code/data and target is the branch
+        address; -1 when absent.
+    """
+    if not line:
+        return (OTHER, 0, -1, -1)
+
+    if line.endswith(b':') and not b'+0x' in line and not b'-0x' in line:
+        space = line.find(b' ')
+        if space != -1:
+            try:
+                return (HEADER, int(line[:space], 16), -1, -1)
+            except ValueError:
+                pass
+
+    try:
+        address = int(line[:line.find(b':')], 16)
+    except ValueError:
+        address = 0
+
+    pointer = -1
+    begin = line.find(b'\t')
+    if begin != -1:
+        end = line.find(b' ', begin)
+        if end != -1:
+            try:
+                pointer = int(line[begin + 1:end], 16)
+            except ValueError:
+                pass
+
+    if line.endswith(b'>'):
+        begin = line.find(b'<')
+        if (begin != -1 and
+            not b'+0x' in line[begin:-1] and not b'-0x' in line[begin:-1]):
+            end = line.rfind(b' <')
+            if end != -1:
+                begin = max(line.rfind(b'\t', 0, end), line.rfind(b' ', 0, end))
+                if begin != -1:
+                    try:
+                        return (BRANCH, address, pointer, int(line[begin:end], 16))
+                    except ValueError:
+                        pass
+
+    if pointer != -1:
+        return (WORD, address, pointer, -1)
+    return (OTHER, address, pointer, -1)
+
+def tokenize_symbol(line):
+    """ Decodes a raw (bytes) line of objdump --syms output in a single
+        step, replacing the chain of is_symbol_line() and get_symbol_*().
+
+        Returns (address, scope, type, section, size, name), or None if the
+        line does not contain a symbol.
+    """
+    # A tab is the central reference point for slicing the line
+    tab = line.find(b'\t')
+    if tab == -1 or tab != line.rfind(b'\t'):
+        return None
+
+    try:
+        address = int(line[:line.find(b' ')], 16)
+    except ValueError:
+        return None
+
+    begin = line.rfind(b' ', 0, tab)
+    section = line[begin + 1:tab] if begin != -1 else b''
+
+    size = 0
+    name = b''
+    end = line.find(b' ', tab)
+    if end != -1:
+        try:
+            size = int(line[tab + 1:end], 16)
+        except ValueError:
+            return None
+        name = line[end + 1:]
+
+    return (address, chr(line[SCOPE_INDEX]) if len(line) > SCOPE_INDEX else '',
+            chr(line[TYPE_INDEX]) if len(line) > TYPE_INDEX else '',
+            section.decode(), size, name.decode())
+
+
+# Register states of trace_literal(), besides the offset of a load through
+# the constant
+LITERAL = -1 # the constant itself
+INDEXED = -2 # a word loaded through the constant, at an unknown index
+
+# Registers a call clobbers, AAPCS
+CALLER_SAVED = (0, 1, 2, 3, 12)
+
+def trace_literal(registers, address, code):
+    """ Follows the registers loaded from a function's literal pool through
+        one 16-bit Thumb instruction, from its machine code.
+
+        registers: {register: (literal address, offset)}, updated in place
+        Returns (literal address, offset) for a BLX or BX through a traced
+        register, otherwise None.
+
+        LDR rt, [pc, #imm] loads the constant at the literal address, LDR
+        rt, [rn, #imm] and LDR rt, [rn, rm] read through it. Other writes of
+        a low register, and calls, end its trace. 32-bit instructions are
+        not decoded, their writes are not seen.
+    """
+    if code & 0xF800 == 0x4800:
+        registers[(code >> 8) & 7] = (((address + 4) & ~3) + ((code & 0xFF) << 2), LITERAL)
+        return None
+
+    if code & 0xFF00 == 0x4700:
+        # BX, BLX; BX lr is never traced
+        call = registers.get((code >> 3) & 0xF)
+        if code & 0x80:
+            for register in CALLER_SAVED:
+                registers.pop(register, None)
+        return call
+
+    if code & 0xF800 == 0x6800:
+        source = registers.get((code >> 3) & 7)
+        if source is not None and source[1] == LITERAL:
+            registers[code & 7] = (source[0], ((code >> 6) & 0x1F) << 2)
+        else:
+            registers.pop(code & 7, None)
+        return None
+
+    if code & 0xFE00 == 0x5800:
+        source = registers.get((code >> 3) & 7) or registers.get((code >> 6) & 7)
+        if source is not None and source[1] == LITERAL:
+            registers[code & 7] = (source[0], INDEXED)
+        else:
+            registers.pop(code & 7, None)
+        return None
+
+    if code < 0x2000 or 0x4000 <= code < 0x4400 or 0x5800 <= code < 0x6000 or (
+        code & 0xF800 in (0x7800, 0x8800)):
+        # Shifts, register add and subtract, data processing and loads
+        registers.pop(code & 7, None)
+    elif 0x2000 <= code < 0x4000 or 0x9800 <= code < 0xB000:
+        # Immediate moves and arithmetic, stack loads and address generation
+        registers.pop((code >> 8) & 7, None)
+    elif code & 0xFD00 == 0x4400:
+        # High register add and move
+        registers.pop(((code >> 4) & 8) | (code & 7), None)
+    elif code & 0xFE00 == 0xBC00 or code & 0xF800 == 0xC800:
+        # POP, LDM
+        for register in range(8):
+            if code & (1 << register):
+                registers.pop(register, None)
+    return None
+
+
+# Node shared with the worker processes of a sharded link
+shard_node = None
+
+def init_link_worker(node):
+    """ Prepares a worker process to sweep disassembly shards
+    """
+    global shard_node
+    shard_node = node
+
+def link_shard(shard):
+    """ Disassembles and sweeps one (start, stop) address range in a worker
+        process. Returns the branch list of each node in the range, with the
+        dispatch table entries, pointers and calls found.
+    """
+    start, stop = shard
+    shard_node.dispatch_table = {}
+    seen, loads, words, calls = shard_node.sweep(
+        map(tokenize, shard_node.get_disassembly(start, stop)))
+    branches = [(address, shard_node.nodes[address]['branch']) for address in seen]
+    return branches, shard_node.dispatch_table, loads, words, calls
+
+
+def get_section_contents(lines):
+    """ Decodes an objdump --full-contents listing into the byte order of
+        the file and a {section: (address, contents)} dictionary
+    """
+    byteorder = 'little'
+    contents = {}
+    section = None
+    for line in lines:
+        if line.startswith(b' ') and section is not None:
+            end = line.find(b' ', 1)
+            address, data = contents[section]
+            if address is None:
+                contents[section] = (int(line[1:end], 16), data)
+            # Four groups of four bytes, followed by an ASCII rendering
+            data += bytes.fromhex(line[end + 1:end + 36].decode())
+        elif line.startswith(b'Contents of section '):
+            section = line[len(b'Contents of section '):-1].decode()
+            contents[section] = (None, bytearray())
+        elif b'file format' in line:
+            byteorder = 'big' if b'big' in line else 'little'
+    return byteorder, contents
+
+
+def in_spans(spans, address):
+    """ Returns True if an address lies within one of the sorted, disjoint
+        (starts, stops) ranges
+    """
+    starts, stops = spans
+    index = bisect_right(starts, address) - 1
+    return index >= 0 and address < stops[index]
+
+
+def select_records(records, addresses):
+    """ Yields the records of the nodes at the given addresses, dropping the
+        rest of a disassembly
+    """
+    selected = False
+    for record in records:
+        if record[0] == LineType.header:
+            selected = record[1] in addresses
+        if selected:
+            yield record
+
+
+def select_pointers(pointers, owners):
+    """ Returns (owner, pointer, ...) arrays limited to the given owners
+    """
+    selected = tuple(array('q') for _ in pointers)
+    for row in zip(*pointers):
+        if row[0] in owners:
+            for column, value in zip(selected, row):
+                column.append(value)
+    return selected
+
+
+def merge_pointers(*pointers):
+    """ Merges (owner, pointer, ...) arrays, ordered by owner. Each owner's
+        pointers keep their order.
+    """
+    rows = sorted(chain.from_iterable(zip(*owned) for owned in pointers),
+                  key=lambda row: row[0])
+    return tuple(array('q', (row[column] for row in rows))
+                 for column in range(len(pointers[0])))
+
+
+def read_lines(command):
+    """ Runs an external tool and yields its raw output one line at a time,
+        as the tool produces it. Parsing overlaps with the tool running, and
+        the complete output is never held in memory nor decoded.
+    """
+    with subprocess.Popen(command, shell=True,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT) as terminal:
+        for line in terminal.stdout:
+            yield line.rstrip(b'\r\n')
 
 
 
@@ -228,15 +532,37 @@ class Node():
     """ Each node represents a function or object used in a call graph.
     """
     
-    def __init__(self, objdump=Path(), infile=Path(), vector="", stack_path=Path(), output_path=('.')):
+    def __init__(self, objdump=Path(), infile=Path(), vector="", stack_path=Path(), output_path=('.'),
+                 symbol_reader='elf', branch_reader='objdump', jobs=1,
+                 code_sections=('.text',), disassemble='all', cache=True,
+                 save_format='json'):
         self.nodes = {}
         self.dispatch_table = {}
+        self.function = {} # list, link to reference table(s)
+        self.reference = {} # list,  link to dispatch table(s)
+        self.dispatch = {} # list, table of function pointers
+        self.edges = {} # set, unique branches of each parent while linking
+        self.loads = ((), ()) # pointers loaded by functions, while linking
+        self.words = ((), (), ()) # pointers stored in objects, while linking
+        self.calls = ((), (), (), ()) # registers called after a literal load
+        self.call_sites = {} # list, functions each call site may call
+        self.signatures = {} # digest of each node's contents
 
         self.objdump = Path(objdump)
         self.infile = Path(infile).absolute()
         self.vector_table = vector
-        self.stack_path = Path(stack_path)
+        if isinstance(stack_path, (list, tuple)):
+            self.stack_path = [Path(path) for path in stack_path]
+        else:
+            self.stack_path = [Path(stack_path)]
         self.output_path = Path(output_path)
+        self.symbol_reader = symbol_reader
+        self.branch_reader = branch_reader
+        self.jobs = jobs
+        self.code_sections = list(code_sections)
+        self.disassemble = disassemble
+        self.cache = cache
+        self.save_format = save_format
 
     def cli(self):
         """ Process user input from the command line.
@@ -247,6 +573,12 @@ class Node():
             description="Analysis binary code for stack and call information."
             )
 
+        cli_parser.add_argument('-f', '--format',
+            choices=['json', 'binary', 'compressed'],
+            default='json',
+            help="Save the node list as indented JSON, or as a binary file; "
+                 "memory mapped when read, or compressed")
+
         args = cli_parser.parse_args()
 
         # Input file will be processed directly by objdump utility, just 
@@ -261,123 +593,313 @@ class Node():
         self.output_path = args.output_path
         self.stack_path = args.stack_path
         self.vector_table = args.vector
+        self.symbol_reader = args.symbol_reader
+        self.branch_reader = args.branch_reader
+        self.jobs = args.jobs
+        self.code_sections = args.code_sections
+        self.disassemble = args.disassemble
+        self.cache = not args.no_cache
+        self.save_format = args.format
 
     def get_symbols(self):
         """ Creates a raw symbol list from the user provided input file
+
+            Lines are streamed from objdump as they are produced.
+        """
+        return read_lines([str(self.objdump), '--syms', '--demangle',
+                            str(self.infile) ])
+
+    def get_disassembly(self, start=None, stop=None):
+        """ Disassemble the user provided input file, optionally limited to
+            the address range [start, stop)
+
+            Lines are streamed from objdump as they are produced, so memory
+            use stays bounded by the longest line rather than the entire
+            disassembly.
+        """
+        if self.disassemble == 'all':
+            command = [str(self.objdump), '--disassemble-all', '--demangle']
+        else:
+            command = [str(self.objdump), '--disassemble', '--demangle']
+        if start is not None:
+            command.append('--start-address=' + hex(start))
+        if stop is not None:
+            command.append('--stop-address=' + hex(stop))
+        return read_lines(command + [str(self.infile)])
+
+    def get_contents(self, sections):
+        """ Dumps the raw contents of the named sections
         """
-        terminal = subprocess.Popen([str(self.objdump), '--syms', '--demangle', 
-                            str(self.infile) ], shell=True, 
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT)
-        stdout, stderr = terminal.communicate()
-        stdout = str(stdout, encoding='utf-8')
-        lines = stdout.splitlines()
+        command = [str(self.objdump), '--full-contents']
+        command += ['--section=' + section for section in sections]
+        return read_lines(command + [str(self.infile)])
 
-        return lines
+    def get_object_records(self, addresses=None):
+        """ Yields the contents of each object node as disassembly records;
+            a node header followed by one word per 32 bits.
 
-    def get_disassembly(self):
-        """ Disassemble the user provided input file
+            Only the sections holding objects are dumped, and only the bytes
+            belonging to an object are evaluated.
+
+            addresses: optional, limits the records to these nodes
         """
-        terminal = subprocess.Popen([str(self.objdump), '--disassemble-all', '--demangle', 
-                            str(self.infile) ], shell=True, 
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT)
-        stdout, stderr = terminal.communicate()
-        stdout = str(stdout, encoding='utf-8')
-        lines = stdout.splitlines()
-        return lines
+        if addresses is None:
+            addresses = self.nodes
+        objects = [address for address in sorted(addresses)
+                   if self.nodes[address]['size'] > 0 and
+                   (self.nodes[address]['type'] == NodeType.obj or
+                    self.nodes[address]['type'] == NodeType.vector_table)]
+        if not objects:
+            return
+
+        sections = sorted({self.nodes[address]['section'] for address in objects})
+        byteorder, contents = get_section_contents(self.get_contents(sections))
+
+        for address in objects:
+            node = self.nodes[address]
+            if not node['section'] in contents:
+                continue
+
+            base, data = contents[node['section']]
+            yield (LineType.header, address, -1, -1)
+            begin = (address + 3) & ~3
+            end = min(address + node['size'], base + len(data))
+            for line_address in range(begin, end - 3, 4):
+                offset = line_address - base
+                word = int.from_bytes(data[offset:offset + 4], byteorder)
+                yield (LineType.word, line_address, word, -1)
 
     def get_nodes(self):
         """ Return reference to internal node list
         """
         return self.nodes
 
+    def set_stack_usage(self):
+        """ Records the stack usage of each function, from the *.su files
+            found in the stack path(s). Returns the number of nodes matched.
+        """
+        usage = StackUsage(self.stack_path, self.output_path, self.jobs)
+        usage.load()
+        return usage.set_nodes(self.nodes)
 
-    def save(self):
-        """ Save all nodes to file
+    def get_cache(self):
+        """ Returns the cache of linked node lists, kept in the output path
         """
-        fn = Path(self.infile)
-        with open( fn.with_suffix('.node.json'), 'w') as outfile:
-            json.dump(self.nodes, outfile, indent=4)
-        outfile.close()
+        return AnalysisCache(self.output_path / 'cache')
 
+    def get_cache_options(self):
+        """ Returns each option changing the linked node list. The number of
+            jobs does not. Symbols read from the ELF file depend on the
+            demangler found.
+        """
+        return [self.vector_table, self.symbol_reader, self.branch_reader,
+                self.code_sections, self.disassemble, self.get_demangler()]
 
-    def build(self):
-        """ Establish each node
+    def get_demangler(self):
+        """ Returns the demangler of the names read from the ELF file, see
+            elf_reader.get_demangler(), or None for the objdump reader
         """
-        lines = self.get_symbols()
+        if self.symbol_reader != 'elf':
+            return None
+        return get_demangler(self.objdump)
 
-        for line in lines:
-            address = 0
-            if( is_symbol_line(line) ):
-                node = {}
+    def get_cache_key(self):
+        """ Returns the cache key of the linked node list; the input file,
+            objdump utility and options
+        """
+        return self.get_cache().get_key(self.infile, self.objdump,
+                                        self.get_cache_options())
 
-                node['name'] = get_symbol_name(line)
+    def get_source_key(self):
+        """ Returns the cache key of the latest linked node list of the input
+            file's location
+        """
+        return self.get_cache().get_source_key(self.infile, self.objdump,
+                                               self.get_cache_options())
 
-                node['section'] = get_symbol_section(line)
-                node['size'] = get_symbol_size(line)
+    def set_state(self, state):
+        """ Restores the linked node list saved by get_state()
+        """
+        self.nodes = state['nodes']
+        self.dispatch_table = state['dispatch_table']
+        self.function = state['function']
+        self.reference = state['reference']
+        self.dispatch = state['dispatch']
+        self.signatures = state['signatures']
+        self.loads = state['loads']
+        self.words = state['words']
+        self.calls = state['calls']
+        self.call_sites = state['call_sites']
+        for node in self.nodes.values():
+            node['type'] = NodeType(node['type'])
+            node['scope'] = SymbolScope(node['scope'])
 
-                """ The input file contains a collection of all symbols; data, 
-                    functions, etc...
-                """
-                if line[NodeType.index] == 'F':
-                    node['type'] = NodeType.function
-                elif line[NodeType.index] == 'O':
-                    if node['name'] == self.vector_table:
-                        node['type'] = NodeType.vector_table
-                    else:
-                        node['type'] = NodeType.obj
+    def get_state(self):
+        """ Returns the linked node list, with the node signatures and
+            pointers needed to relink the next build of the input file
+        """
+        if not self.signatures:
+            self.signatures = self.get_signatures()
+        return {'nodes': self.nodes, 'dispatch_table': self.dispatch_table,
+                'function': self.function, 'reference': self.reference,
+                'dispatch': self.dispatch, 'signatures': self.signatures,
+                'loads': self.loads, 'words': self.words,
+                'calls': self.calls, 'call_sites': self.call_sites}
+
+    def load_cache(self):
+        """ Replaces build() and link() with the result of a previous run.
+            Returns False when caching is disabled or no result was found.
+        """
+        if not self.cache:
+            return False
 
-                elif line[NodeType.index] == ' ':
-                    # Functions implemented in assembly code get lumped in 
-                    # here. 
-                    if '.' in node['name']:
-                        # Discard, periods are not allowed in function names
-                        continue
-                    else:
-                        # TODO need to make section user definable
-                        if node['section'] != '.text':
-                            # Discard, invalid section
-                            continue
-                        else:
-                            node['type'] = NodeType.function
-                        
+        state = self.get_cache().load(self.get_cache_key())
+        if state is None:
+            return False
 
-                else:
-                    # All other symbols for filename, debug info, etc... are
-                    # not guaranteed to have a unique address (key), and 
-                    # therefore cannot be logged. 
-                    continue
+        self.set_state(state)
+        return True
 
-                # Decode the symbol scope
-                if line[SymbolScope.index] == 'l':
-                    node['scope'] = SymbolScope.local
-                elif line[SymbolScope.index] == 'g':
-                    node['scope'] = SymbolScope.glb
-                elif line[SymbolScope.index] == 'u':
-                    node['scope'] = SymbolScope.un_glb
-                elif line[SymbolScope.index] == '!':
-                    node['scope'] = SymbolScope.error
-                else:
-                    node['scope'] = SymbolScope.none
+    def save_cache(self):
+        """ Saves the linked node list for later runs. Must follow link(),
+            before the stack usage is recorded; *.su files are tracked
+            separately.
+        """
+        if self.cache:
+            self.get_cache().save(self.get_cache_key(), self.get_state(),
+                                  self.get_source_key())
 
-                """ TODO delete
-                if line[SymbolMessage.index] == 'W':
-                    node['message'] = SymbolMessage.warning
-                else:
-                    node['message'] = SymbolMessage.none
+    def compact(self):
+        """ Replaces the linked node list with a compact, read-only table.
+            Must follow link(), the table cannot be updated.
+        """
+        # Imported here, the table depends on the enums of this module
+        from node_table import NodeTable
+        self.nodes = NodeTable(self.nodes)
 
-                """
+    def save(self):
+        """ Save all nodes to file, in the selected format
+        """
+        fn = Path(self.infile)
+        if self.save_format != 'json':
+            # Imported here, the table depends on the enums of this module
+            import binary_format
+            binary_format.save_nodes(fn.with_suffix('.node.bin'), self.nodes,
+                                     compress=self.save_format == 'compressed')
+            return
+
+        with open( fn.with_suffix('.node.json'), 'w') as outfile:
+            json.dump(dict(self.nodes), outfile, indent=4)
+        outfile.close()
+
+
+    def get_symbol_records(self):
+        """ Yields (address, scope, type, section, size, name) for each symbol
+            using the selected symbol reader. Scope and type are reported as
+            objdump --syms flag characters.
+        """
+        demangler = self.get_demangler()
+        if self.symbol_reader == 'elf' and demangler is not None:
+            with ElfFile(self.infile) as elf:
+                yield from elf.get_symbols(demangler=demangler)
+        else:
+            if self.symbol_reader == 'elf':
+                print("Warning: neither cxxfilt nor c++filt found to demangle "
+                      "C++ names, reading symbols with objdump")
+            for line in self.get_symbols():
+                record = tokenize_symbol(line)
+                if record is not None:
+                    yield record
 
-                node['root'] = True
-                node['branch'] = []
+    def build(self):
+        """ Establish each node
+        """
+        unit = None # source file of the local symbols that follow
+        for address, scope, symbol_type, section, size, name in self.get_symbol_records():
+            if symbol_type == 'f':
+                unit = name
+                continue
+
+            node = {}
+
+            node['name'] = name
+
+            node['section'] = section
+            node['size'] = size
+
+            """ The input file contains a collection of all symbols; data, 
+                functions, etc...
+            """
+            if symbol_type == 'F':
+                node['type'] = NodeType.function
+            elif symbol_type == 'O':
+                if node['name'] == self.vector_table:
+                    node['type'] = NodeType.vector_table
+                else:
+                    node['type'] = NodeType.obj
 
-                # Symbol address will become the node key, and therefore must
-                # be unique for each entry.
-                address = get_symbol_address(line)
-                self.nodes[address] = node
+            elif symbol_type == ' ':
+                # Functions implemented in assembly code get lumped in 
+                # here. 
+                if '.' in node['name']:
+                    # Discard, periods are not allowed in function names
+                    continue
+                else:
+                    if not node['section'] in self.code_sections:
+                        # Discard, invalid section
+                        continue
+                    else:
+                        node['type'] = NodeType.function
+                    
+
+            else:
+                # All other symbols for filename, debug info, etc... are
+                # not guaranteed to have a unique address (key), and 
+                # therefore cannot be logged. 
+                continue
+
+            # Decode the symbol scope
+            if scope == 'l':
+                node['scope'] = SymbolScope.local
+            elif scope == 'g':
+                node['scope'] = SymbolScope.glb
+            elif scope == 'u':
+                node['scope'] = SymbolScope.un_glb
+            elif scope == '!':
+                node['scope'] = SymbolScope.error
+            else:
+                node['scope'] = SymbolScope.none
+
+            # Static functions are told apart by their source file, listed
+            # ahead of its local symbols
+            if scope == 'l' and node['type'] == NodeType.function and unit:
+                node['unit'] = unit
+
+            node['root'] = True
+            node['branch'] = []
+
+            # Symbol address will become the node key, and therefore must
+            # be unique for each entry.
+            self.nodes[address] = node
         
         
+    def get_node_counts(self):
+        """ Returns the number of nodes, functions, objects, branches,
+            resolved indirect calls and dispatch table entries
+        """
+        counts = {'nodes': len(self.nodes), 'functions': 0, 'objects': 0,
+                  'roots': 0, 'edges': 0, 'indirect_edges': 0,
+                  'dispatch_entries': len(self.dispatch_table)}
+        for node in self.nodes.values():
+            if node['type'] == NodeType.function:
+                counts['functions'] += 1
+                counts['roots'] += node['root']
+            elif node['type'] == NodeType.obj:
+                counts['objects'] += 1
+            counts['edges'] += len(node['branch'])
+            counts['indirect_edges'] += len(node.get('indirect', ()))
+        return counts
+
     def show_node_metrics(self):
         """ Displays node summary information.
         """
@@ -434,12 +956,10 @@ class Node():
         """
         in_progress = False
 
-        for line in lines:
-            table = {}
-            
-            if is_node_start(line):
+        for line_type, line_address, pointer, target in map(tokenize, lines):
+            if line_type == LineType.header:
                 # Start of node detected
-                address = get_node_address(line)
+                address = line_address
                 in_progress = False
 
                 if ( address in self.nodes):
@@ -448,22 +968,143 @@ class Node():
 
             elif in_progress:
                 # Evaluate for dispatch table entry(s)
-                target = get_pointer(line)
-                if target != -1:
-                    if ( target in self.nodes):
-                        if self.nodes[target]['type'] == NodeType.function:
-                            # ARM state
-                            table['function'] = target
-                            table['table'] = address
-                            line_address = get_line_address(line, ':')
-                            self.dispatch_table[line_address] = table
-                    elif ( target - 1 in self.nodes):
-                        if self.nodes[target - 1]['type'] == NodeType.function:
-                            # Thumb state
-                            table['function'] = target - 1
-                            table['table'] = address
-                            line_address = get_line_address(line, ':')
-                            self.dispatch_table[line_address] = table
+                if pointer != -1:
+                    self.set_dispatch_entry(address, line_address, pointer)
+
+    def set_dispatch_entry(self, address, line_address, target):
+        """ Records a dispatch table entry if the object's pointer references
+            a function.
+        """
+        if ( target in self.nodes):
+            if self.nodes[target]['type'] == NodeType.function:
+                # ARM state
+                self.dispatch_table[line_address] = {
+                    'function': target, 'table': address }
+        elif ( target - 1 in self.nodes):
+            if self.nodes[target - 1]['type'] == NodeType.function:
+                # Thumb state
+                self.dispatch_table[line_address] = {
+                    'function': target - 1, 'table': address }
+
+    def set_references(self, loads, words, calls=((), (), (), ())):
+        """ Resolves pointers recorded while sweeping the disassembly, once
+            the dispatch table is complete. The pointers are kept, for
+            relink().
+
+            loads: (function, pointer) arrays, pointers loaded by functions
+            words: (object, pointer, site) arrays, pointers stored in
+            objects, with the address of each
+            calls: (function, site, constant, offset) arrays, registers
+            called after a literal pool load; see trace_literal()
+        """
+        self.loads = loads
+        self.words = words
+        self.calls = calls
+        for address, target in zip(*loads):
+            if target in self.dispatch_table:
+                # Evaluate for accessing dispatch table (function pointer)
+                self.function.setdefault(address, []).append(target)
+
+        for address, target in zip(words[0], words[1]):
+            if ( target in self.dispatch_table):
+                # Indirect reference table to the dispatch table
+                self.reference.setdefault(address, []).append(target)
+            elif ( target - 1 in self.nodes):
+                #TODO specific to thumb-2 mode, read ELF first
+                self.dispatch.setdefault(address, []).append(target - 1)
+
+        self.set_indirect(loads, calls)
+
+    def get_table_entries(self):
+        """ Returns the entries of each dispatch table, in address order.
+            Each entry records its owning table.
+        """
+        entries = {}
+        for site in sorted(self.dispatch_table):
+            entries.setdefault(self.dispatch_table[site]['table'], []).append(site)
+        return entries
+
+    def get_pointer_targets(self, pointer, entries):
+        """ Returns the functions called through a pointer to a dispatch
+            table entry, a dispatch table or a reference table.
+
+            An entry resolves to its own target. A table base may be
+            indexed, so it resolves to every entry of the table.
+        """
+        if pointer in self.dispatch_table:
+            sites = [pointer]
+        elif pointer in self.reference:
+            sites = self.reference[pointer]
+        elif pointer in entries:
+            # Table whose first word is not a function pointer
+            sites = entries[pointer]
+        else:
+            return []
+
+        targets = []
+        for site in sites:
+            table = self.dispatch_table[site]['table']
+            if site == table:
+                targets.extend(self.dispatch_table[entry]['function']
+                               for entry in entries[table])
+            else:
+                targets.append(self.dispatch_table[site]['function'])
+        return targets
+
+    def get_call_targets(self, constant, offset, entries):
+        """ Returns the functions a register may hold when called, from the
+            literal pool constant it was loaded from; see trace_literal()
+        """
+        if offset == LITERAL:
+            # Convert thumb (odd) to ARM (even) state
+            target = constant if constant % 2 == 0 else constant - 1
+            node = self.nodes.get(target)
+            if node is not None and node['type'] == NodeType.function:
+                return [target]
+            # The address the target is read through
+            return self.get_pointer_targets(constant, entries)
+
+        if offset == INDEXED:
+            if constant in self.dispatch_table:
+                constant = self.dispatch_table[constant]['table']
+            return [self.dispatch_table[entry]['function']
+                    for entry in entries.get(constant, ())]
+
+        site = constant + offset
+        if site in self.dispatch_table:
+            return [self.dispatch_table[site]['function']]
+        return []
+
+    def set_indirect(self, loads, calls=((), (), (), ())):
+        """ Resolves the indirect calls of each function, and records them in
+            the function's 'indirect' list, apart from its direct branches.
+
+            Pointers loaded by a function are followed through function ->
+            reference table -> dispatch table -> target. Registers called
+            after a literal pool load resolve per call site, in call_sites.
+            The chains are resolved through indexes built once, in time
+            linear in the pointers and entries.
+        """
+        entries = self.get_table_entries()
+
+        indirect = {}
+        for address, pointer in zip(*loads):
+            targets = self.get_pointer_targets(pointer, entries)
+            if targets:
+                indirect.setdefault(address, {}).update(dict.fromkeys(targets))
+
+        self.call_sites = {}
+        for address, site, constant, offset in zip(*calls):
+            targets = list(dict.fromkeys(self.get_call_targets(constant, offset, entries)))
+            if targets:
+                self.call_sites[site] = targets
+                indirect.setdefault(address, {}).update(dict.fromkeys(targets))
+
+        for address, node in self.nodes.items():
+            node.pop('indirect', None)
+        for address, targets in indirect.items():
+            if self.nodes[address]['type'] == NodeType.function:
+                self.nodes[address]['indirect'] = list(targets)
 
     def link_to_function(self, parent, child):
         """ Evaluates if the child is a valid address to a function, and if so,
@@ -474,173 +1115,462 @@ class Node():
             child = child if child % 2 == 0 else child - 1
             if child in self.nodes:
                 if self.nodes[child]['type'] == NodeType.function:
-                    if ( not child in self.nodes[parent]['branch'] ):
+                    # Membership is tested against a set, the branch list
+                    # keeps the order in which branches were first seen
+                    edges = self.edges.get(parent)
+                    if edges is None:
+                        edges = set(self.nodes[parent]['branch'])
+                        self.edges[parent] = edges
+
+                    if ( not child in edges ):
                         # For optimization, we only record unique branches
+                        edges.add(child)
                         self.nodes[parent]['branch'].append(child)
                         self.nodes[child]['root'] = False
 
     def link(self):
         """ Updates an existing node list with a node's branch list
+
+            The disassembly is evaluated in a single pass; dispatch table
+            entries are recorded during the same sweep as the branches. With
+            more than one job, address ranges are disassembled concurrently.
+        """
+        if self.branch_reader == 'elf':
+            self.link_elf()
+            return
+
+        self.function = {}
+        self.reference = {}
+        self.dispatch = {}
+        self.edges = {}
+
+        if self.jobs > 1:
+            self.link_shards()
+        else:
+            records = map(tokenize, self.get_disassembly())
+            if self.disassemble == 'code':
+                records = chain(records, self.get_object_records())
+            seen, loads, words, calls = self.sweep(records)
+            self.set_references(loads, words, calls)
+
+        # Branch lists are complete, release the sets
+        self.edges = {}
+
+    def get_signatures(self):
+        """ Returns a digest of each node's contents in the ELF file; the
+            bytes from its address up to the next node, which objdump
+            attributes to it
+        """
+        addresses = sorted(self.nodes)
+        signatures = {}
+        with ElfFile(self.infile) as elf:
+            for address, stop in zip(addresses, addresses[1:] + [None]):
+                # Reads are limited to the node's section
+                size = stop - address if stop is not None else 1 << 32
+                signatures[address] = hashlib.blake2b(
+                    elf.read(address, size), digest_size=16).digest()
+        return signatures
+
+    def get_spans(self, addresses, count=16):
+        """ Returns at most count (start, stop) address ranges covering the
+            given nodes. Consecutive nodes share a range, then ranges are
+            joined across the smallest gaps. The last range may be open.
+        """
+        keys = sorted(self.nodes)
+        selected = set(addresses)
+        spans = []
+        for index, address in enumerate(keys):
+            if address in selected:
+                stop = keys[index + 1] if index + 1 < len(keys) else None
+                if spans and spans[-1][1] == address:
+                    spans[-1][1] = stop
+                else:
+                    spans.append([address, stop])
+
+        if len(spans) > count:
+            gaps = sorted(range(len(spans) - 1),
+                          key=lambda index: spans[index + 1][0] - spans[index][1])
+            kept = set(gaps[len(spans) - count:])
+            joined = [spans[0]]
+            for index in range(1, len(spans)):
+                if index - 1 in kept:
+                    joined.append(spans[index])
+                else:
+                    joined[-1][1] = spans[index][1]
+            spans = joined
+
+        return [tuple(span) for span in spans]
+
+    def relink(self):
+        """ Links a rebuilt input file relative to the latest linked node
+            list of its location; follows build(), in place of link().
+            Returns False, linking nothing, when caching is disabled, no
+            previous run is found or branches are decoded from the ELF file.
+
+            A node is unchanged when its type, section, size and signature
+            match the node at the same address in the previous run. The
+            branches and pointers of unchanged nodes are reused, less those
+            no longer reaching a function. Only the other nodes are
+            disassembled again. Branches are PC-relative, so the callers of
+            a function that moved have changed contents too.
+
+            The words of unchanged objects are evaluated again for dispatch
+            table entries, as a table may point at a function added since.
+            A reused branch is not evaluated again should a function be
+            added at its target, within another function.
         """
-        lines = self.get_disassembly()
+        if not self.cache or self.branch_reader == 'elf':
+            return False
+
+        previous = self.get_cache().load_latest(self.get_source_key())
+        if previous is None:
+            return False
+
+        nodes = previous['nodes']
+        signatures = previous['signatures']
+        self.signatures = self.get_signatures()
+
+        unchanged = set()
+        for address, node in self.nodes.items():
+            old = nodes.get(address)
+            if (old is not None and
+                signatures.get(address) == self.signatures[address] and
+                old['type'] == node['type'] and
+                old['section'] == node['section'] and
+                old['size'] == node['size']):
+                unchanged.add(address)
+
+        def is_function(address):
+            node = self.nodes.get(address)
+            return node is not None and node['type'] == NodeType.function
+
+        self.function = {}
+        self.reference = {}
+        self.dispatch = {}
+        self.edges = {}
+
+        for address in unchanged:
+            branch = [child for child in nodes[address]['branch'] if is_function(child)]
+            self.nodes[address]['branch'] = branch
+            for child in branch:
+                self.nodes[child]['root'] = False
+
+        loads = select_pointers(previous['loads'], unchanged)
+        words = select_pointers(previous['words'], unchanged)
+        calls = select_pointers(previous['calls'], unchanged)
+
+        self.dispatch_table = {}
+        for address, pointer, site in zip(*words):
+            self.set_dispatch_entry(address, site, pointer)
+
+        changed = [address for address in sorted(self.nodes) if not address in unchanged]
+        if changed:
+            records = chain.from_iterable(map(tokenize, self.get_disassembly(start, stop))
+                                          for start, stop in self.get_spans(changed))
+            records = select_records(records, set(changed))
+            if self.disassemble == 'code':
+                records = chain(records, self.get_object_records(changed))
+            seen, changed_loads, changed_words, changed_calls = self.sweep(records)
+            loads = merge_pointers(loads, changed_loads)
+            words = merge_pointers(words, changed_words)
+            calls = merge_pointers(calls, changed_calls)
+
+        self.set_references(loads, words, calls)
+        self.edges = {}
+        return True
+
+    def link_shards(self):
+        """ Disassembles and sweeps address ranges concurrently across a
+            process pool, then merges the results in address order.
+        """
+        loads = (array('q'), array('q'))
+        words = tuple(array('q') for _ in range(3))
+        calls = tuple(array('q') for _ in range(4))
+
+        # More shards than workers evens out the load when shard sizes are
+        # a poor estimate of disassembly cost
+        shards = self.get_shards(self.jobs * 4)
+
+        with ProcessPoolExecutor(max_workers=self.jobs,
+                                 initializer=init_link_worker,
+                                 initargs=(self,)) as pool:
+            for branches, dispatch_table, shard_loads, shard_words, shard_calls in pool.map(
+                    link_shard, shards):
+                for address, branch in branches:
+                    self.nodes[address]['branch'] = branch
+                    for child in branch:
+                        self.nodes[child]['root'] = False
+
+                self.dispatch_table.update(dispatch_table)
+                for merged, shard in zip(loads + words + calls,
+                                         shard_loads + shard_words + shard_calls):
+                    merged.extend(shard)
 
-        self.set_dispatch(lines)
+        if self.disassemble == 'code':
+            # Objects hold no calls
+            seen, object_loads, object_words, object_calls = self.sweep(
+                self.get_object_records())
+            for merged, shard in zip(loads + words, object_loads + object_words):
+                merged.extend(shard)
 
+        self.set_references(loads, words, calls)
+
+    def get_shards(self, count):
+        """ Splits the address space at node boundaries into at most count
+            (start, stop) ranges of similar size. The last range is open.
+        """
+        addresses = sorted(self.nodes)
+        if not addresses:
+            return [(None, None)]
+
+        sizes = [max(self.nodes[address]['size'], 1) for address in addresses]
+        limit = sum(sizes) / count
+
+        shards = []
+        start = addresses[0]
+        total = 0
+        for address, size in zip(addresses, sizes):
+            if total >= limit:
+                shards.append((start, address))
+                start = address
+                total = 0
+            total += size
+        shards.append((start, None))
+        return shards
+
+    def get_object_spans(self):
+        """ Returns the sorted (starts, stops) address ranges of the objects,
+            which hold the dispatch and reference tables
+        """
+        starts = sorted(address for address, node in self.nodes.items()
+                        if node['type'] == NodeType.obj)
+        stops = [address + max(self.nodes[address]['size'], 1) for address in starts]
+        return starts, stops
+
+    def sweep(self, records):
+        """ Evaluates tokenized disassembly records in a single pass, linking
+            branches and recording dispatch table entries.
+
+            Pointers can only be classified once every dispatch table entry
+            is known. Rather than sweeping the disassembly twice, they are
+            recorded in compact (owner, pointer) arrays for set_references().
+
+            Registers loaded from a function's literal pool are traced to
+            the calls through them, and the constants they load are read
+            from the pool as the sweep reaches it.
+
+            Returns the node addresses seen, the pointers loaded by functions,
+            the (object, pointer, site) of the words stored in objects and the
+            (function, site, constant, offset) of the calls through a literal.
+        """
         in_progress = False
         address = 0
         node_type  = NodeType.unknown
 
-        function = {} # list, link to reference table(s)
-        reference = {} # list,  link to dispatch table(s)
-        dispatch = {} # list, table of function pointers
-
-        for line in lines:
-            if is_node_start(line):
+        seen = []
+        loads = (array('q'), array('q'))
+        words = tuple(array('q') for _ in range(3))
+        calls = tuple(array('q') for _ in range(4))
+
+        # Literal pool of the current function; registers traced, constants
+        # by address and calls awaiting their constant
+        registers = {}
+        literals = {}
+        pending = []
+        objects = None # address ranges of the objects, once a constant is found
+
+        def add_calls(owner):
+            for site, literal, offset in pending:
+                constant = literals.get(literal)
+                if constant is not None:
+                    for column, value in zip(calls, (owner, site, constant, offset)):
+                        column.append(value)
+            registers.clear()
+            literals.clear()
+            pending.clear()
+
+        for line_type, line_address, pointer, target in records:
+            if line_type == LineType.header:
                 # Start of node detected
-                address = get_node_address(line)
+                if literals:
+                    add_calls(address)
+                address = line_address
                 if ( address in self.nodes):
                     node_type = self.nodes[address]['type']
                     in_progress = True
                     self.nodes[address]['branch'] = []
+                    self.edges.pop(address, None)
+                    seen.append(address)
                 else:
                     in_progress = False
                     # TODO log print("Missing node: " + line)
 
             elif node_type == NodeType.function and in_progress:
-                if is_node_branch(line):
+                if line_type == LineType.branch:
                     # Branch detected
-                    target = get_branch_address(line)
                     self.link_to_function(address, target)
-
-                else:
-                    target = get_pointer(line)
-                    if target != -1:
+                    for register in CALLER_SAVED:
+                        registers.pop(register, None)
+
+                elif pointer != -1:
+                    # Only constants are loaded; a literal traced from its
+                    # load, or a data word. Instructions tokenize to their
+                    # first halfword, which could collide with low addresses.
+                    literal = bool(literals) and line_address in literals
+                    if literal or pointer > 0xFFFF:
                         # Convert thumb (odd) to ARM (even) state
-                        target = target if target % 2 == 0 else target - 1
-                        if target in self.dispatch_table:
-                            # Evaluate for accessing dispatch table (function pointer)
-                            function.setdefault(address, []).append(target)
-
-                        elif target in self.nodes:
-                            # Evaluate accessing function poiners directly
-                            #
-                            # Note: this discovers referencing functions
-                            # dynamically, such as setting a reference to.
-                            # The function is not actually called.
-                            if self.nodes[target]['type'] == NodeType.function:
-                                pass
-                                #print( self.nodes[address]['name'] + " ---- ", end="")
-                                #print( self.nodes[target]['name'] )
-             
+                        target = pointer if pointer % 2 == 0 else pointer - 1
+                        # Only pointers into an object can reach a dispatch
+                        # table, other constants are not kept
+                        if objects is None:
+                            objects = self.get_object_spans()
+                        if in_spans(objects, target):
+                            loads[0].append(address)
+                            loads[1].append(target)
+
+                    if literal:
+                        literals[line_address] = pointer
+                    elif pointer <= 0xFFFF and (registers or pointer & 0xF800 == 0x4800):
+                        call = trace_literal(registers, line_address, pointer)
+                        if call is not None:
+                            pending.append((line_address,) + call)
+                        for literal, offset in registers.values():
+                            literals.setdefault(literal, None)
+
             elif node_type == NodeType.obj and in_progress:
                 # Evaluate for dispatch table entry(s)
-                target = get_pointer(line)
-                if target != -1:
-                    if ( target in self.dispatch_table):
-                        # Indirect reference table to the dispatch table
-                        #print(self.nodes[address]['name'] + " --- " + self.nodes[target]['name'])
-                        reference.setdefault(address, []).append(target)
-                    elif ( target - 1 in self.nodes):
-                        #target -= 1  #TODO specific to thumb-2 mode, read ELF first
-                        #print(self.nodes[address]['name'] + " --- " + self.nodes[target]['name'])
-                        dispatch.setdefault(address, []).append(target - 1)
-                        
+                if pointer != -1:
+                    self.set_dispatch_entry(address, line_address, pointer)
+                    words[0].append(address)
+                    words[1].append(pointer)
+                    words[2].append(line_address)
 
             elif node_type == NodeType.vector_table and in_progress:
                 # Map function pointer calls
-                target = get_pointer(line)
-                self.link_to_function(address, target)
+                self.link_to_function(address, pointer)
 
+        if literals:
+            add_calls(address)
+        return seen, loads, words, calls
 
-        # Function link --> Reference Table --> Dispatch Table --> Function()
-        # TODO issue, cannot directly access initial offset value to determine
-        # which pointer is being accessed. Its in the disassembly code, but not
-        # a line descriptor. 
-        
-        """
-        for method, ref in function.items():
-            print(self.nodes[method]['name'])
-            for _ref in ref:
-                for _reference, xref in reference.items():
-                    if _ref == _reference:
-                        #print("i am here")
-                        #print(self.nodes[_reference]['name'])
-                        for _xref in xref:
-                            for _dispatch, ptr in dispatch.items():
-                                if _xref == _dispatch:
-                                    #if _ptr in self.nodes:
-                                    print("  " + self.nodes[_ref]['name'] + " --- " + self.nodes[_dispatch]['name'] + "  size: " + str( len(ptr)) )
-        """
-
-        """ For function pointers in the first degree and a dispatch table size 
-            of 1, the following will map simple function pointers.
-        """ 
-        """
-        node_count = 0
-        for _dispatch, ptr in dispatch.items():
-            for method, ref in function.items():
-                for _ref in ref:
-                    if _ref == _dispatch:
-                        node_count += 1
-                        print(self.nodes[method]['name'] + " --- " + self.nodes[_dispatch]['name'] + "  size: " + str( len(ptr)) )
-                        for _ptr in ptr:
-                            print("  " + self.nodes[_ptr]['name'] )
-        print("\nFunction pointers, 1st degree")
-        print("Matches: " + str(node_count) )
-        """
-
-        """ For function pointers in the first degree and a dispatch table size 
-            of 1, the following will map simple function pointers.
-        """ 
-        
-        """
-        # Displays all functions that directly reference a dispatch table
-        node_count = 0
-        for method, ref in function.items():
-            for _ref in ref:
-                    if _ref in self.dispatch_table:
-                        node_count += 1
-                        ptr = self.dispatch_table[_ref]
-                        print(self.nodes[method]['name'] + " --- " + self.nodes[ptr['table'] ]['name'] + " " + str(self.nodes[ptr['table'] ]['size']) )
-                        print("  " + self.nodes[ptr['function'] ]['name'] )
-                    else:
-                        print("\n **** Error: unable to find entry in dispatch table **** \n")
+    def link_elf(self):
+        """ Updates an existing node list with a node's branch list, decoding
+            the machine code and data in the ELF file rather than the text
+            disassembly.
 
-        print("\nFunction pointers")
-        print("References, 1st Degree: " + str(node_count) )
-        print("All, total: " + str(self.dispatch_table.__len__()) )
-
-        print("References, 2nd degree")
-        for key, table in reference.items():
-            print(self.nodes[key]['name'] + " --- " ) #+ self.nodes[table[0]]['name'])
+            Every word of the sections holding objects is checked for
+            function pointers at once, against sorted arrays of node
+            addresses.
         """
-        
-        #print("All function pointers")
-        #for key, ptr in self.dispatch_table.items():
-        #    print(self.nodes[ ptr['table'] ]['name'] + " ---- " + self.nodes[ ptr['function'] ]['name'])
+        # NumPy is only required by this reader
+        import arm_decoder
+
+        addresses = sorted(self.nodes)
+        functions = [key for key in addresses
+                     if self.nodes[key]['type'] == NodeType.function]
+        tables = [key for key in addresses
+                  if self.nodes[key]['type'] == NodeType.obj]
+        vectors = [key for key in addresses
+                   if self.nodes[key]['type'] == NodeType.vector_table]
+        sections = {self.nodes[key]['section'] for key in tables + vectors}
+
+        self.function = {}
+        self.reference = {}
+        self.dispatch = {}
+        self.edges = {}
 
-        """ Display all dispatch tables and associated function pointers
-        """
-        """
-        node_count = 0
-        unique_nodes = {}
-        for _dispatch, ptr in dispatch.items():
-            print(self.nodes[_dispatch]['name'])
-            for _ptr in ptr:
-                if not _ptr in unique_nodes:
-                    unique_nodes[_ptr] = 0
-                    node_count += 1
-                print("  " + self.nodes[_ptr]['name'] )
-        print("\nUnique function pointers, total " + str(node_count) )
+        for node in self.nodes.values():
+            node['branch'] = []
+
+        with ElfFile(self.infile) as elf:
+            for parent, child in arm_decoder.get_edges(elf, addresses):
+                if self.nodes[parent]['type'] == NodeType.function:
+                    self.link_to_function(parent, child)
+
+            regions = arm_decoder.get_data_regions(elf, sections)
+            sites, owners, words = arm_decoder.get_owned_words(elf, regions, addresses)
+
+            # Map function pointer calls
+            vector = arm_decoder.contains(vectors, owners)
+            for parent, child in zip(owners[vector].tolist(), words[vector].tolist()):
+                self.link_to_function(parent, child)
+
+            # Evaluate for dispatch table entry(s)
+            table = arm_decoder.contains(tables, owners)
+            sites, owners, words = sites[table], owners[table], words[table]
+            targets = arm_decoder.get_function_pointers(words, functions, addresses)
+            entry = targets != -1
+            for site, owner, target in zip(sites[entry].tolist(),
+                                           owners[entry].tolist(),
+                                           targets[entry].tolist()):
+                self.dispatch_table[site] = {'function': target, 'table': owner}
+
+            # Only pointers to a dispatch table entry or a node are of
+            # further interest
+            entries = sorted(self.dispatch_table)
+            pointer = (arm_decoder.contains(entries, words) |
+                       arm_decoder.contains(addresses, words - 1))
+            object_words = (owners[pointer].tolist(), words[pointer].tolist(),
+                            sites[pointer].tolist())
+
+            # As sweep() does, only pointers into an object can reach a
+            # dispatch or reference table
+            regions = arm_decoder.get_literal_regions(elf)
+            sites, owners, words = arm_decoder.get_owned_words(elf, regions, addresses)
+            words &= ~1
+            load = (arm_decoder.contains(functions, owners) &
+                    arm_decoder.within(*self.get_object_spans(), words))
+            loads = (owners[load].tolist(), words[load].tolist())
+
+            calls = self.get_literal_calls(elf, addresses, functions)
+
+        self.set_references(loads, object_words, calls)
+        self.edges = {}
+
+    def get_literal_calls(self, elf, addresses, functions):
+        """ Traces the registers loaded from a function's literal pool to the
+            calls through them, decoding the Thumb code as sweep() does the
+            disassembly; see trace_literal(). Only functions holding a
+            literal pool load are traced.
+
+            Returns (function, site, constant, offset) arrays.
         """
+        import arm_decoder
+
+        calls = tuple(array('q') for _ in range(4))
+        registers = {}
+        function = None
+        for site, code, branch, owner in arm_decoder.get_literal_code(elf, addresses, functions):
+            if owner != function:
+                registers.clear()
+                function = owner
+
+            if branch:
+                for register in CALLER_SAVED:
+                    registers.pop(register, None)
+            elif registers or code & 0xF800 == 0x4800:
+                call = trace_literal(registers, site, code)
+                if call is not None:
+                    # The constant is read from the pool, rather than when
+                    # the sweep reaches it
+                    literal, offset = call
+                    for constant in elf.get_words(literal, 4):
+                        for column, value in zip(calls, (owner, site, constant, offset)):
+                            column.append(value)
+        return calls
+
 
 def main():
     print("Node generator")
 
     nodes = Node()
     nodes.cli()
-    nodes.build()
-    nodes.link()
+    if not nodes.load_cache():
+        nodes.build()
+        if not nodes.relink():
+            nodes.link()
+        nodes.save_cache()
+    nodes.set_stack_usage()
     nodes.show_node_metrics()
     nodes.save()
 
@@ -0,0 +1,153 @@
+""" Compact, array backed storage for a linked node list. Replaces the
+    dictionary of dictionaries built by Node once the list is complete.
+"""
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+import sys
+
+from node_generator import NodeType, SymbolScope
+
+
+# Columns held in arrays, every other node attribute is kept as is
+COLUMNS = ('name', 'section', 'size', 'type', 'scope', 'root', 'branch')
+
+NODE_TYPES = {int(member): member for member in NodeType}
+SYMBOL_SCOPES = {int(member): member for member in SymbolScope}
+
+
+def get_dict_footprint(nodes):
+    """ Estimates the bytes held by a dictionary of node dictionaries,
+        including keys, values and branch lists
+    """
+    total = sys.getsizeof(nodes)
+    for address, node in nodes.items():
+        total += sys.getsizeof(address) + sys.getsizeof(node)
+        for value in node.values():
+            total += sys.getsizeof(value)
+            if isinstance(value, list):
+                total += sum(sys.getsizeof(item) for item in value)
+    return total
+
+
+class NodeTable(Mapping):
+    """ Read-only node list held in parallel arrays.
+
+        Nodes are located by binary search of the sorted address array. Names
+        and sections are interned in a single string table, and the branch
+        lists are stored in compressed sparse row form: the branches of the
+        node at position i are targets[offsets[i]:offsets[i + 1]], recorded
+        as positions.
+
+        Indexing returns a new dictionary with the same keys as a node built
+        by Node, so the table is a drop-in replacement for readers of the node
+        list. Changes to that dictionary are not stored.
+    """
+    def __init__(self, nodes=None):
+        nodes = nodes if nodes is not None else {}
+        self.addresses = array('q', sorted(nodes))
+
+        position = {address: index for index, address in enumerate(self.addresses)}
+        # Position of each node in the order of the source list
+        self.order = array('I', (position[address] for address in nodes))
+
+        self.strings = []
+        self.names = array('I')
+        self.sections = array('I')
+        self.sizes = array('q')
+        self.types = array('B')
+        self.scopes = array('B')
+        self.roots = array('B')
+        self.offsets = array('I', [0])
+        self.targets = array('I')
+        # Attributes outside the fixed columns, {address: {key: value}}
+        self.extra = {}
+
+        strings = {}
+        for address in self.addresses:
+            node = nodes[address]
+            self.names.append(strings.setdefault(node['name'], len(strings)))
+            self.sections.append(strings.setdefault(node['section'], len(strings)))
+            self.sizes.append(node['size'])
+            self.types.append(node['type'])
+            self.scopes.append(node['scope'])
+            self.roots.append(node['root'])
+            self.targets.extend(position[child] for child in node['branch'])
+            self.offsets.append(len(self.targets))
+
+            extra = {key: value for key, value in node.items() if not key in COLUMNS}
+            if extra:
+                self.extra[address] = extra
+
+        self.strings = list(strings)
+
+    def __getstate__(self):
+        # Columns read in place from a file are copied, a memory map cannot
+        # be pickled
+        state = self.__dict__.copy()
+        for key, value in state.items():
+            if isinstance(value, memoryview):
+                state[key] = array(value.format, value.tobytes())
+        return state
+
+    def get_position(self, address):
+        """ Returns the position of a node in the arrays
+        """
+        index = bisect_left(self.addresses, address)
+        if index == len(self.addresses) or self.addresses[index] != address:
+            raise KeyError(address)
+        return index
+
+    def __getitem__(self, address):
+        index = self.get_position(address)
+        node = {
+            'name': self.strings[self.names[index]],
+            'section': self.strings[self.sections[index]],
+            'size': self.sizes[index],
+            'type': NODE_TYPES.get(self.types[index], self.types[index]),
+            'scope': SYMBOL_SCOPES.get(self.scopes[index], self.scopes[index]),
+            'root': bool(self.roots[index]),
+            'branch': self.get_branch(address),
+            }
+        node.update(self.extra.get(address, {}))
+        return node
+
+    def __contains__(self, address):
+        index = bisect_left(self.addresses, address)
+        return index != len(self.addresses) and self.addresses[index] == address
+
+    def __iter__(self):
+        for index in self.order:
+            yield self.addresses[index]
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def get_branch(self, address):
+        """ Returns the branch list of a node, without building the node
+        """
+        index = self.get_position(address)
+        return [self.addresses[child] for child in
+                self.targets[self.offsets[index]:self.offsets[index + 1]]]
+
+    def get_footprint(self):
+        """ Returns the bytes held by each column, and their total
+        """
+        footprint = {}
+        for column in ('addresses', 'order', 'names', 'sections', 'sizes',
+                       'types', 'scopes', 'roots', 'offsets', 'targets'):
+            footprint[column] = sys.getsizeof(getattr(self, column))
+        footprint['strings'] = (sys.getsizeof(self.strings) +
+            sum(sys.getsizeof(string) for string in self.strings))
+        footprint['extra'] = get_dict_footprint(self.extra)
+        footprint['total'] = sum(footprint.values())
+        return footprint
+
+    def show_footprint(self):
+        """ Displays the memory held by the table, against the same nodes held
+            as dictionaries
+        """
+        footprint = self.get_footprint()
+        for column, size in footprint.items():
+            print("{:<9}, bytes: {}".format(column.capitalize(), size))
+        print("Dict list, bytes: " + str(get_dict_footprint(dict(self))))
@@ -0,0 +1,176 @@
+""" Records the cost of each analysis phase; wall and CPU time, peak memory,
+    the lines read from objdump and the counts reported by the phase, then
+    writes them as a JSON report.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Not available on Windows, the peak resident set size is then omitted
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+REPORT_VERSION = 1
+
+
+def get_rss_peak():
+    """ Returns the peak resident set size of the process, in bytes, or None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes, except by macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+    """ Collects the measurements of each phase, in the order run. A
+        disabled profiler runs each phase without measuring it.
+
+        memory: trace Python allocations, for the peak of each phase. Slows
+        every allocation.
+        calls: count the calls to the functions given to count_calls()
+
+        Lines and calls are only counted in this process, not in the workers
+        of a process pool.
+    """
+    def __init__(self, enabled=True, memory=False, calls=False):
+        self.enabled = enabled
+        self.memory = enabled and memory
+        self.calls = enabled and calls
+        self.phases = []
+        self.current = None
+        self.patched = [] # (owner, name, original or None)
+        self.started = datetime.now(timezone.utc)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+        if self.memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name, counts=None):
+        """ Measures the code run within the context as one phase
+
+            counts: optional function returning a dictionary of counts, such
+            as nodes or edges, evaluated once the phase completes
+        """
+        if not self.enabled:
+            yield
+            return
+
+        record = {'name': name, 'lines': {}, 'calls': {}}
+        self.current = record
+        if self.memory:
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            record['rss_peak'] = get_rss_peak()
+            if self.memory:
+                record['memory_peak'] = tracemalloc.get_traced_memory()[1] - traced
+            self.current = None
+            self.phases.append(record)
+
+        if counts is not None:
+            record['counts'] = counts()
+
+    def count_lines(self, owner, name):
+        """ Counts the lines yielded by a method, in the phase running them
+        """
+        if not self.enabled:
+            return
+
+        method = getattr(owner, name)
+        def counted(*args, **kwargs):
+            count = 0
+            try:
+                for line in method(*args, **kwargs):
+                    count += 1
+                    yield line
+            finally:
+                if self.current is not None:
+                    lines = self.current['lines']
+                    lines[name] = lines.get(name, 0) + count
+        self.patch(owner, name, counted)
+
+    def count_calls(self, owner, names):
+        """ Counts the calls to functions of a module, or methods of an
+            object, in the phase making them
+        """
+        if not self.calls:
+            return
+
+        for name in names:
+            function = getattr(owner, name)
+            def counted(*args, function=function, name=name, **kwargs):
+                if self.current is not None:
+                    calls = self.current['calls']
+                    calls[name] = calls.get(name, 0) + 1
+                return function(*args, **kwargs)
+            self.patch(owner, name, counted)
+
+    def patch(self, owner, name, function):
+        """ Replaces an attribute, until restore()
+        """
+        original = vars(owner).get(name) if hasattr(owner, '__dict__') else None
+        self.patched.append((owner, name, original))
+        setattr(owner, name, function)
+
+    def restore(self):
+        """ Restores every attribute replaced to count lines or calls
+        """
+        for owner, name, original in reversed(self.patched):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.patched = []
+
+    def get_report(self, **details):
+        """ Returns the report, including details of the run such as the
+            input file and options
+        """
+        report = {
+            'version': REPORT_VERSION,
+            'started': self.started.isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            }
+        report.update(details)
+        report['phases'] = self.phases
+        report['total'] = {
+            'wall': time.perf_counter() - self.wall,
+            'cpu': time.process_time() - self.cpu,
+            'rss_peak': get_rss_peak(),
+            }
+        if self.memory:
+            report['total']['memory_peak'] = max(
+                [phase['memory_peak'] for phase in self.phases], default=0)
+        return report
+
+    def save(self, filename, **details):
+        """ Writes the report to file, then stops counting and tracing
+        """
+        filename = Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with open(filename, 'w') as handle:
+            json.dump(self.get_report(**details), handle, indent=4, default=str)
+
+        self.restore()
+        if self.memory:
+            tracemalloc.stop()
+        return filename
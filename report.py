@@ -0,0 +1,131 @@
+""" Summarizes the worst-case stack of an analysis without the viewer, for
+    continuous integration; the deepest call chains, and the worst case of
+    each root and vector table entry, written as JSON or CSV.
+
+    Only the node list and the stack analyzer are needed, neither Tk nor
+    graphviz is imported.
+"""
+import csv
+import json
+from pathlib import Path
+
+from node_generator import NodeType
+from stack_analyzer import StackAnalyzer
+
+
+REPORT_VERSION = 1
+
+
+class StackReport:
+    """ Worst-case call chain of each root and vector table entry, ordered
+        by stack, then depth, as the stack analyzer compares chains.
+
+        top: number of call chains listed in full
+        budget: optional stack limit, in bytes, of every chain
+        indirect: follow resolved indirect calls, as well as branches
+    """
+    def __init__(self, nodes, top=10, budget=None, indirect=False):
+        self.nodes = nodes
+        self.top = top
+        self.budget = budget
+        self.analyzer = StackAnalyzer(nodes, indirect)
+        self.analyzer.analyze()
+        self.entries = self.get_entries()
+
+    def get_entry(self, address, kind, vector=None):
+        worst = self.analyzer.get_worst(address)
+        return {
+            'address': address,
+            'name': self.nodes[address]['name'],
+            'kind': kind,
+            'vector': vector,
+            'stack': worst['stack'],
+            'depth': worst['depth'],
+            'recursion': worst['recursion'],
+            'over_budget': self.budget is not None and worst['stack'] > self.budget,
+            'path': worst['path'],
+            }
+
+    def get_entries(self):
+        """ Returns the worst case of each root, then of each function listed
+            in a vector table, worst first
+        """
+        entries = [self.get_entry(key, 'root') for key in self.analyzer.get_roots()]
+        for key, node in self.nodes.items():
+            if node['type'] == NodeType.vector_table:
+                for branch in dict.fromkeys(node['branch']):
+                    if branch in self.analyzer.graph:
+                        entries.append(self.get_entry(branch, 'vector', node['name']))
+
+        entries.sort(key=lambda entry: (-entry['stack'], -entry['depth'], entry['address']))
+        return entries
+
+    def get_over_budget(self):
+        """ Returns the entries exceeding the stack budget
+        """
+        return [entry for entry in self.entries if entry['over_budget']]
+
+    def get_path_names(self, path):
+        return [self.nodes[address]['name'] for address in path]
+
+    def get_report(self, **details):
+        """ Returns the report; the top call chains with the name of each
+            function along them, and every entry without its chain
+        """
+        report = {'version': REPORT_VERSION}
+        report.update(details)
+        report['budget'] = self.budget
+        report['over_budget'] = len(self.get_over_budget())
+        report['chains'] = []
+        for entry in self.entries[:self.top]:
+            chain = dict(entry)
+            chain['path'] = self.get_path_names(entry['path'])
+            report['chains'].append(chain)
+        report['entries'] = [{key: value for key, value in entry.items() if key != 'path'}
+                             for entry in self.entries]
+        return report
+
+    def save_json(self, filename, **details):
+        with open(filename, 'w') as handle:
+            json.dump(self.get_report(**details), handle, indent=4, default=str)
+
+    def save_csv(self, filename):
+        """ Writes one row per entry, worst first. The chain of the top
+            entries is listed as function names separated by ' > '
+        """
+        columns = ['kind', 'vector', 'name', 'address', 'stack', 'depth',
+                   'recursion', 'over_budget', 'path']
+        with open(filename, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(columns)
+            for number, entry in enumerate(self.entries):
+                path = ''
+                if number < self.top:
+                    path = ' > '.join(self.get_path_names(entry['path']))
+                writer.writerow([entry['kind'], entry['vector'] or '', entry['name'],
+                                 hex(entry['address']), entry['stack'], entry['depth'],
+                                 entry['recursion'], entry['over_budget'], path])
+
+    def save(self, filename, report_format='json', **details):
+        """ Writes the report as JSON or CSV. Details of the run, such as
+            the input file, are only recorded in JSON.
+        """
+        filename = Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        if report_format == 'csv':
+            self.save_csv(filename)
+        else:
+            self.save_json(filename, **details)
+        return filename
+
+    def show(self):
+        """ Prints the top call chains, and the entries over budget
+        """
+        for entry in self.entries[:self.top]:
+            print("{:>8} B {:>4} deep  {}{}".format(entry['stack'], entry['depth'],
+                entry['name'], " (recursive)" if entry['recursion'] else ""))
+
+        if self.budget is not None:
+            over = self.get_over_budget()
+            print("{} of {} entries over the stack budget of {} B".format(
+                len(over), len(self.entries), self.budget))
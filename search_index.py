@@ -0,0 +1,171 @@
+""" Finds functions by name, and the call paths leading to them, without
+    expanding the call graph.
+"""
+from array import array
+from bisect import bisect_left
+
+from node_generator import NodeType
+
+
+def get_trigrams(text):
+    """ Returns the set of three character substrings of a text
+    """
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """ Index of the function names of a flat node list, and of the callers
+        of each function.
+
+        Names are matched without regard to case. Prefixes are found by
+        binary search of the sorted names. Substrings are found by
+        intersecting the names holding each trigram of the query, then
+        confirming the match.
+    """
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+        functions = [(node['name'], key) for key, node in nodes.items()
+                     if node['type'] == NodeType.function or
+                        node['type'] == NodeType.vector_table]
+        functions.sort(key=lambda function: (function[0].lower(), function[1]))
+
+        self.names = [name for name, key in functions]
+        self.keys = [name.lower() for name in self.names]
+        self.addresses = array('q', (key for name, key in functions))
+
+        self.trigrams = {}
+        for index, key in enumerate(self.keys):
+            for trigram in get_trigrams(key):
+                postings = self.trigrams.get(trigram)
+                if postings is None:
+                    postings = self.trigrams[trigram] = array('I')
+                postings.append(index)
+
+        self.callers = {}
+        for key, node in nodes.items():
+            if (node['type'] == NodeType.function or
+                node['type'] == NodeType.vector_table):
+                for branch in node['branch']:
+                    self.callers.setdefault(branch, []).append(key)
+
+        # Roots first, a search for call paths ends on them
+        for callers in self.callers.values():
+            callers.sort(key=lambda caller: not nodes[caller]['root'])
+
+    def find_prefix(self, text, limit=100):
+        """ Returns the position of each name beginning with a text, in name
+            order
+        """
+        text = text.lower()
+        result = []
+        index = bisect_left(self.keys, text)
+        while (index < len(self.keys) and len(result) < limit and
+               self.keys[index].startswith(text)):
+            result.append(index)
+            index += 1
+        return result
+
+    def find_substring(self, text, limit=100):
+        """ Returns the position of each name holding a text, in name order
+        """
+        text = text.lower()
+        trigrams = get_trigrams(text)
+        if not trigrams:
+            # Too short to index, every name is evaluated
+            candidates = range(len(self.keys))
+        else:
+            postings = sorted((self.trigrams.get(trigram, ()) for trigram in trigrams), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(posting)
+            candidates = sorted(candidates)
+
+        result = []
+        for index in candidates:
+            if text in self.keys[index]:
+                result.append(index)
+                if len(result) == limit:
+                    break
+        return result
+
+    def find(self, text, limit=100):
+        """ Returns (name, address) for functions matching a text; names
+            beginning with the text first, then names holding it
+        """
+        if not text:
+            return []
+
+        prefix = self.find_prefix(text, limit)
+        found = set(prefix)
+        result = prefix + [index for index in self.find_substring(text, limit + len(prefix))
+                           if not index in found]
+        return [(self.names[index], self.addresses[index]) for index in result[:limit]]
+
+    def get_callers(self, address):
+        """ Returns the address of each function branching to a function
+        """
+        return list(self.callers.get(address, []))
+
+    def get_reaching(self, address):
+        """ Returns the callers on a call path from a root node to a
+            function, the function included; those reaching it, and reached
+            from a root
+        """
+        # Callers reaching the function, by reverse breadth first search
+        reaching = {address}
+        work = [address]
+        while work:
+            for caller in self.callers.get(work.pop(), ()):
+                if not caller in reaching:
+                    reaching.add(caller)
+                    work.append(caller)
+
+        # Of those, the callers reached from a root
+        reached = {key for key in reaching if self.nodes[key]['root']}
+        work = list(reached)
+        while work:
+            for branch in self.nodes[work.pop()]['branch']:
+                if branch in reaching and not branch in reached:
+                    reached.add(branch)
+                    work.append(branch)
+        return reached
+
+    def paths_to(self, address, limit=100, visits=100000):
+        """ Returns the call paths from root nodes to a function, each a list
+            of addresses beginning with the root. A function is listed once
+            per path, so recursion cycles are not followed.
+
+            Callers on no path from a root are never visited. The number of
+            simple paths may still grow exponentially with the cycles of a
+            graph; the search ends after visiting a number of callers.
+        """
+        reached = self.get_reaching(address)
+        if not address in reached:
+            return []
+
+        paths = []
+        path = [address]
+        on_path = {address}
+        work = [iter(self.get_callers(address))]
+
+        if self.nodes[address]['root']:
+            paths.append([address])
+
+        while work and len(paths) < limit and visits > 0:
+            for caller in work[-1]:
+                if caller in on_path or not caller in reached:
+                    continue
+                visits -= 1
+                path.append(caller)
+                on_path.add(caller)
+                if self.nodes[caller]['root']:
+                    paths.append(path[::-1])
+                work.append(iter(self.get_callers(caller)))
+                break
+            else:
+                work.pop()
+                on_path.discard(path.pop())
+        return paths
@@ -0,0 +1,213 @@
+""" Computes the worst-case call depth and stack of each function from a flat
+    node list, without expanding the call paths into a tree.
+
+    Recursion cycles are condensed into single vertices, leaving a directed
+    acyclic graph. Each vertex is then evaluated once, after its callees, so
+    the cost is linear in the number of nodes and branches.
+"""
+from itertools import chain
+
+from node_generator import NodeType
+
+
+def get_components(graph):
+    """ Returns the strongly connected components of a graph, in reverse
+        topological order; every component follows the components it
+        branches to. Uses Tarjan's algorithm, without recursion so deep call
+        chains cannot exhaust the interpreter stack.
+
+        graph: {vertex: list of successors}, successors missing from the
+        graph are ignored
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in graph:
+        if root in index:
+            continue
+
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+
+        while work:
+            vertex, successors = work[-1]
+            for successor in successors:
+                if not successor in graph:
+                    continue
+                if not successor in index:
+                    # Descend, resuming this vertex's successors afterwards
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph[successor])))
+                    break
+                if successor in on_stack:
+                    low[vertex] = min(low[vertex], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[vertex])
+
+                if low[vertex] == index[vertex]:
+                    # Vertex is the first member of a component
+                    component = []
+                    member = None
+                    while member != vertex:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                    component.reverse()
+                    components.append(component)
+
+    return components
+
+
+class StackAnalyzer:
+    """ Evaluates the worst-case call chain of each function in a flat node
+        list.
+
+        A node's stack is read from its optional 'stack' attribute, in bytes,
+        and counts as zero when absent. Chains are compared by stack, then by
+        depth. A recursion cycle is counted as a single pass through each of
+        its members, so results reaching a cycle are flagged as recursive:
+        the true worst case is unbounded.
+
+        indirect: also follow the resolved indirect calls of each function,
+        its 'indirect' list
+    """
+    def __init__(self, nodes=None, indirect=False):
+        self.indirect = indirect
+        self.nodes = {}
+        self.graph = {}
+        self.components = []
+        self.component = {} # component index, by address
+        self.depth = [] # by component
+        self.stack = [] # by component
+        self.recursion = [] # by component, cycle reachable
+        self.next = [] # by component, address of the worst callee or None
+        self.analyzed = False
+
+        if nodes is not None:
+            self.set_nodes(nodes)
+
+    def set_nodes(self, nodes):
+        """ References a node list from a memory location
+        """
+        self.nodes = nodes
+        self.graph = {}
+        for key, node in nodes.items():
+            if (node['type'] == NodeType.function or
+                node['type'] == NodeType.vector_table):
+                self.graph[key] = node['branch']
+                if self.indirect and node.get('indirect'):
+                    self.graph[key] = list(dict.fromkeys(chain(node['branch'], node['indirect'])))
+        self.analyzed = False
+
+    def get_roots(self):
+        """ Returns the address of each root node, as evaluated by the
+            converter
+        """
+        return [key for key, node in self.nodes.items()
+                if key in self.graph and node['root']]
+
+    def analyze(self):
+        """ Evaluates every function, callees first
+        """
+        self.components = get_components(self.graph)
+        self.component = {}
+        for number, component in enumerate(self.components):
+            for member in component:
+                self.component[member] = number
+
+        self.depth = []
+        self.stack = []
+        self.recursion = []
+        self.next = []
+
+        for number, component in enumerate(self.components):
+            stack = 0
+            recursion = len(component) > 1
+            best = None
+            for member in component:
+                stack += self.nodes[member].get('stack', 0)
+                for branch in self.graph[member]:
+                    if not branch in self.component:
+                        continue
+                    callee = self.component[branch]
+                    if callee == number:
+                        # Direct recursion
+                        recursion = True
+                        continue
+
+                    recursion = recursion or self.recursion[callee]
+                    if (best is None or (self.stack[callee], self.depth[callee]) >
+                                        (self.stack[best[0]], self.depth[best[0]])):
+                        best = (callee, branch)
+
+            if best is None:
+                self.depth.append(len(component))
+                self.stack.append(stack)
+                self.next.append(None)
+            else:
+                self.depth.append(len(component) + self.depth[best[0]])
+                self.stack.append(stack + self.stack[best[0]])
+                self.next.append(best[1])
+            self.recursion.append(recursion)
+
+        self.analyzed = True
+
+    def get_worst(self, address):
+        """ Returns the worst-case call chain starting at a function, as a
+            dictionary of 'depth' (number of functions), 'stack' (bytes),
+            'recursion' and 'path' (address of each function)
+        """
+        if not self.analyzed:
+            self.analyze()
+
+        component = self.component[address]
+        return {
+            'depth': self.depth[component],
+            'stack': self.stack[component],
+            'recursion': self.recursion[component],
+            'path': self.get_worst_path(address),
+            }
+
+    def get_worst_path(self, address):
+        """ Returns the address of each function along the worst-case call
+            chain starting at a function. A recursion cycle is represented by
+            the member the chain enters it with.
+        """
+        if not self.analyzed:
+            self.analyze()
+
+        path = []
+        while address is not None:
+            path.append(address)
+            address = self.next[self.component[address]]
+        return path
+
+    def is_recursive(self, address):
+        """ Returns True if a recursion cycle can be reached from a function
+        """
+        if not self.analyzed:
+            self.analyze()
+
+        return self.recursion[self.component[address]]
+
+    def get_cycle(self, address):
+        """ Returns the members of the recursion cycle a function belongs to,
+            or an empty list
+        """
+        if not self.analyzed:
+            self.analyze()
+
+        component = self.components[self.component[address]]
+        if len(component) > 1 or address in self.graph[address]:
+            return list(component)
+        return []
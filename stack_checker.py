@@ -3,11 +3,14 @@
 """
 
 import argparse
+import sys
 from pathlib import Path
 
+import node_generator
 from node_generator import Node, parent_parser
 from converter import Converter
-from viewer import Viewer
+from profiler import Profiler
+from report import StackReport
 
 
 class StackChecker:
@@ -17,6 +20,18 @@ class StackChecker:
         self.output_path = Path()
         self.stack_path = Path()
         self.vector =""
+        self.symbol_reader = 'elf'
+        self.branch_reader = 'objdump'
+        self.jobs = 1
+        self.code_sections = ['.text']
+        self.disassemble = 'all'
+        self.cache = True
+        self.profile = None
+        self.report = None
+        self.top = 10
+        self.stack_budget = None
+        self.indirect_calls = False
+        self.prune = False
 
     def cli(self):
         """ Process user input from the command line.
@@ -27,6 +42,33 @@ class StackChecker:
             description="Analysis binary code and display stack & call information."
             )
 
+        cli_parser.add_argument('-pf', '--profile', nargs='*',
+            choices=['memory', 'calls'],
+            help="Write the time, memory, lines and counts of each phase to "
+                 "--output_path as JSON. Optionally trace the peak memory of "
+                 "Python objects and show the footprint of the node table, and "
+                 "count the calls to the parsers (slower)")
+
+        cli_parser.add_argument('-rp', '--report', nargs='?', const='json',
+            choices=['json', 'csv'],
+            help="Write the worst-case stack of each root and vector table "
+                 "entry to --output_path instead of launching the viewer")
+
+        cli_parser.add_argument('-t', '--top', type=int, default=10,
+            help="Number of call chains listed in full by --report")
+
+        cli_parser.add_argument('-b', '--stack_budget', type=int,
+            help="Stack limit in bytes; --report exits with status 1 when a "
+                 "call chain exceeds it")
+
+        cli_parser.add_argument('-ic', '--indirect_calls', action='store_true',
+            help="Include the calls resolved through dispatch tables in the "
+                 "worst-case chains of --report")
+
+        cli_parser.add_argument('-p', '--prune', action='store_true',
+            help="Remove the children of collapsed items in the viewer, "
+                 "bounding the number of items it holds")
+
         args = cli_parser.parse_args()
 
         # Input file will be processed directly by objdump utility, just 
@@ -41,35 +83,125 @@ class StackChecker:
         self.output_path = args.output_path
         self.stack_path = args.stack_path
         self.vector = args.vector
+        self.symbol_reader = args.symbol_reader
+        self.branch_reader = args.branch_reader
+        self.jobs = args.jobs
+        self.code_sections = args.code_sections
+        self.disassemble = args.disassemble
+        self.cache = not args.no_cache
+        self.profile = args.profile
+        self.report = args.report
+        self.top = args.top
+        self.stack_budget = args.stack_budget
+        self.indirect_calls = args.indirect_calls
+        self.prune = args.prune
+
+    def get_options(self):
+        """ Returns the options of the run, for reports
+        """
+        return {'objdump': self.objdump, 'output_path': self.output_path,
+                'stack_path': self.stack_path, 'vector': self.vector,
+                'symbol_reader': self.symbol_reader,
+                'branch_reader': self.branch_reader, 'jobs': self.jobs,
+                'code_sections': self.code_sections,
+                'disassemble': self.disassemble, 'cache': self.cache,
+                'report': self.report, 'top': self.top,
+                'stack_budget': self.stack_budget,
+                'indirect_calls': self.indirect_calls, 'prune': self.prune}
 
 def main():
-    """ Runs the required scripts and coordinates exchange of data
+    """ Runs the required scripts and coordinates exchange of data. Returns
+        the exit status, 1 when a reported call chain exceeds the stack budget
     """
     stack = StackChecker()
     stack.cli()
 
+    profile = stack.profile is not None
+    profiler = Profiler(profile, memory=profile and 'memory' in stack.profile,
+                        calls=profile and 'calls' in stack.profile)
+
     # Generate node flat list
     print("Generating node list...", end="", flush=True)
-    nodes = Node(stack.objdump, stack.infile, stack.vector, stack.stack_path, stack.output_path)
-    nodes.build()
-    nodes.link()
+    nodes = Node(stack.objdump, stack.infile, stack.vector, stack.stack_path, stack.output_path,
+                 symbol_reader=stack.symbol_reader, branch_reader=stack.branch_reader,
+                 jobs=stack.jobs, code_sections=stack.code_sections,
+                 disassemble=stack.disassemble, cache=stack.cache)
+    # The class is instrumented rather than the instance, which is copied
+    # to the workers of a process pool
+    for method in ('get_symbols', 'get_disassembly', 'get_contents'):
+        profiler.count_lines(Node, method)
+    profiler.count_calls(node_generator, ['tokenize', 'tokenize_symbol'])
+    profiler.count_calls(Node, ['link_to_function', 'set_dispatch_entry'])
+
+    with profiler.phase('cache load'):
+        cached = nodes.load_cache()
+    if not cached:
+        with profiler.phase('build', nodes.get_node_counts):
+            nodes.build()
+        with profiler.phase('link', nodes.get_node_counts):
+            if not nodes.relink():
+                nodes.link()
+        with profiler.phase('cache save'):
+            nodes.save_cache()
+    with profiler.phase('stack usage', lambda: {'matched': matched}):
+        matched = nodes.set_stack_usage()
+    with profiler.phase('compact', lambda: nodes.get_nodes().get_footprint()):
+        nodes.compact()
     print("done.")    
     #nodes.show_node_metrics()
+    if profile and 'memory' in stack.profile:
+        # Against the same nodes held as dictionaries, which takes a while
+        nodes.get_nodes().show_footprint()
+
+    if stack.report is not None:
+        # Headless, the call graph and viewer are not needed
+        print("Generating report...", end="", flush=True)
+        with profiler.phase('report', lambda: {'entries': len(report.entries)}):
+            report = StackReport(nodes.get_nodes(), stack.top, stack.stack_budget,
+                                 stack.indirect_calls)
+            filename = report.save(stack.output_path / (stack.infile.stem + '.report.'
+                                                        + stack.report),
+                                   stack.report, infile=stack.infile)
+        print("done.")
+        save_profile(stack, profiler, cached)
+        report.show()
+        print("Report saved to " + str(filename))
+        return 1 if report.get_over_budget() else 0
 
-    # Generate call graph
+    # Generate call graph, branches are expanded as the viewer opens them
     print("Generating call graph...", end="", flush=True)
     graph = Converter()
-    graph.set_nodes( nodes.get_nodes() )
-    graph.to_call_list()
+    counts = {}
+    with profiler.phase('call graph', lambda: counts):
+        graph.set_nodes( nodes.get_nodes() )
+        graph.set_cycles()
+        if profile:
+            # Counted within the phase, from the graph the analyzer built
+            analyzer = graph.analyzer
+            counts.update(cycles=len(graph.cycles), roots=len(analyzer.get_roots()),
+                          edges=sum(len(branch) for branch in analyzer.graph.values()))
     print("done.")    
 
-    # Launch viewer
+    save_profile(stack, profiler, cached)
+
+    # Launch viewer, Tk is only loaded when displayed
     print("Launching viewer...")
+    from viewer import Viewer
     viewer = Viewer()
-    viewer.set_graph( graph.get_graph() )
+    viewer.set_converter( graph )
+    viewer.prune = stack.prune
     viewer.show()
+    return 0
+
+def save_profile(stack, profiler, cached):
+    """ Writes the profile report, when requested
+    """
+    if stack.profile is not None:
+        filename = profiler.save(stack.output_path / (stack.infile.stem + '.profile.json'),
+                                 infile=stack.infile, cached=cached,
+                                 options=stack.get_options())
+        print("Profile saved to " + str(filename))
 
 
 if __name__ == "__main__":
-    main()
-    
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,236 @@
+""" Loads the stack usage of each function from the *.su files written by
+    GCC (-fstack-usage), and records it in a node list.
+
+    Each line of a *.su file describes one function:
+        main.c:12:6:main	16	static
+        main.cpp:8:5:int sensor::read(int)	24	dynamic,bounded
+"""
+from concurrent.futures import ProcessPoolExecutor
+from enum import auto, IntEnum
+from pathlib import Path
+import json
+import re
+
+from elf_reader import demangle
+
+
+class StackQualifier(IntEnum):
+    static = auto()
+    dynamic = auto()
+    bounded = auto()
+
+
+QUALIFIERS = {
+    'static': StackQualifier.static,
+    'dynamic': StackQualifier.dynamic,
+    'dynamic,bounded': StackQualifier.bounded,
+    }
+
+# Source, line, optional column, function. The source may hold a drive
+# letter and the function may hold scope operators.
+LOCATION = re.compile(r'^(.*?):(\d+):(?:(\d+):)?(.*)$')
+
+# Bumped whenever the cached frame layout changes
+CACHE_VERSION = 1
+
+
+def parse_line(line):
+    """ Returns (source, function, stack, qualifier) for a line of a *.su
+        file, or None if the line is malformed
+    """
+    fields = line.rstrip('\r\n').split('\t')
+    if len(fields) != 3:
+        return None
+
+    match = LOCATION.match(fields[0])
+    if match is None or not fields[1].isdigit():
+        return None
+
+    return (match.group(1), match.group(4), int(fields[1]),
+            QUALIFIERS.get(fields[2], StackQualifier.dynamic))
+
+
+def parse_file(filename):
+    """ Returns the (source, function, stack, qualifier) records of a *.su
+        file
+    """
+    with open(filename, 'r', encoding='utf-8', errors='replace') as handle:
+        return [record for record in map(parse_line, handle) if record is not None]
+
+
+def parse_files(filenames):
+    """ Parses a batch of files in a worker process
+    """
+    return [parse_file(filename) for filename in filenames]
+
+
+def get_function_name(name):
+    """ Returns the name used to match a function to a node. Mangled names
+        are demangled, and the return type GCC prints ahead of C++ functions
+        is removed, as are clone suffixes added by objdump.
+    """
+    name = demangle(name)
+
+    clone = name.find(' [clone ')
+    if clone != -1:
+        name = name[:clone]
+
+    paren = name.find('(')
+    if paren == -1:
+        return name
+
+    # The name begins after the last space outside of template arguments,
+    # not counting the space of an operator
+    depth = 0
+    start = 0
+    for index, char in enumerate(name[:paren]):
+        if char == '<':
+            depth += 1
+        elif char == '>':
+            depth -= 1
+        elif char == ' ' and depth == 0 and not name[:index].endswith('operator'):
+            start = index + 1
+    return name[start:]
+
+
+def get_unit(filename):
+    """ Returns the name of a translation unit, its source or object file
+        without directory or extension. *.su files may hold Windows paths.
+    """
+    name = re.split(r'[\\/]', filename)[-1]
+    dot = name.rfind('.')
+    return name[:dot] if dot > 0 else name
+
+
+class StackUsage:
+    """ Index of the stack frames found in the *.su files of one or more
+        directories
+    """
+    def __init__(self, stack_path=(), output_path=Path('.'), jobs=1):
+        if isinstance(stack_path, (list, tuple)):
+            self.stack_path = [Path(path) for path in stack_path]
+        else:
+            self.stack_path = [Path(stack_path)]
+        self.output_path = Path(output_path)
+        self.jobs = jobs
+
+        self.frames = {} # (stack, qualifier), by (source, function, qualifier)
+        self.names = {} # list of frame keys, by function name
+        self.parsed = 0 # files parsed, rather than read from the cache
+
+    def get_files(self):
+        """ Returns every *.su file found in the stack paths
+        """
+        files = set()
+        for path in self.stack_path:
+            if path.is_file():
+                files.add(path.absolute())
+            elif path.is_dir():
+                files.update(filename.absolute() for filename in path.rglob('*.su'))
+        return sorted(files)
+
+    def get_cache_file(self):
+        return self.output_path / 'stack_usage.cache.json'
+
+    def read_cache(self):
+        """ Returns the records of previously parsed files, by file name
+        """
+        try:
+            with open(self.get_cache_file(), 'r') as handle:
+                cache = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+        if cache.get('version') != CACHE_VERSION:
+            return {}
+        return cache['files']
+
+    def write_cache(self, files):
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        with open(self.get_cache_file(), 'w') as handle:
+            json.dump({'version': CACHE_VERSION, 'files': files}, handle)
+
+    def load(self):
+        """ Parses the *.su files, reusing the cached records of each file
+            whose modification time and size are unchanged
+        """
+        cache = self.read_cache()
+        files = {}
+        stale = []
+        for filename in self.get_files():
+            status = filename.stat()
+            entry = cache.get(str(filename))
+            if (entry is not None and entry['mtime'] == status.st_mtime_ns and
+                entry['size'] == status.st_size):
+                files[str(filename)] = entry
+            else:
+                files[str(filename)] = {'mtime': status.st_mtime_ns,
+                    'size': status.st_size, 'records': []}
+                stale.append(filename)
+
+        for filename, records in zip(stale, self.parse(stale)):
+            files[str(filename)]['records'] = records
+        self.parsed = len(stale)
+
+        if stale or len(files) != len(cache):
+            self.write_cache(files)
+
+        self.frames = {}
+        self.names = {}
+        for entry in files.values():
+            for source, function, stack, qualifier in entry['records']:
+                self.add_frame(source, function, stack, StackQualifier(qualifier))
+
+    def parse(self, filenames):
+        """ Returns the records of each file, parsed across a process pool
+            when more than one job is allowed
+        """
+        if self.jobs <= 1 or len(filenames) < 2:
+            return [parse_file(filename) for filename in filenames]
+
+        # Batches amortize the cost of sending each file to a worker
+        size = max(1, len(filenames) // (self.jobs * 4))
+        batches = [filenames[index:index + size] for index in range(0, len(filenames), size)]
+        records = []
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            for batch in pool.map(parse_files, batches):
+                records.extend(batch)
+        return records
+
+    def add_frame(self, source, function, stack, qualifier):
+        """ Indexes a stack frame, keeping the largest of duplicate entries
+        """
+        key = (source, function, qualifier)
+        if not key in self.frames:
+            self.names.setdefault(get_function_name(function), []).append(key)
+            self.frames[key] = stack
+        else:
+            self.frames[key] = max(self.frames[key], stack)
+
+    def get_frame(self, name, unit=None):
+        """ Returns (stack, qualifier) for a function name, or None. Static
+            functions of the same name in several source files are told
+            apart by unit, the source file of the function; without it, or
+            when no file of that unit lists the function, the largest frame
+            is returned.
+        """
+        keys = self.names.get(get_function_name(name))
+        if not keys:
+            return None
+        if unit is not None:
+            unit = get_unit(unit)
+            keys = [key for key in keys if get_unit(key[0]) == unit] or keys
+        return max((self.frames[key], key[2]) for key in keys)
+
+    def set_nodes(self, nodes):
+        """ Records the 'stack' and 'stack_qualifier' of each node matching a
+            function, local functions within their 'unit'. Returns the
+            number of nodes matched.
+        """
+        matched = 0
+        for node in nodes.values():
+            frame = self.get_frame(node['name'], node.get('unit'))
+            if frame is not None:
+                node['stack'], node['stack_qualifier'] = frame
+                matched += 1
+        return matched
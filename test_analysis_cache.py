@@ -0,0 +1,221 @@
+import unittest
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import fixtures
+import node_generator as ng
+from analysis_cache import AnalysisCache
+
+
+# A rebuild of the transcript, cmd_a now calls helper
+REBUILT = {
+    b' 8000128:\t4770      \tbx\tlr':
+    b' 8000128:\tf7ff fffc \tbl\t8000124 <helper>',
+    }
+
+
+class FixtureNode(fixtures.FixtureNode):
+    """ Counts the objdump passes a cached run avoids, and the ranges
+        disassembled. A rebuilt node sources the rebuilt transcript.
+    """
+    def __init__(self, infile, output_path, rebuilt=False, **kwargs):
+        super().__init__(infile=infile, output_path=output_path, **kwargs)
+        self.rebuilt = rebuilt
+        self.ranges = []
+
+    def get_symbols(self):
+        self.passes += 1
+        return super().get_symbols()
+
+    def get_lines(self):
+        lines = super().get_lines()
+        if self.rebuilt:
+            lines = (REBUILT.get(line, line) for line in lines)
+        return lines
+
+    def get_disassembly(self, start=None, stop=None):
+        self.ranges.append((start, stop))
+        return super().get_disassembly(start, stop)
+
+    def get_signatures(self):
+        """ Digests the transcript lines of each node, standing in for its
+            contents
+        """
+        contents = {}
+        address = None
+        for line in self.get_lines():
+            line_type, line_address, pointer, target = ng.tokenize(line)
+            if line_type == ng.LineType.header:
+                address = line_address
+            if address in self.nodes:
+                contents[address] = contents.get(address, b'') + line
+        return {address: contents.get(address) for address in self.nodes}
+
+    def analyze(self):
+        if not self.load_cache():
+            self.build()
+            if not self.relink():
+                self.link()
+            self.save_cache()
+
+
+class AnalysisCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """ Run before each test
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = Path(self.directory.name)
+        self.infile = self.root / 'app.elf'
+        self.infile.write_bytes(b'\x7fELF' + bytes(range(256)))
+        self.cache = AnalysisCache(self.root / 'cache')
+
+    def tearDown(self):
+        """ Run after each test
+        """
+        self.directory.cleanup()
+
+    def test_key(self):
+        key = self.cache.get_key(self.infile, 'objdump', ['', 'elf'])
+        self.assertEqual(key, self.cache.get_key(self.infile, 'objdump', ['', 'elf']))
+        self.assertNotEqual(key, self.cache.get_key(self.infile, 'objdump', ['', 'objdump']))
+        self.assertNotEqual(key, self.cache.get_key(self.infile, 'nm', ['', 'elf']))
+
+        self.infile.write_bytes(b'\x7fELF' + bytes(range(255)))
+        self.assertNotEqual(key, self.cache.get_key(self.infile, 'objdump', ['', 'elf']))
+
+    def test_save(self):
+        self.assertIsNone(self.cache.load('missing'))
+
+        state = ({1: {'type': ng.NodeType.function, 'branch': [2]}}, {})
+        self.cache.save('key', state)
+        self.assertEqual(self.cache.load('key'), state)
+        self.assertEqual(list(self.cache.path.glob('*.tmp')), [])
+
+        # Corrupt entries are ignored
+        self.cache.get_file('key').write_bytes(b'\x80\x05')
+        self.assertIsNone(self.cache.load('key'))
+
+    def test_evict(self):
+        cache = AnalysisCache(self.root / 'cache', max_size=2500)
+        now = time.time()
+        for number in range(3):
+            cache.save(str(number), bytes(1000))
+            os.utime(cache.get_file(str(number)), (now + number, now + number))
+
+        # Least recently used first
+        cache.evict()
+        self.assertEqual(sorted(path.stem for path in cache.path.glob('*.pickle')), ['1', '2'])
+
+        cache.max_age = 60
+        os.utime(cache.get_file('1'), (now - 3600, now - 3600))
+        cache.evict()
+        self.assertEqual([path.stem for path in cache.path.glob('*.pickle')], ['2'])
+
+    def test_node(self):
+        output = self.root / 'output'
+        first = FixtureNode(self.infile, output)
+        first.analyze()
+        self.assertEqual(first.passes, 2)
+
+        second = FixtureNode(self.infile, output)
+        second.analyze()
+        self.assertEqual(second.passes, 0)
+        self.assertEqual(second.get_nodes(), first.get_nodes())
+        self.assertEqual(second.dispatch, first.dispatch)
+        for node in second.get_nodes().values():
+            self.assertIs(type(node['type']), ng.NodeType)
+            self.assertIs(type(node['scope']), ng.SymbolScope)
+
+        # The number of jobs does not change the result
+        third = FixtureNode(self.infile, output, jobs=2)
+        self.assertTrue(third.load_cache())
+
+        # Options changing the result, or a modified input file, miss
+        third = FixtureNode(self.infile, output, disassemble='code')
+        self.assertFalse(third.load_cache())
+
+        self.infile.write_bytes(b'\x7fELF')
+        third = FixtureNode(self.infile, output)
+        self.assertFalse(third.load_cache())
+
+        third = FixtureNode(self.infile, output, cache=False)
+        third.analyze()
+        self.assertEqual(third.passes, 2)
+        self.assertEqual(len(list((output / 'cache').glob('*.pickle'))), 1)
+
+    def test_relink(self):
+        output = self.root / 'output'
+        first = FixtureNode(self.infile, output)
+        first.analyze()
+
+        # No previous run of this location
+        other = FixtureNode(self.root / 'other.elf', output)
+        other.infile.write_bytes(b'\x7fELF')
+        other.build()
+        self.assertFalse(other.relink())
+
+        expected = FixtureNode(self.infile, output, rebuilt=True, cache=False)
+        expected.build()
+        expected.link()
+
+        self.infile.write_bytes(b'\x7fELF rebuilt')
+        second = FixtureNode(self.infile, output, rebuilt=True)
+        second.analyze()
+
+        # Only cmd_a is disassembled again
+        self.assertEqual(second.ranges, [(0x8000128, 0x800012c)])
+        self.assertEqual(second.get_nodes(), expected.get_nodes())
+        self.assertEqual(second.dispatch_table, expected.dispatch_table)
+        self.assertEqual(second.function, expected.function)
+        self.assertEqual(second.reference, expected.reference)
+        self.assertEqual(second.dispatch, expected.dispatch)
+        self.assertEqual(second.call_sites, expected.call_sites)
+        self.assertEqual(second.call_sites, {0x8000118: [0x8000128, 0x800012c]})
+
+        # The rebuilt file is now the previous run
+        third = FixtureNode(self.infile, output, rebuilt=True)
+        self.assertTrue(third.load_cache())
+
+    def test_added_function(self):
+        """ An unchanged table pointing at a function added since the
+            previous run gains its dispatch table entry
+        """
+        class PartialNode(FixtureNode):
+            def get_symbols(self):
+                return (line for line in super().get_symbols()
+                        if not line.endswith(b' cmd_b'))
+
+        output = self.root / 'output'
+        first = PartialNode(self.infile, output)
+        first.analyze()
+        self.assertFalse(0x8000204 in first.dispatch_table)
+
+        expected = FixtureNode(self.infile, output, cache=False)
+        expected.build()
+        expected.link()
+
+        self.infile.write_bytes(b'\x7fELF rebuilt')
+        second = FixtureNode(self.infile, output)
+        second.analyze()
+
+        # Only cmd_b is disassembled
+        self.assertEqual(second.ranges, [(0x800012c, 0x8000130)])
+        self.assertEqual(second.dispatch_table[0x8000204],
+                         {'function': 0x800012c, 'table': 0x8000200})
+        self.assertEqual(second.dispatch_table, expected.dispatch_table)
+        self.assertEqual(second.get_nodes(), expected.get_nodes())
+        self.assertEqual(second.call_sites, expected.call_sites)
+
+    def test_spans(self):
+        node = FixtureNode(self.infile, self.root / 'output')
+        node.build()
+        self.assertEqual(node.get_spans([0x8000108, 0x800010c, 0x8000128]),
+                         [(0x8000108, 0x8000124), (0x8000128, 0x800012c)])
+        self.assertEqual(node.get_spans([0x8000000, 0x8000128, 0x800020c], count=2),
+                         [(0x8000000, 0x800012c), (0x800020c, None)])
+
+
+unittest.main()
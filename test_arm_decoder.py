@@ -0,0 +1,128 @@
+import unittest
+import struct
+
+import arm_decoder as ad
+
+
+def thumb(*halfwords):
+    return struct.pack('<%dH' % len(halfwords), *halfwords)
+
+
+def arm(*words):
+    return struct.pack('<%dI' % len(words), *words)
+
+
+class ThumbTestCase(unittest.TestCase):
+
+    def decode(self, data, address):
+        sites, targets = ad.decode_thumb(data, address)
+        return list(zip(sites.tolist(), targets.tolist()))
+
+    def test_bl(self):
+        # 800010e:	f000 f809 	bl	8000124 <helper>
+        result = self.decode(thumb(0xf000, 0xf809), 0x800010e)
+        self.assertEqual(result, [(0x800010e, 0x8000124)])
+
+        # Backward call
+        # 8000124:	f7ff fff2 	bl	800010c <main>
+        result = self.decode(thumb(0xf7ff, 0xfff2), 0x8000124)
+        self.assertEqual(result, [(0x8000124, 0x800010c)])
+
+    def test_blx(self):
+        # 1002:	f000 effe 	blx	2000
+        result = self.decode(thumb(0xbf00, 0xf000, 0xeffe), 0x1000)
+        self.assertEqual(result, [(0x1002, 0x2000)])
+
+    def test_branch(self):
+        # 8000130:	e7fe      	b.n	8000130 <Default_Handler>
+        result = self.decode(thumb(0xe7fe), 0x8000130)
+        self.assertEqual(result, [(0x8000130, 0x8000130)])
+
+        # 1000:	f000 b800 	b.w	1004
+        result = self.decode(thumb(0xf000, 0xb800), 0x1000)
+        self.assertEqual(result, [(0x1000, 0x1004)])
+
+        # 1000:	d001      	beq.n	1006
+        result = self.decode(thumb(0xd001), 0x1000)
+        self.assertEqual(result, [(0x1000, 0x1006)])
+
+        # 1000:	f000 8001 	beq.w	1006
+        result = self.decode(thumb(0xf000, 0x8001), 0x1000)
+        self.assertEqual(result, [(0x1000, 0x1006)])
+
+        # 1000:	b108      	cbz	r0, 1006
+        result = self.decode(thumb(0xb108), 0x1000)
+        self.assertEqual(result, [(0x1000, 0x1006)])
+
+    def test_instruction_boundary(self):
+        """ The second halfword of a call may look like the first halfword
+            of another 32-bit instruction
+        """
+        data = thumb(0xb508, 0xf000, 0xf809, 0xf000, 0xf807, 0x4b02, 0xe7fe)
+        result = self.decode(data, 0x800010c)
+        self.assertEqual(result, [(0x800010e, 0x8000124), (0x8000112, 0x8000124),
+            (0x8000118, 0x8000118)])
+
+    def test_other(self):
+        # push, ldr, blx r3, svc, udf and a truncated 32-bit instruction
+        data = thumb(0xb508, 0x4b02, 0x4798, 0xdf00, 0xde00, 0xf000)
+        self.assertEqual(self.decode(data, 0x1000), [])
+        self.assertEqual(self.decode(b'', 0x1000), [])
+
+
+class ArmTestCase(unittest.TestCase):
+
+    def decode(self, data, address):
+        sites, targets = ad.decode_arm(data, address)
+        return list(zip(sites.tolist(), targets.tolist()))
+
+    def test_bl(self):
+        # 1000:	eb0003fe 	bl	2000
+        result = self.decode(arm(0xeb0003fe), 0x1000)
+        self.assertEqual(result, [(0x1000, 0x2000)])
+
+        # 2000:	ebfffbfe 	bl	1000
+        result = self.decode(arm(0xebfffbfe), 0x2000)
+        self.assertEqual(result, [(0x2000, 0x1000)])
+
+    def test_blx(self):
+        # 1004:	fb0003fd 	blx	2002
+        result = self.decode(arm(0xe1a00000, 0xfb0003fd), 0x1000)
+        self.assertEqual(result, [(0x1004, 0x2002)])
+
+    def test_other(self):
+        # mov, push, bx lr
+        result = self.decode(arm(0xe1a00000, 0xe92d4010, 0xe12fff1e), 0x1000)
+        self.assertEqual(result, [])
+
+
+class PointerTestCase(unittest.TestCase):
+
+    def test_contains(self):
+        values = ad.np.array([1, 5, 7, 100])
+        self.assertEqual(ad.contains([5, 7, 9], values).tolist(),
+            [False, True, True, False])
+        self.assertEqual(ad.contains([], values).tolist(),
+            [False, False, False, False])
+
+    def test_within(self):
+        values = ad.np.array([0x0ff, 0x100, 0x107, 0x108, 0x200, 0x203, 0x300])
+        self.assertEqual(ad.within([0x100, 0x200], [0x108, 0x204], values).tolist(),
+            [False, True, True, False, True, True, False])
+
+    def test_owners(self):
+        sites = ad.np.array([0x0fe, 0x100, 0x1fe, 0x204])
+        self.assertEqual(ad.get_owners([0x100, 0x200], sites).tolist(),
+            [-1, 0x100, 0x100, 0x200])
+        self.assertEqual(ad.get_owners([], sites).tolist(), [-1, -1, -1, -1])
+
+    def test_function_pointers(self):
+        functions = [0x100, 0x200]
+        addresses = [0x100, 0x200, 0x301, 0x400]
+        words = ad.np.array([0x100, 0x201, 0x301, 0x302, 0x401, 0])
+        result = ad.get_function_pointers(words, functions, addresses)
+        # ARM, Thumb, odd node address, no node, object, null
+        self.assertEqual(result.tolist(), [0x100, 0x200, -1, -1, -1, -1])
+
+
+unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import json
+import pickle
+import tempfile
+from pathlib import Path
+
+import binary_format as bf
+import converter as conv
+import node_generator as ng
+from node_table import NodeTable
+
+
+def load(filename):
+    """ Gets a node list or call graph from file
+    """
+    with open(filename, 'r') as handle:
+        return json.load(handle, object_hook=conv.jsonKeys2int)
+
+
+class BinaryFormatTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """ Run before each test
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = Path(self.directory.name)
+
+    def tearDown(self):
+        """ Run after each test
+        """
+        self.directory.cleanup()
+
+    def test_nodes(self):
+        nodes = load('test_node_generator.list.json')
+        for compress in (False, True):
+            filename = self.root / 'list.node.bin'
+            bf.save_nodes(filename, nodes, compress)
+            table = bf.load_nodes(filename)
+            self.assertIsInstance(table, NodeTable)
+            self.assertEqual(dict(table), nodes)
+            self.assertEqual(list(table), list(nodes))
+            self.assertTrue(bf.is_binary(filename))
+
+        # Compressed files are smaller, both are smaller than JSON
+        uncompressed = self.root / 'uncompressed.node.bin'
+        bf.save_nodes(uncompressed, nodes)
+        self.assertLess(filename.stat().st_size, uncompressed.stat().st_size)
+        self.assertLess(uncompressed.stat().st_size,
+                        Path('test_node_generator.list.json').stat().st_size)
+
+    def test_pickle(self):
+        """ Tables read from a file can be sent to worker processes
+        """
+        filename = self.root / 'list.node.bin'
+        bf.save_nodes(filename, load('test_node_generator.list.json'))
+        table = bf.load_nodes(filename)
+        self.assertIsInstance(table.addresses, memoryview)
+        copy = pickle.loads(pickle.dumps(table))
+        self.assertEqual(dict(copy), dict(table))
+
+    def test_extra(self):
+        nodes = load('test_recursion.json')
+        nodes[1001]['stack'] = 24
+        filename = self.root / 'recursion.node.bin'
+        bf.save_nodes(filename, NodeTable(nodes))
+        table = bf.load_nodes(filename)
+        self.assertEqual(table[1001]['stack'], 24)
+        self.assertIs(table[1001]['type'], ng.NodeType.function)
+        self.assertEqual(table.get_branch(1002), [1001, 1003])
+
+    def test_empty(self):
+        filename = self.root / 'empty.node.bin'
+        bf.save_nodes(filename, {})
+        self.assertEqual(dict(bf.load_nodes(filename)), {})
+
+        bf.save_graph(filename, {})
+        self.assertEqual(bf.load_graph(filename), {})
+
+    def test_graph(self):
+        graph = load('test_recursion.expected.json')
+        for compress in (False, True):
+            filename = self.root / 'recursion.graph.bin'
+            bf.save_graph(filename, graph, compress)
+            self.assertEqual(bf.load_graph(filename), graph)
+
+        with self.assertRaises(ValueError):
+            bf.load_nodes(filename)
+
+    def test_convert(self):
+        """ JSON files round trip through the binary format
+        """
+        for fixture in ('test_recursion.json', 'test_recursion.expected.json'):
+            binary = self.root / 'fixture.bin'
+            result = self.root / 'fixture.json'
+            bf.to_binary(fixture, binary, compress=True)
+            bf.to_json(binary, result)
+            self.assertEqual(load(result), load(fixture))
+            self.assertFalse(bf.is_binary(result))
+
+    def test_converter(self):
+        """ The converter reads binary node lists and saves binary call graphs
+        """
+        filename = self.root / 'recursion.node.bin'
+        bf.to_binary('test_recursion.json', filename)
+
+        graph = conv.Converter()
+        graph.load(filename)
+        graph.to_call_list()
+        graph.save(filename, binary=True)
+        self.assertEqual(bf.load_graph(self.root / 'recursion.graph.bin'),
+                         load('test_recursion.expected.json'))
+
+
+unittest.main()
@@ -1,5 +1,10 @@
 import unittest
 import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
 import converter as conv
 
 def setUpModule():
@@ -60,4 +65,145 @@ class RecursionTestCase(unittest.TestCase):
         expected = self.load('test_recursion.expected.json')
         self.assertEqual(expected, self.nodes.call_graph)
 
+    def test_cycles(self):
+        """ Each recursion cycle is labeled once
+        """
+        cycles = sorted(sorted(cycle) for cycle in self.nodes.cycles)
+        self.assertEqual(cycles, [[1004, 1005], [2005], [3001], [4002]])
+        self.assertEqual(sorted(self.nodes.get_cycle(1005)), [1004, 1005])
+        self.assertEqual(self.nodes.get_cycle(4002), [4002])
+        self.assertEqual(self.nodes.get_cycle(4001), [])
+        self.assertEqual(self.nodes.get_cycle(1002), [])
+
+    def test_jobs(self):
+        """ Roots generated across processes are merged in the order of the
+            node list
+        """
+        graph = conv.Converter()
+        graph.load(self.filename)
+        graph.to_call_list(jobs=3)
+        self.assertEqual(graph.call_graph, self.nodes.call_graph)
+        self.assertEqual(list(graph.call_graph), list(self.nodes.call_graph))
+
+    def test_deep_chain(self):
+        """ A long call chain without recursion is expanded in one pass
+        """
+        nodes = {}
+        for address in range(1, 3001):
+            nodes[address] = {'name': str(address), 'section': '.text',
+                'size': 0, 'type': 17, 'scope': 11, 'root': address == 1,
+                'branch': [address + 1] if address < 3000 else []}
+        graph = conv.Converter()
+        graph.set_nodes(nodes)
+        graph.to_call_list()
+
+        node = graph.call_graph[1]
+        while node['address'] < 3000:
+            self.assertFalse(node['recursion'])
+            node = node[node['address'] + 1]
+        self.assertEqual(node['level'], 2999)
+
+class UpdateTestCase(unittest.TestCase):
+
+    def test_update(self):
+        nodes = {
+            1: {'name': 'main', 'type': conv.NodeType.function, 'root': True, 'branch': [3]},
+            2: {'name': 'isr', 'type': conv.NodeType.function, 'root': True, 'branch': [4]},
+            3: {'name': 'a', 'type': conv.NodeType.function, 'root': False, 'branch': []},
+            4: {'name': 'b', 'type': conv.NodeType.function, 'root': False, 'branch': []},
+            }
+        graph = conv.Converter()
+        graph.set_nodes(nodes)
+        graph.to_call_list()
+        kept = graph.get_graph()[2]
+
+        rebuilt = {key: dict(node, branch=list(node['branch'])) for key, node in nodes.items()}
+        rebuilt[3]['branch'] = [4]
+        self.assertEqual(conv.get_changed(nodes, rebuilt), {3})
+        self.assertEqual(graph.update(rebuilt, conv.get_changed(nodes, rebuilt)), [1])
+        self.assertIs(graph.get_graph()[2], kept)
+
+        expected = conv.Converter()
+        expected.set_nodes(rebuilt)
+        expected.to_call_list()
+        self.assertEqual(graph.get_graph(), expected.get_graph())
+
+    def test_rebuilt(self):
+        """ Converting a rebuilt node list regenerates only the roots
+            reaching a change, from the graph saved by the previous run
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            filename = Path(directory) / 'app.node.json'
+            nodes = RecursionTestCase.load('test_recursion.json')
+            filename.write_text(json.dumps(nodes))
+            self.convert(filename)
+            self.assertTrue((Path(directory) / 'app.graph.nodes.json').exists())
+
+            # FuncA (1001) is only reached from the FuncB root
+            nodes[1001]['size'] = 4
+            filename.write_text(json.dumps(nodes))
+            self.assertTrue("Roots regenerated: 1" in self.convert(filename))
+
+            graph = RecursionTestCase.load(Path(directory) / 'app.graph.json')
+            expected = conv.Converter()
+            expected.load(filename)
+            expected.to_call_list()
+            self.assertEqual(graph, json.loads(json.dumps(expected.get_graph()),
+                                               object_hook=conv.jsonKeys2int))
+
+    def convert(self, filename):
+        return subprocess.run([sys.executable, 'converter.py', '-i', str(filename)],
+                              capture_output=True, text=True, check=True).stdout
+
+
+class LazyTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.nodes = conv.Converter()
+        cls.nodes.load("test_recursion.json")
+
+    def expand(self, node, path):
+        """ Walks the call graph one node at a time
+        """
+        for child in self.nodes.get_children(path):
+            node[child['address']] = self.expand(child, path + [child['address']])
+        return node
+
+    def test_roots(self):
+        roots = self.nodes.get_roots()
+        self.assertEqual([root['address'] for root in roots], [1002, 2002, 3001, 4001])
+        self.assertEqual(roots[0]['level'], 0)
+        self.assertTrue(roots[0]['recursion'])
+
+    def test_children(self):
+        children = self.nodes.get_children([1002, 1003, 1004, 1005])
+        self.assertEqual([child['address'] for child in children], [1004, 1001])
+        self.assertEqual([child['level'] for child in children], [4, 4])
+        self.assertEqual([child['recursion'] for child in children], [True, False])
+        self.assertFalse('branch' in children[0])
+
+        # Recursion is not traversed
+        self.assertEqual(self.nodes.get_children([1002, 1003, 1004, 1005, 1004]), [])
+        self.assertEqual(self.nodes.get_children([3001, 3001]), [])
+
+    def test_memoized(self):
+        """ Only the branches of functions outside of a cycle are kept
+        """
+        self.nodes.get_children([1002, 1001])
+        self.assertTrue(1001 in self.nodes.links)
+        self.nodes.get_children([1002, 1003, 1004])
+        self.assertFalse(1004 in self.nodes.links)
+
+    def test_expand(self):
+        """ Expanding every node must reproduce the complete call graph
+        """
+        graph = {}
+        for root in self.nodes.get_roots():
+            graph[root['address']] = self.expand(root, [root['address']])
+
+        expected = RecursionTestCase.load('test_recursion.expected.json')
+        self.assertEqual(expected, graph)
+
 unittest.main()
\ No newline at end of file
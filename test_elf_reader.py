@@ -0,0 +1,309 @@
+import unittest
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+
+import elf_reader as er
+import node_generator as ng
+from fixtures import FixtureNode, read_fixture
+
+
+def get_section_contents(filename):
+    """ Rebuilds the raw section contents from a recorded disassembly
+    """
+    contents = {}
+    section = None
+    for line in read_fixture(filename):
+        if line.startswith(b'Disassembly of section '):
+            section = line[len(b'Disassembly of section '):-1].decode()
+            contents[section] = bytearray()
+        elif line.startswith(b' ') and b':\t' in line:
+            for word in line.split(b'\t')[1].split():
+                # Instructions are listed in halfwords or words
+                size = len(word) // 2
+                contents[section] += int(word, 16).to_bytes(size, 'little')
+    return contents
+
+
+def write_elf(filename, sections, symbols):
+    """ Writes a little endian ELF32 ARM executable
+
+        sections: list of (name, address, flags, contents)
+        symbols: list of (name, value, size, binding, type, section name)
+    """
+    names = [''] + [section[0] for section in sections] + ['.symtab', '.strtab', '.shstrtab']
+    shstrtab = bytearray(b'\0')
+    name_offset = {}
+    for name in names[1:]:
+        name_offset[name] = len(shstrtab)
+        shstrtab += name.encode() + b'\0'
+
+    index = {section[0]: number + 1 for number, section in enumerate(sections)}
+    index['*ABS*'] = er.SectionIndex.abs
+
+    strtab = bytearray(b'\0')
+    symtab = bytearray(16)
+    for name, value, size, binding, sym_type, section in symbols:
+        symtab += struct.pack('<IIIBBH', len(strtab), value, size,
+            (binding << 4) | sym_type, 0, index[section])
+        strtab += name.encode() + b'\0'
+
+    image = bytearray(52)
+    headers = [struct.pack('<IIIIIIIIII', 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)]
+    for name, address, flags, contents in sections:
+        headers.append(struct.pack('<IIIIIIIIII', name_offset[name],
+            er.SectionType.progbits, flags, address, len(image), len(contents),
+            0, 0, 4, 0))
+        image += contents
+    strtab_index = len(headers) + 1
+    headers.append(struct.pack('<IIIIIIIIII', name_offset['.symtab'],
+        er.SectionType.symtab, 0, 0, len(image), len(symtab), strtab_index,
+        0, 4, 16))
+    image += symtab
+    headers.append(struct.pack('<IIIIIIIIII', name_offset['.strtab'],
+        er.SectionType.strtab, 0, 0, len(image), len(strtab), 0, 0, 1, 0))
+    image += strtab
+    headers.append(struct.pack('<IIIIIIIIII', name_offset['.shstrtab'],
+        er.SectionType.strtab, 0, 0, len(image), len(shstrtab), 0, 0, 1, 0))
+    image += shstrtab
+
+    shoff = len(image)
+    for header in headers:
+        image += header
+
+    image[0:52] = (b'\x7fELF' + bytes([1, 1, 1]) + bytes(9) +
+        struct.pack('<HHIIIIIHHHHHH', 2, er.EM_ARM, 1, 0x08000101, 0, shoff,
+            0x05000200, 52, 0, 0, 40, len(headers), len(headers) - 1))
+
+    Path(filename).write_bytes(image)
+
+
+def write_fixture_elf(filename, literals={}):
+    """ Writes an ELF file matching the recorded objdump transcripts
+
+        literals: {address: word} replacing words of the .text section
+    """
+    contents = get_section_contents('test_node_generator.dis.txt')
+    for address, word in literals.items():
+        offset = address - 0x08000100
+        contents['.text'][offset:offset + 4] = word.to_bytes(4, 'little')
+    alloc = er.SectionFlag.alloc
+    sections = [
+        ('.isr_vector', 0x08000000, alloc, contents['.isr_vector']),
+        ('.text', 0x08000100, alloc | er.SectionFlag.execinstr, contents['.text']),
+        ('.rodata', 0x08000200, alloc, contents['.rodata']),
+        ]
+
+    local = er.SymbolBinding.local
+    glb = er.SymbolBinding.glb
+    func = er.SymbolType.func
+    obj = er.SymbolType.obj
+    symbols = [
+        ('', 0x08000000, 0, local, er.SymbolType.section, '.isr_vector'),
+        ('', 0x08000100, 0, local, er.SymbolType.section, '.text'),
+        ('', 0x08000200, 0, local, er.SymbolType.section, '.rodata'),
+        ('startup_stm32.o', 0, 0, local, er.SymbolType.file, '*ABS*'),
+        ('Reset_Handler', 0x08000101, 8, glb, func, '.text'),
+        ('NMI_Handler', 0x08000109, 4, glb, func, '.text'),
+        ('main', 0x0800010d, 0x18, glb, func, '.text'),
+        ('helper', 0x08000125, 4, local, func, '.text'),
+        ('cmd_a', 0x08000129, 4, glb, func, '.text'),
+        ('cmd_b', 0x0800012d, 4, glb, func, '.text'),
+        ('Default_Handler', 0x08000130, 0, glb, er.SymbolType.notype, '.text'),
+        ('handlers', 0x08000200, 8, glb, obj, '.rodata'),
+        ('table_ref', 0x08000208, 4, glb, obj, '.rodata'),
+        ('version', 0x0800020c, 4, glb, obj, '.rodata'),
+        ('g_pfnVectors', 0x08000000, 0x10, glb, obj, '.isr_vector'),
+        ]
+    write_elf(filename, sections, symbols)
+
+
+# main loads table_ref, the reference table, from its literal pool
+REFERENCE = {
+    b' 8000120:\t08000200 \t.word\t0x08000200':
+    b' 8000120:\t08000208 \t.word\t0x08000208',
+    }
+
+
+class ElfReaderTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.filename = Path(cls.directory.name) / 'Startup.elf'
+        write_fixture_elf(cls.filename)
+
+    @classmethod
+    def tearDownClass(cls):
+        """ Run one-time after all testing is completed in this class
+        """
+        cls.directory.cleanup()
+
+    def test_not_elf(self):
+        filename = Path(self.directory.name) / 'not.elf'
+        filename.write_bytes(b'hello world')
+        with self.assertRaises(ValueError):
+            er.ElfFile(filename)
+
+    def test_sections(self):
+        with er.ElfFile(self.filename) as elf:
+            section = elf.get_section('.text')
+            self.assertEqual(section.address, 0x08000100)
+            self.assertEqual(section.size, 0x32)
+            self.assertTrue(section.flags & er.SectionFlag.execinstr)
+            self.assertEqual(bytes(elf.get_contents(section)[0:4]),
+                b'\x00\xf0\x04\xf8')
+            self.assertIsNone(elf.get_section('.data'))
+
+    def test_symbols(self):
+        with er.ElfFile(self.filename) as elf:
+            symbols = list(elf.get_symbols())
+
+        self.assertEqual(len(symbols), 15)
+        self.assertEqual(symbols[3], (0, 'l', 'f', '*ABS*', 0, 'startup_stm32.o'))
+        # Thumb state is removed from function addresses
+        self.assertEqual(symbols[6], (0x0800010c, 'g', 'F', '.text', 0x18, 'main'))
+        self.assertEqual(symbols[10], (0x08000130, 'g', ' ', '.text', 0, 'Default_Handler'))
+
+    @unittest.skipIf(shutil.which('c++filt') is None, "c++filt not installed")
+    def test_demangle_all(self):
+        tool = shutil.which('c++filt')
+        names = ['main', '_ZN6sensor6HTS2214readEi', 'main', '_Z6helperv']
+        self.assertEqual(er.demangle_all(names, tool),
+                         ['main', 'sensor::HTS221::read(int)', 'main', 'helper()'])
+        self.assertEqual(er.demangle_all(names, None), names)
+        missing = Path(self.directory.name) / 'missing-c++filt'
+        self.assertEqual(er.demangle_all(names, str(missing)), names)
+
+        # Symbols are demangled at once, as objdump --demangle would
+        filename = Path(self.directory.name) / 'mangled.elf'
+        write_elf(filename, [('.text', 0x100, er.SectionFlag.alloc | er.SectionFlag.execinstr,
+                              b'\x70\x47\x70\x47')],
+                  [('_Z6helperv', 0x101, 2, er.SymbolBinding.glb, er.SymbolType.func, '.text'),
+                   ('main', 0x103, 2, er.SymbolBinding.glb, er.SymbolType.func, '.text')])
+        with er.ElfFile(filename) as elf:
+            names = [symbol[5] for symbol in elf.get_symbols(demangler=tool)]
+        self.assertEqual(names[-2:], ['helper()', 'main'])
+
+    @unittest.skipIf(er.cxxfilt is not None, "cxxfilt module installed")
+    def test_get_demangler(self):
+        """ The c++filt of the objdump toolchain is preferred
+        """
+        root = Path(self.directory.name) / 'toolchain'
+        root.mkdir(exist_ok=True)
+        for name in ('arm-none-eabi-objdump', 'arm-none-eabi-c++filt'):
+            (root / name).touch()
+        self.assertEqual(er.get_demangler(root / 'arm-none-eabi-objdump'),
+                         str(root / 'arm-none-eabi-c++filt'))
+        self.assertEqual(er.get_demangler(), shutil.which('c++filt'))
+
+        # Mangled and demangled runs do not share a cache entry
+        node = ng.Node(root / 'arm-none-eabi-objdump')
+        self.assertEqual(node.get_cache_options()[-1], str(root / 'arm-none-eabi-c++filt'))
+        node.symbol_reader = 'objdump'
+        self.assertIsNone(node.get_cache_options()[-1])
+
+    def test_symbols_match_objdump(self):
+        """ Both symbol readers must produce the same node list
+        """
+        expected = FixtureNode()
+        expected.build()
+
+        result = ng.Node(infile=self.filename, vector='g_pfnVectors')
+        result.build()
+
+        self.assertEqual(expected.nodes, result.nodes)
+        self.assertEqual(list(expected.nodes), list(result.nodes))
+
+    def test_words(self):
+        with er.ElfFile(self.filename) as elf:
+            self.assertEqual(elf.get_words(0x08000200, 8), [0x08000129, 0x0800012d])
+            # Reads are clipped to the end of the section
+            self.assertEqual(elf.get_words(0x0800020c, 8), [3])
+            self.assertEqual(elf.get_words(0x20000000, 4), [])
+
+    def test_branches_match_objdump(self):
+        """ Branches decoded from the machine code must match those found in
+            the disassembly
+        """
+        expected = FixtureNode()
+        expected.build()
+        expected.link()
+
+        result = ng.Node(infile=self.filename, vector='g_pfnVectors',
+            branch_reader='elf')
+        result.build()
+        result.link()
+
+        for address, node in expected.nodes.items():
+            self.assertEqual(node['branch'], result.nodes[address]['branch'])
+            self.assertEqual(node['root'], result.nodes[address]['root'])
+
+    def test_dispatch_match_objdump(self):
+        """ Function pointers found in the data sections must match those
+            found in the disassembly
+        """
+        expected = FixtureNode()
+        expected.build()
+        expected.link()
+
+        result = ng.Node(infile=self.filename, vector='g_pfnVectors',
+            branch_reader='elf')
+        result.build()
+        result.link()
+
+        self.assertEqual(expected.dispatch_table, result.dispatch_table)
+        self.assertEqual(list(expected.dispatch_table), list(result.dispatch_table))
+        self.assertEqual(expected.function, result.function)
+        self.assertEqual(expected.reference, result.reference)
+        self.assertEqual(expected.dispatch, result.dispatch)
+        self.assert_indirect_equal(expected, result)
+
+    def test_reference_match_objdump(self):
+        """ A function loading a reference table must resolve through it,
+            main loads table_ref in place of the handlers table
+        """
+        class ReferenceNode(FixtureNode):
+            def get_lines(self):
+                return (REFERENCE.get(line, line) for line in super().get_lines())
+
+        expected = ReferenceNode()
+        expected.build()
+        expected.link()
+        self.assertEqual(expected.nodes[0x0800010c]['indirect'], [0x08000128, 0x0800012c])
+
+        filename = Path(self.directory.name) / 'Reference.elf'
+        write_fixture_elf(filename, {0x08000120: 0x08000208})
+        result = ng.Node(infile=filename, vector='g_pfnVectors', branch_reader='elf')
+        result.build()
+        result.link()
+
+        self.assertEqual(expected.function, result.function)
+        self.assertEqual(expected.reference, result.reference)
+        self.assert_indirect_equal(expected, result)
+
+    def assert_indirect_equal(self, expected, result):
+        """ Both readers resolve the same indirect calls, per function and
+            per call site
+        """
+        for address, node in expected.nodes.items():
+            self.assertEqual(node.get('indirect'), result.nodes[address].get('indirect'))
+        self.assertEqual(expected.call_sites, result.call_sites)
+        self.assertTrue(result.call_sites)
+
+    def test_signatures(self):
+        node = ng.Node(infile=self.filename, vector='g_pfnVectors')
+        node.build()
+        signatures = node.get_signatures()
+        self.assertEqual(sorted(signatures), sorted(node.nodes))
+
+        # Identical contents share a signature, nodes are told apart by
+        # address
+        self.assertEqual(signatures[0x08000124], signatures[0x08000128])
+        self.assertEqual(signatures[0x08000128], signatures[0x0800012c])
+        self.assertNotEqual(signatures[0x0800010c], signatures[0x08000124])
+        self.assertNotEqual(signatures[0x08000200], signatures[0x08000208])
+
+unittest.main()
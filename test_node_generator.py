@@ -1,9 +1,27 @@
 import unittest
+from array import array
 from pathlib import Path
 
 import json
 import node_generator as ng
 from converter import jsonKeys2int
+from fixtures import FixtureNode, read_fixture
+
+
+def reference_record(line):
+    """ Classifies a line of disassembly using the string helpers
+    """
+    if ng.is_node_start(line):
+        return (ng.LineType.header, ng.get_node_address(line), -1, -1)
+
+    address = ng.get_line_address(line, ':')
+    pointer = ng.get_pointer(line)
+    if ng.is_node_branch(line):
+        return (ng.LineType.branch, address, pointer, ng.get_branch_address(line))
+    if pointer != -1:
+        return (ng.LineType.word, address, pointer, -1)
+    return (ng.LineType.other, address, pointer, -1)
+
 
 class SymbolTestCase(unittest.TestCase):
 
@@ -232,5 +250,346 @@ class LinkTestCase(unittest.TestCase):
         self.assertEqual(1, len(self.nodes.nodes[parent]['branch']) )
         self.assertTrue( not child in self.nodes.nodes[parent]['branch'] )
 
+    def test_link_to_function_order(self):
+        """ Branches are recorded once, in the order first seen, including
+            branches recorded before the request
+        """
+        nodes = ng.Node()
+        for address in range(0, 16, 4):
+            nodes.nodes[address] = {'name': str(address), 'section': '.text',
+                'size': 4, 'type': ng.NodeType.function,
+                'scope': ng.SymbolScope.glb, 'root': True, 'branch': []}
+        nodes.nodes[0]['branch'] = [8]
+
+        for child in [12, 8, 5, 12, 4, 13]:
+            nodes.link_to_function(0, child)
+        self.assertEqual(nodes.nodes[0]['branch'], [8, 12, 4])
+
+
+class TokenizerTestCase(unittest.TestCase):
+    """ The tokenizers must classify lines exactly as the string helpers do
+    """
+    lines = [
+        "Startup.elf:     file format elf32-littlearm",
+        "Disassembly of section .isr_vector:",
+        "",
+        "08000000:",
+        "08000000 ",
+        "<g_pfnVectors>:",
+        "08000000 <g_pfnVectors-0x123>:",
+        "08000000 <g_pfnVectors+0x123>:",
+        "08000000 g_pfnVectors:",
+        "08000000 <g_pfnVectors>:",
+        "8 <g_pfnVectors>:",
+        " 8:\t0800074d \tstmdaeq\tr0, {r0, r2, r3, r6, r8, r9, sl}",
+        " :\t0800074d \tstmdaeq\tr0, {r0, r2, r3, r6, r8, r9, sl}",
+        " \t0800074d \tstmdaeq\tr0, {r0, r2, r3, r6, r8, r9, sl}",
+        " 800ab5e:\tf7f6 fa6f \tbl\t8001040 <xQueueGenericSend>",
+        " 800ab5e:\tf7f6 fa6f \tbl\t8001040 <xQueueGenericSend",
+        " 800ab5e:\tf7f6 fa6f \tbl\t8001040 xQueueGenericSend>",
+        " 800ab5e:\tf7f6 fa6f \tbl\t8001040 <xQueueGenericSend+0x123>",
+        " 800ab5e:\tf7f6 fa6f \tbl\t8001040 <xQueueGenericSend-0x123>",
+        " 800ab5e:\tf7f6 fa6f \tbl\t8 <xQueueGenericSend>",
+        " 801fb30:\te7ec      \tb.n\t801fb0c <_vfiprintf_r+0x1e4>",
+        " 801fb4c:\t00000000 \tandeq\tr0, r0, r0",
+        " 801fb50:\tffffffff \tstmdaeq\tr1, {r0, r2, r8, fp, ip, sp, lr, pc}",
+        " 801fb50:\thello \tstmdaeq\tr1, {r0, r2, r8, fp, ip, sp, lr, pc}",
+        ]
+
+    symbols = [
+        "Startup.elf:     file format elf32-littlearm",
+        "SYMBOL TABLE:",
+        "",
+        "08000000",
+        "08000000 ",
+        "080018a0 l     F .text\t0000008c prvAddCurrentTaskToDelayedList",
+        "0 l     F .text\t0000008c prvAddCurrentTaskToDelayedList",
+        "080018a0 l     F .\t0000008c p",
+        "080018a0 l     F \t0000008c p",
+        "080018a0 l     F .text\t8 p",
+        "08002fd0 l     F .text\t00000032 sensor::HTS221::impl::readByte(HTS221_Register) [clone .isra.0]",
+        ]
+
+    def test_tokenize(self):
+        lines = self.lines + [str(line, encoding='utf-8') for line in
+                              read_fixture('test_node_generator.dis.txt')]
+        for line in lines:
+            self.assertEqual(reference_record(line), ng.tokenize(line.encode()),
+                msg=line)
+
+    def test_tokenize_symbol(self):
+        lines = self.symbols + [str(line, encoding='utf-8') for line in
+                                read_fixture('test_node_generator.syms.txt')]
+        for line in lines:
+            expected = None
+            if ng.is_symbol_line(line):
+                expected = (ng.get_symbol_address(line),
+                            line[ng.SymbolScope.index],
+                            line[ng.NodeType.index],
+                            ng.get_symbol_section(line),
+                            ng.get_symbol_size(line),
+                            ng.get_symbol_name(line))
+            self.assertEqual(expected, ng.tokenize_symbol(line.encode()), msg=line)
+
+
+class TraceLiteralTestCase(unittest.TestCase):
+    """ Registers loaded from the literal pool are followed to a call
+    """
+    def trace(self, codes, address=0x1000):
+        registers = {}
+        calls = []
+        for code in codes:
+            call = ng.trace_literal(registers, address, code)
+            if call is not None:
+                calls.append((address, call))
+            address += 2
+        return calls
+
+    def test_direct(self):
+        # ldr r3, [pc, #8]; blx r3
+        self.assertEqual(self.trace([0x4b02, 0x4798]), [(0x1002, (0x100c, ng.LITERAL))])
+        # Aligned to a word: ldr r0, [pc, #4] at 0x1002; bx r0
+        self.assertEqual(self.trace([0xbf00, 0x4801, 0x4700]), [(0x1004, (0x1008, ng.LITERAL))])
+
+    def test_load(self):
+        # ldr r3, [pc, #0]; ldr r3, [r3, #4]; blx r3
+        self.assertEqual(self.trace([0x4b00, 0x685b, 0x4798]), [(0x1004, (0x1004, 4))])
+        # ldr r2, [pc, #0]; ldr r3, [r2, r0]; blx r3
+        self.assertEqual(self.trace([0x4a00, 0x5813, 0x4798]), [(0x1004, (0x1004, ng.INDEXED))])
+
+    def test_overwritten(self):
+        # movs r3, #0; adds r3, r3, r1; mov r3, r8; ldr r3, [sp, #0]
+        for code in (0x2300, 0x185b, 0x4643, 0x9b00):
+            self.assertEqual(self.trace([0x4b02, code, 0x4798]), [])
+        # blx r3 clobbers r3, pop {r4, pc} leaves it
+        self.assertEqual(len(self.trace([0x4b02, 0x4798, 0x4798])), 1)
+        self.assertEqual(len(self.trace([0x4b02, 0xbc10, 0x4798])), 1)
+        self.assertEqual(self.trace([0x4b02, 0xbc08, 0x4798]), [])
+        # bx lr is a return
+        self.assertEqual(self.trace([0x4b02, 0x4770]), [])
+
+
+class BuildLinkTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.nodes = FixtureNode()
+        cls.nodes.build()
+        cls.nodes.link()
+
+    def test_build(self):
+        nodes = self.nodes.nodes
+        self.assertEqual(11, len(nodes))
+        self.assertEqual(nodes[0x0800010c]['name'], "main")
+        self.assertEqual(nodes[0x0800010c]['size'], 0x18)
+        self.assertEqual(nodes[0x0800010c]['type'], ng.NodeType.function)
+        self.assertEqual(nodes[0x08000124]['scope'], ng.SymbolScope.local)
+        # Local functions record the source file listed ahead of them
+        self.assertEqual(nodes[0x08000124]['unit'], "startup_stm32.o")
+        self.assertFalse('unit' in nodes[0x0800010c])
+        self.assertEqual(nodes[0x08000130]['type'], ng.NodeType.function)
+        self.assertEqual(nodes[0x08000200]['type'], ng.NodeType.obj)
+        self.assertEqual(nodes[0x08000000]['type'], ng.NodeType.vector_table)
+        self.assertEqual(nodes[0x08000000]['section'], ".isr_vector")
+
+    def test_link(self):
+        nodes = self.nodes.nodes
+        self.assertEqual(nodes[0x08000000]['branch'],
+            [0x08000100, 0x08000108, 0x08000130])
+        self.assertEqual(nodes[0x08000100]['branch'], [0x0800010c])
+        self.assertEqual(nodes[0x0800010c]['branch'], [0x08000124])
+        self.assertEqual(nodes[0x08000130]['branch'], [0x08000130])
+        self.assertEqual(nodes[0x08000124]['branch'], [])
+
+        roots = [key for key, node in nodes.items() if node['root']]
+        self.assertEqual(sorted(roots), [0x08000000, 0x08000128, 0x0800012c,
+            0x08000200, 0x08000208, 0x0800020c])
+
+    def test_dispatch(self):
+        self.assertEqual(self.nodes.dispatch_table, {
+            0x08000200: {'function': 0x08000128, 'table': 0x08000200},
+            0x08000204: {'function': 0x0800012c, 'table': 0x08000200},
+            })
+
+    def test_references(self):
+        self.assertEqual(self.nodes.function, {0x0800010c: [0x08000200]})
+        self.assertEqual(self.nodes.reference, {0x08000208: [0x08000200]})
+        self.assertEqual(self.nodes.dispatch,
+            {0x08000200: [0x08000128, 0x0800012c]})
+
+    def test_indirect(self):
+        # main loads the base of the dispatch table, any entry may be called
+        self.assertEqual(self.nodes.nodes[0x0800010c]['indirect'],
+                         [0x08000128, 0x0800012c])
+        self.assertEqual([key for key, node in self.nodes.nodes.items()
+                          if 'indirect' in node], [0x0800010c])
+        self.assertEqual(self.nodes.get_node_counts()['indirect_edges'], 2)
+
+    def test_indirect_reference(self):
+        """ A function loading a reference table calls through each dispatch
+            table it references; a loaded entry only calls its own target
+        """
+        nodes = ng.Node()
+        nodes.nodes = {address: {'name': name, 'type': node_type, 'branch': []}
+            for address, name, node_type in (
+                (0x100, 'caller', ng.NodeType.function),
+                (0x110, 'other', ng.NodeType.function),
+                (0x120, 'f1', ng.NodeType.function),
+                (0x130, 'f2', ng.NodeType.function),
+                (0x140, 'f3', ng.NodeType.function),
+                (0x200, 'handlers', ng.NodeType.obj),
+                (0x300, 'refs', ng.NodeType.obj))}
+        for site, target in ((0x200, 0x121), (0x204, 0x131), (0x208, 0x141)):
+            nodes.set_dispatch_entry(0x200, site, target)
+        nodes.set_references((array('q', [0x100, 0x110, 0x110]),
+                              array('q', [0x300, 0x208, 0x400])),
+                             (array('q', [0x300]), array('q', [0x200])))
+
+        self.assertEqual(nodes.nodes[0x100]['indirect'], [0x120, 0x130, 0x140])
+        self.assertEqual(nodes.nodes[0x110]['indirect'], [0x140])
+        self.assertEqual(nodes.function, {0x110: [0x208]})
+
+    def test_loads(self):
+        # Of the constants in main's literal pool, only the pointer into an
+        # object is kept
+        self.assertEqual([list(column) for column in self.nodes.loads],
+                         [[0x0800010c], [0x08000200]])
+        nodes = ng.Node()
+        nodes.nodes = {
+            0x100: {'name': 'f', 'type': ng.NodeType.function, 'branch': [], 'root': True},
+            0x20000: {'name': 'table', 'type': ng.NodeType.obj, 'size': 8,
+                      'branch': [], 'root': True}}
+        records = [(ng.LineType.header, 0x100, -1, -1)] + [
+            (ng.LineType.word, 0x100 + 4 * index, word, -1)
+            for index, word in enumerate((0x40021000, 0x20004, 0x20008, 0x1ffff))]
+        seen, loads, words, calls = nodes.sweep(records)
+        self.assertEqual(list(loads[1]), [0x20004])
+
+    def test_call_sites(self):
+        # main loads the base of the dispatch table from its literal pool,
+        # then calls the register
+        self.assertEqual([list(column) for column in self.nodes.calls],
+                         [[0x0800010c], [0x08000118], [0x08000200], [ng.LITERAL]])
+        self.assertEqual(self.nodes.call_sites, {0x08000118: [0x08000128, 0x0800012c]})
+
+    def test_low_addresses(self):
+        """ Opcodes are not taken for pointers to a table in low memory,
+            the constants loaded from the literal pool are
+        """
+        nodes = ng.Node()
+        nodes.nodes = {address: {'name': name, 'type': node_type, 'size': 4,
+                                 'branch': [], 'root': True}
+            for address, name, node_type in (
+                (0x100, 'caller', ng.NodeType.function),
+                (0x110, 'loader', ng.NodeType.function),
+                (0x200, 'f1', ng.NodeType.function),
+                (0x4770, 'handlers', ng.NodeType.obj))}
+        header, word = ng.LineType.header, ng.LineType.word
+        records = [
+            # bx lr, 0x4770
+            (header, 0x100, -1, -1), (word, 0x100, 0x4770, -1), (word, 0x102, 0xbf00, -1),
+            # ldr r3, [pc, #0]; blx r3; .word 0x00004770
+            (header, 0x110, -1, -1), (word, 0x110, 0x4b00, -1), (word, 0x112, 0x4798, -1),
+            (word, 0x114, 0x4770, -1),
+            (header, 0x4770, -1, -1), (word, 0x4770, 0x201, -1)]
+        seen, loads, words, calls = nodes.sweep(records)
+        nodes.set_references(loads, words, calls)
+
+        self.assertEqual([list(column) for column in loads], [[0x110], [0x4770]])
+        self.assertFalse('indirect' in nodes.nodes[0x100])
+        self.assertEqual(nodes.nodes[0x110]['indirect'], [0x200])
+        self.assertEqual(nodes.call_sites, {0x112: [0x200]})
+
+    def test_call_targets(self):
+        """ Constants resolve to a function, or through a dispatch table
+        """
+        nodes = ng.Node()
+        nodes.nodes = {address: {'name': name, 'type': node_type, 'branch': []}
+            for address, name, node_type in (
+                (0x100, 'caller', ng.NodeType.function),
+                (0x120, 'f1', ng.NodeType.function),
+                (0x130, 'f2', ng.NodeType.function),
+                (0x200, 'handlers', ng.NodeType.obj))}
+        nodes.set_dispatch_entry(0x200, 0x200, 0x121)
+        nodes.set_dispatch_entry(0x200, 0x204, 0x131)
+        calls = [(0x102, 0x131, ng.LITERAL), (0x104, 0x200, 4), (0x106, 0x200, ng.INDEXED),
+                 (0x108, 0x200, 8), (0x10a, 0x400, ng.LITERAL)]
+        nodes.set_references(((), ()), ((), ()),
+            tuple(array('q', column) for column in zip(*[(0x100,) + call for call in calls])))
+
+        self.assertEqual(nodes.call_sites, {0x102: [0x130], 0x104: [0x130],
+                                            0x106: [0x120, 0x130]})
+        self.assertEqual(nodes.nodes[0x100]['indirect'], [0x130, 0x120])
+
+    def test_single_pass(self):
+        # Dispatch tables and branches share one sweep of the disassembly
+        self.assertEqual(1, self.nodes.passes)
+
+    def test_disassemble_code(self):
+        """ Disassembling code and dumping objects must match a complete
+            disassembly, while parsing less
+        """
+        nodes = FixtureNode()
+        nodes.disassemble = 'code'
+        nodes.build()
+        nodes.link()
+
+        self.assertEqual(self.nodes.nodes, nodes.nodes)
+        self.assertEqual(self.nodes.dispatch_table, nodes.dispatch_table)
+        self.assertEqual(self.nodes.function, nodes.function)
+        self.assertEqual(self.nodes.reference, nodes.reference)
+        self.assertEqual(self.nodes.dispatch, nodes.dispatch)
+        self.assertEqual(self.nodes.call_sites, nodes.call_sites)
+
+        parsed = sum(len(line) for line in nodes.get_disassembly())
+        parsed += 4 * sum(1 for record in nodes.get_object_records())
+        complete = sum(len(line) for line in read_fixture('test_node_generator.dis.txt'))
+        self.assertLess(parsed, complete)
+
+    def test_object_records(self):
+        nodes = FixtureNode()
+        nodes.build()
+        records = list(nodes.get_object_records())
+        self.assertEqual(records[0], (ng.LineType.header, 0x08000000, -1, -1))
+        self.assertEqual(records[2], (ng.LineType.word, 0x08000004, 0x08000101, -1))
+        self.assertEqual(records[5], (ng.LineType.header, 0x08000200, -1, -1))
+        self.assertEqual(records[6], (ng.LineType.word, 0x08000200, 0x08000129, -1))
+
+    def test_shards(self):
+        shards = self.nodes.get_shards(4)
+        self.assertEqual(4, len(shards))
+        self.assertEqual(shards[0][0], 0x08000000)
+        self.assertEqual(shards[-1][1], None)
+        for previous, shard in zip(shards, shards[1:]):
+            self.assertEqual(previous[1], shard[0])
+            self.assertTrue(shard[0] in self.nodes.nodes)
+
+    def test_link_jobs(self):
+        """ A sharded link must match the sequential link
+        """
+        nodes = FixtureNode()
+        nodes.jobs = 2
+        nodes.build()
+        nodes.link()
+
+        self.assertEqual(self.nodes.nodes, nodes.nodes)
+        self.assertEqual(self.nodes.dispatch_table, nodes.dispatch_table)
+        self.assertEqual(self.nodes.function, nodes.function)
+        self.assertEqual(self.nodes.reference, nodes.reference)
+        self.assertEqual(self.nodes.dispatch, nodes.dispatch)
+        self.assertEqual(self.nodes.call_sites, nodes.call_sites)
+
+    def test_compact(self):
+        """ A compact node list must read back as the linked node list
+        """
+        nodes = FixtureNode()
+        nodes.build()
+        nodes.link()
+        nodes.compact()
+
+        self.assertEqual(self.nodes.nodes, dict(nodes.get_nodes()))
+        self.assertEqual(list(self.nodes.nodes), list(nodes.get_nodes()))
+
 
 unittest.main()
\ No newline at end of file
@@ -0,0 +1,77 @@
+import unittest
+import json
+
+import converter as conv
+import node_generator as ng
+from node_table import NodeTable, get_dict_footprint
+
+
+def load(filename):
+    """ Gets a node list from file
+    """
+    with open(filename, 'r') as handle:
+        return json.load(handle, object_hook=conv.jsonKeys2int)
+
+
+class NodeTableTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.nodes = load('test_node_generator.list.json')
+        cls.table = NodeTable(cls.nodes)
+
+    def test_nodes(self):
+        self.assertEqual(len(self.table), len(self.nodes))
+        self.assertEqual(dict(self.table), self.nodes)
+
+    def test_order(self):
+        """ Nodes are iterated in the order of the source list
+        """
+        self.assertEqual(list(self.table), list(self.nodes))
+
+    def test_lookup(self):
+        address = next(iter(self.nodes))
+        self.assertTrue(address in self.table)
+        self.assertFalse(address + 1 in self.table)
+        with self.assertRaises(KeyError):
+            self.table[address + 1]
+
+    def test_enums(self):
+        nodes = load('test_recursion.json')
+        table = NodeTable(nodes)
+        self.assertIs(table[1001]['type'], ng.NodeType.function)
+        self.assertIs(table[1001]['scope'], ng.SymbolScope.local)
+        self.assertEqual(table.get_branch(1002), [1001, 1003])
+
+    def test_extra(self):
+        """ Attributes outside the fixed columns are kept
+        """
+        nodes = load('test_recursion.json')
+        nodes[1001]['stack'] = 24
+        table = NodeTable(nodes)
+        self.assertEqual(table[1001]['stack'], 24)
+        self.assertFalse('stack' in table[1002])
+
+    def test_footprint(self):
+        footprint = self.table.get_footprint()
+        self.assertEqual(footprint['total'],
+            sum(size for column, size in footprint.items() if column != 'total'))
+        self.assertLess(footprint['total'], get_dict_footprint(self.nodes) / 2)
+
+    def test_call_graph(self):
+        """ The converter must produce the same call graph from a table
+        """
+        expected = conv.Converter()
+        expected.set_nodes(load('test_recursion.json'))
+        expected.to_call_list()
+
+        result = conv.Converter()
+        result.set_nodes(NodeTable(load('test_recursion.json')))
+        result.to_call_list()
+
+        self.assertEqual(expected.get_graph(), result.get_graph())
+        self.assertEqual(list(expected.get_graph()), list(result.get_graph()))
+
+
+unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import json
+import tempfile
+from pathlib import Path
+
+import node_generator as ng
+from profiler import Profiler
+from transcript_generator import Transcript, TranscriptNode
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """ Run before each test
+        """
+        self.transcript = Transcript(50, handlers=4, tables=2)
+        self.lines = len(list(self.transcript.get_disassembly()))
+
+    def analyze(self, profiler):
+        node = TranscriptNode(self.transcript)
+        profiler.count_lines(TranscriptNode, 'get_disassembly')
+        profiler.count_calls(ng, ['tokenize'])
+        profiler.count_calls(TranscriptNode, ['link_to_function'])
+        with profiler.phase('build', node.get_node_counts):
+            node.build()
+        with profiler.phase('link', node.get_node_counts):
+            node.link()
+        return node
+
+    def test_phases(self):
+        profiler = Profiler(calls=True)
+        node = self.analyze(profiler)
+        build, link = profiler.phases
+
+        self.assertEqual(build['name'], 'build')
+        self.assertEqual(build['lines'], {})
+        self.assertGreaterEqual(link['wall'], 0)
+        self.assertGreaterEqual(link['cpu'], 0)
+        self.assertEqual(link['lines'], {'get_disassembly': self.lines})
+        self.assertEqual(link['calls']['tokenize'], self.lines)
+        self.assertGreater(link['calls']['link_to_function'], 0)
+        self.assertEqual(link['counts'], node.get_node_counts())
+        self.assertEqual(link['counts']['edges'],
+                         sum(len(entry['branch']) for entry in node.nodes.values()))
+        self.assertFalse('memory_peak' in link)
+
+        profiler.restore()
+        self.assertEqual(TranscriptNode.get_disassembly.__qualname__,
+                         'TranscriptNode.get_disassembly')
+        self.assertIs(TranscriptNode.link_to_function, ng.Node.link_to_function)
+        self.assertEqual(ng.tokenize.__name__, 'tokenize')
+
+    def test_disabled(self):
+        profiler = Profiler(False, memory=True, calls=True)
+        self.analyze(profiler)
+        self.assertEqual(profiler.phases, [])
+        self.assertEqual(profiler.patched, [])
+
+    def test_save(self):
+        profiler = Profiler(memory=True)
+        self.analyze(profiler)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = profiler.save(Path(directory) / 'out' / 'app.profile.json',
+                                     infile=Path('app.elf'), options={'jobs': 1})
+            with open(filename, 'r') as handle:
+                report = json.load(handle)
+
+        self.assertEqual(report['infile'], 'app.elf')
+        self.assertEqual(report['options'], {'jobs': 1})
+        self.assertEqual([phase['name'] for phase in report['phases']], ['build', 'link'])
+        for phase in report['phases']:
+            self.assertGreater(phase['memory_peak'], 0)
+            self.assertEqual(phase['calls'], {})
+        self.assertGreaterEqual(report['total']['wall'],
+                                sum(phase['wall'] for phase in report['phases']))
+        self.assertEqual(profiler.patched, [])
+
+
+unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import csv
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import node_generator as ng
+from report import StackReport
+
+
+def get_nodes():
+    """ Returns a vector table listing two handlers; main calls a
+        recursion cycle, the handlers share a callee
+    """
+    nodes = {}
+    def add(address, name, branch, stack, root=False, node_type=ng.NodeType.function):
+        nodes[address] = {'name': name, 'section': '.text', 'size': 4,
+            'type': node_type, 'scope': ng.SymbolScope.glb, 'root': root,
+            'branch': branch, 'stack': stack}
+
+    add(0x100, 'g_pfnVectors', [0x200, 0x300, 0x200], 0, True, ng.NodeType.vector_table)
+    add(0x200, 'UART_IRQHandler', [0x400], 32)
+    add(0x300, 'TIM_IRQHandler', [0x400], 8)
+    add(0x400, 'HAL_Process', [], 64)
+    add(0x500, 'main', [0x600], 16, True)
+    add(0x600, 'Parse', [0x700], 24)
+    add(0x700, 'Eval', [0x600], 40)
+    return nodes
+
+
+class ReportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """ Run before each test
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = Path(self.directory.name)
+        self.report = StackReport(get_nodes(), top=2, budget=90)
+
+    def tearDown(self):
+        """ Run after each test
+        """
+        self.directory.cleanup()
+
+    def test_entries(self):
+        entries = [(entry['kind'], entry['name'], entry['stack'], entry['depth'])
+                   for entry in self.report.entries]
+        self.assertEqual(entries, [
+            ('root', 'g_pfnVectors', 96, 3),
+            ('vector', 'UART_IRQHandler', 96, 2),
+            ('root', 'main', 80, 3),
+            ('vector', 'TIM_IRQHandler', 72, 2),
+            ])
+        self.assertEqual(self.report.entries[1]['vector'], 'g_pfnVectors')
+        self.assertTrue(self.report.entries[2]['recursion'])
+        self.assertEqual([entry['name'] for entry in self.report.get_over_budget()],
+                         ['g_pfnVectors', 'UART_IRQHandler'])
+
+    def test_no_budget(self):
+        report = StackReport(get_nodes())
+        self.assertEqual(report.get_over_budget(), [])
+        self.assertIsNone(report.get_report()['budget'])
+
+    def test_json(self):
+        filename = self.report.save(self.root / 'app.report.json', infile=Path('app.elf'))
+        with open(filename, 'r') as handle:
+            report = json.load(handle)
+
+        self.assertEqual(report['infile'], 'app.elf')
+        self.assertEqual(report['over_budget'], 2)
+        self.assertEqual(len(report['chains']), 2)
+        self.assertEqual(report['chains'][0]['path'],
+                         ['g_pfnVectors', 'UART_IRQHandler', 'HAL_Process'])
+        self.assertEqual(len(report['entries']), 4)
+        self.assertFalse('path' in report['entries'][0])
+
+    def test_csv(self):
+        filename = self.report.save(self.root / 'app.report.csv', 'csv')
+        with open(filename, 'r', newline='') as handle:
+            rows = list(csv.DictReader(handle))
+
+        self.assertEqual([row['name'] for row in rows],
+                         [entry['name'] for entry in self.report.entries])
+        self.assertEqual(rows[1]['path'], 'UART_IRQHandler > HAL_Process')
+        self.assertEqual(rows[1]['address'], '0x200')
+        self.assertEqual(rows[3]['path'], '')
+
+    def test_headless_imports(self):
+        """ The report mode loads neither Tk nor graphviz
+        """
+        modules = subprocess.run([sys.executable, '-c',
+            "import sys, stack_checker; print('tkinter' in sys.modules, "
+            "'graphviz' in sys.modules)"],
+            capture_output=True, text=True, check=True).stdout
+        self.assertEqual(modules.split(), ['False', 'False'])
+
+
+unittest.main()
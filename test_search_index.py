@@ -0,0 +1,108 @@
+import unittest
+import json
+
+import converter as conv
+import node_generator as ng
+from search_index import SearchIndex
+
+
+def load(filename):
+    """ Gets a node list from file
+    """
+    with open(filename, 'r') as handle:
+        return json.load(handle, object_hook=conv.jsonKeys2int)
+
+
+class FindTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.nodes = load('test_node_generator.list.json')
+        cls.index = SearchIndex(cls.nodes)
+
+    def brute_force(self, text):
+        """ Returns every (name, address) holding the text, in index order
+        """
+        return [(name, address) for name, address in
+                zip(self.index.names, self.index.addresses)
+                if text.lower() in name.lower()]
+
+    def test_prefix(self):
+        result = self.index.find('hal_i2c_')
+        self.assertTrue(result)
+        for name, address in result:
+            self.assertTrue(name.lower().startswith('hal_i2c_'))
+            self.assertEqual(self.nodes[address]['name'], name)
+        self.assertEqual(len(result), len(self.brute_force('hal_i2c_')))
+
+    def test_substring(self):
+        for text in ['dma', 'I2C', 'Handler', 'it', 'x', 'callback', 'no such name']:
+            expected = self.brute_force(text)
+            result = self.index.find(text, limit=len(self.nodes))
+            self.assertEqual(sorted(expected), sorted(result))
+
+            # Prefix matches are listed first
+            prefix = [name.lower().startswith(text.lower()) for name, address in result]
+            self.assertEqual(prefix, sorted(prefix, reverse=True))
+
+    def test_limit(self):
+        self.assertEqual(len(self.index.find('a', limit=5)), 5)
+        self.assertEqual(self.index.find(''), [])
+
+
+class PathTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.index = SearchIndex(load('test_recursion.json'))
+
+    def test_callers(self):
+        self.assertEqual(sorted(self.index.get_callers(1001)), [1002, 1005])
+        self.assertEqual(self.index.get_callers(1002), [])
+
+    def test_paths(self):
+        self.assertEqual(sorted(self.index.paths_to(1006)), [
+            [1002, 1001, 1006],
+            [1002, 1003, 1004, 1005, 1001, 1006]])
+        self.assertEqual(self.index.paths_to(1002), [[1002]])
+        self.assertEqual(self.index.paths_to(3001), [[3001]])
+        self.assertEqual(self.index.paths_to(4002), [[4001, 4002]])
+        self.assertEqual(len(self.index.paths_to(1006, limit=1)), 1)
+
+
+    def test_dense(self):
+        """ A clique of mutually recursive functions holds more simple paths
+            than could ever be listed
+        """
+        nodes = {}
+        def add(address, branch, root=False):
+            nodes[address] = {'name': str(address), 'type': ng.NodeType.function,
+                              'root': root, 'branch': branch}
+
+        clique = list(range(100, 130))
+        for address in clique:
+            add(address, [other for other in clique if other != address] + [2])
+        # Only the first member is called from a root, and calls the target
+        add(1, [100], True)
+        add(2, [])
+        nodes[100]['branch'] = [101, 2]
+        add(3, [2], True)
+        index = SearchIndex(nodes)
+
+        self.assertEqual(index.get_reaching(2), {1, 2, 3} | set(clique))
+        # Roots are tried first; past 100, the clique is a dead end the
+        # search leaves on its visit budget
+        paths = index.paths_to(2, visits=10000)
+        self.assertEqual(paths, [[3, 2], [1, 100, 2]])
+
+        # The clique is not reached from a root, it is never visited
+        nodes[1]['branch'] = []
+        index = SearchIndex(nodes)
+        self.assertEqual(index.get_reaching(2), {2, 3})
+        self.assertEqual(index.paths_to(2), [[3, 2]])
+        self.assertEqual(index.paths_to(100), [])
+
+
+unittest.main()
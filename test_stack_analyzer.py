@@ -0,0 +1,135 @@
+import unittest
+import json
+
+import converter as conv
+import node_generator as ng
+from stack_analyzer import StackAnalyzer, get_components
+
+
+def load(filename):
+    """ Gets a node list from file
+    """
+    with open(filename, 'r') as handle:
+        return json.load(handle, object_hook=conv.jsonKeys2int)
+
+
+def get_layers(count):
+    """ Returns a node list of layers holding two functions, each calling
+        both functions of the next layer; 2^count call paths
+    """
+    nodes = {}
+    for layer in range(count):
+        for address in (2 * layer, 2 * layer + 1):
+            nodes[address] = {'name': 'f' + str(address), 'section': '.text',
+                'size': 4, 'type': ng.NodeType.function,
+                'scope': ng.SymbolScope.glb, 'root': layer == 0,
+                'branch': [2 * layer + 2, 2 * layer + 3] if layer + 1 < count else [],
+                'stack': 8 * (address % 2)}
+    return nodes
+
+
+class ComponentTestCase(unittest.TestCase):
+
+    def test_components(self):
+        graph = {1: [2], 2: [3, 5], 3: [4], 4: [2], 5: [5, 9], 6: []}
+        components = get_components(graph)
+        self.assertEqual(sorted(sorted(c) for c in components),
+            [[1], [2, 3, 4], [5], [6]])
+
+        # Callees precede callers
+        order = {member: number for number, c in enumerate(components) for member in c}
+        self.assertLess(order[5], order[2])
+        self.assertLess(order[2], order[1])
+
+    def test_deep_chain(self):
+        graph = {vertex: [vertex + 1] for vertex in range(100000)}
+        self.assertEqual(len(get_components(graph)), 100000)
+
+
+class RecursionTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.nodes = load('test_recursion.json')
+        for address, stack in {1001: 8, 1002: 8, 1003: 4, 1004: 32, 1006: 16}.items():
+            cls.nodes[address]['stack'] = stack
+        cls.analyzer = StackAnalyzer(cls.nodes)
+
+    def test_roots(self):
+        self.assertEqual(self.analyzer.get_roots(), [1002, 2002, 3001, 4001])
+
+    def test_no_recursion(self):
+        result = self.analyzer.get_worst(1001)
+        self.assertEqual(result, {'depth': 2, 'stack': 24, 'recursion': False,
+            'path': [1001, 1006]})
+
+    def test_indirect_recursion(self):
+        result = self.analyzer.get_worst(1002)
+        self.assertEqual(result['depth'], 6)
+        self.assertEqual(result['stack'], 68)
+        self.assertTrue(result['recursion'])
+        self.assertEqual(result['path'], [1002, 1003, 1004, 1001, 1006])
+        self.assertEqual(sorted(self.analyzer.get_cycle(1005)), [1004, 1005])
+        self.assertEqual(self.analyzer.get_cycle(1003), [])
+
+    def test_direct_recursion(self):
+        self.assertEqual(self.analyzer.get_cycle(3001), [3001])
+        self.assertTrue(self.analyzer.get_worst(3001)['recursion'])
+
+        self.assertEqual(self.analyzer.get_cycle(4001), [])
+        self.assertEqual(self.analyzer.get_cycle(4002), [4002])
+        self.assertTrue(self.analyzer.get_worst(4001)['recursion'])
+        self.assertEqual(self.analyzer.get_worst(4001)['depth'], 2)
+
+
+class IndirectTestCase(unittest.TestCase):
+
+    def test_indirect(self):
+        """ Indirect calls are followed only when requested
+        """
+        nodes = {
+            1: {'name': 'main', 'type': ng.NodeType.function, 'root': True,
+                'branch': [2], 'indirect': [3, 2], 'stack': 8},
+            2: {'name': 'Direct', 'type': ng.NodeType.function, 'root': False,
+                'branch': [], 'stack': 16},
+            3: {'name': 'Handler', 'type': ng.NodeType.function, 'root': True,
+                'branch': [], 'stack': 64},
+            }
+        self.assertEqual(StackAnalyzer(nodes).get_worst(1)['path'], [1, 2])
+        analyzer = StackAnalyzer(nodes, indirect=True)
+        self.assertEqual(analyzer.graph[1], [2, 3])
+        self.assertEqual(analyzer.get_worst(1)['stack'], 72)
+        self.assertEqual(analyzer.get_worst_path(1), [1, 3])
+
+
+class LayerTestCase(unittest.TestCase):
+
+    def test_shared_callees(self):
+        """ Shared callees are evaluated once, rather than once per path
+        """
+        analyzer = StackAnalyzer(get_layers(200))
+        result = analyzer.get_worst(0)
+        self.assertEqual(result['depth'], 200)
+        self.assertEqual(result['stack'], 8 * 199)
+        self.assertFalse(result['recursion'])
+        self.assertEqual(result['path'], [0] + [2 * layer + 1 for layer in range(1, 200)])
+
+    def test_match_converter(self):
+        """ Depth must match the deepest level of the converter's call graph
+        """
+        nodes = get_layers(8)
+        graph = conv.Converter()
+        graph.set_nodes(nodes)
+        graph.to_call_list()
+
+        def get_level(node):
+            return max([node['level']] + [get_level(child)
+                for key, child in node.items() if isinstance(key, int)])
+
+        analyzer = StackAnalyzer(nodes)
+        for key, node in graph.get_graph().items():
+            self.assertEqual(get_level(node) + 1, analyzer.get_worst(key)['depth'])
+
+
+unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+
+import node_generator as ng
+import stack_usage as su
+
+
+MAIN_SU = """main.c:12:5:main\t16\tstatic
+main.c:30:13:helper\t8\tstatic
+C:\\work\\app\\main.c:42:6:cmd_a\t40\tdynamic
+"""
+
+DRIVER_SU = """driver.cpp:8:5:int sensor::HTS221::read(int)\t24\tdynamic,bounded
+driver.cpp:20:13:helper\t32\tstatic
+driver.cpp:25:6:void std::vector<int, std::allocator<int> >::push(int)\t12\tstatic
+"""
+
+
+class ParseTestCase(unittest.TestCase):
+
+    def test_parse_line(self):
+        self.assertEqual(su.parse_line("main.c:12:5:main\t16\tstatic\n"),
+            ("main.c", "main", 16, su.StackQualifier.static))
+        self.assertEqual(su.parse_line("main.c:12:main\t16\tdynamic"),
+            ("main.c", "main", 16, su.StackQualifier.dynamic))
+        self.assertEqual(su.parse_line("C:\\app\\main.c:42:6:cmd_a\t40\tdynamic,bounded"),
+            ("C:\\app\\main.c", "cmd_a", 40, su.StackQualifier.bounded))
+        self.assertEqual(su.parse_line("a.cpp:8:5:int ns::f(int)\t24\tstatic")[1],
+            "int ns::f(int)")
+
+        self.assertIsNone(su.parse_line(""))
+        self.assertIsNone(su.parse_line("main.c:12:5:main\tsixteen\tstatic"))
+        self.assertIsNone(su.parse_line("main\t16\tstatic"))
+
+    def test_unit(self):
+        self.assertEqual(su.get_unit("main.c"), "main")
+        self.assertEqual(su.get_unit("C:\\app\\drivers\\driver.cpp"), "driver")
+        self.assertEqual(su.get_unit("../src/main.c"), "main")
+        self.assertEqual(su.get_unit("startup_stm32.o"), "startup_stm32")
+
+    def test_function_name(self):
+        self.assertEqual(su.get_function_name("main"), "main")
+        self.assertEqual(su.get_function_name("helper.isra.0"), "helper.isra.0")
+        self.assertEqual(su.get_function_name("int sensor::HTS221::read(int)"),
+            "sensor::HTS221::read(int)")
+        self.assertEqual(su.get_function_name("sensor::HTS221::read(int)"),
+            "sensor::HTS221::read(int)")
+        self.assertEqual(su.get_function_name("unsigned int f(char)"), "f(char)")
+        self.assertEqual(su.get_function_name("const char* Foo::name() const"),
+            "Foo::name() const")
+        self.assertEqual(su.get_function_name(
+            "void std::vector<int, std::allocator<int> >::push(int)"),
+            "std::vector<int, std::allocator<int> >::push(int)")
+        self.assertEqual(su.get_function_name("void* operator new(unsigned int)"),
+            "operator new(unsigned int)")
+        self.assertEqual(su.get_function_name("readByte(int) [clone .isra.0]"),
+            "readByte(int)")
+
+
+class StackUsageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """ Run before each test
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = Path(self.directory.name)
+        self.build = self.root / 'build'
+        (self.build / 'drivers').mkdir(parents=True)
+        (self.build / 'main.su').write_text(MAIN_SU)
+        (self.build / 'drivers' / 'driver.su').write_text(DRIVER_SU)
+        self.output = self.root / 'output'
+
+    def tearDown(self):
+        """ Run after each test
+        """
+        self.directory.cleanup()
+
+    def test_load(self):
+        usage = su.StackUsage(self.build, self.output)
+        usage.load()
+        self.assertEqual(usage.parsed, 2)
+        self.assertEqual(len(usage.frames), 6)
+        self.assertEqual(usage.get_frame("main"), (16, su.StackQualifier.static))
+        self.assertEqual(usage.get_frame("sensor::HTS221::read(int)"),
+            (24, su.StackQualifier.bounded))
+        self.assertIsNone(usage.get_frame("missing"))
+
+        # Static functions of the same name are told apart by source file,
+        # otherwise the largest frame is used
+        self.assertEqual(usage.get_frame("helper", "main.c"), (8, su.StackQualifier.static))
+        self.assertEqual(usage.get_frame("helper", "driver.cpp"), (32, su.StackQualifier.static))
+        self.assertEqual(usage.get_frame("helper"), (32, su.StackQualifier.static))
+        self.assertEqual(usage.get_frame("helper", "other.c"), (32, su.StackQualifier.static))
+        self.assertEqual(usage.get_frame("cmd_a", "main.c"), (40, su.StackQualifier.dynamic))
+
+    def test_cache(self):
+        usage = su.StackUsage([self.build], self.output)
+        usage.load()
+        self.assertTrue((self.output / 'stack_usage.cache.json').exists())
+
+        usage = su.StackUsage([self.build], self.output)
+        usage.load()
+        self.assertEqual(usage.parsed, 0)
+        self.assertEqual(usage.get_frame("cmd_a"), (40, su.StackQualifier.dynamic))
+
+        # Only the modified file is parsed again
+        filename = self.build / 'main.su'
+        filename.write_text(MAIN_SU.replace("\t40\t", "\t48\t"))
+        status = filename.stat()
+        os.utime(filename, ns=(status.st_atime_ns, status.st_mtime_ns + 1000000000))
+
+        usage = su.StackUsage([self.build], self.output)
+        usage.load()
+        self.assertEqual(usage.parsed, 1)
+        self.assertEqual(usage.get_frame("cmd_a"), (48, su.StackQualifier.dynamic))
+
+    def test_jobs(self):
+        expected = su.StackUsage(self.build, self.output)
+        expected.load()
+
+        result = su.StackUsage(self.build, self.root / 'jobs', jobs=2)
+        result.load()
+        self.assertEqual(expected.frames, result.frames)
+        self.assertEqual(expected.names, result.names)
+
+    def test_nodes(self):
+        nodes = ng.Node(stack_path=[self.build], output_path=self.output)
+        nodes.nodes = {
+            0x100: {'name': 'main', 'type': ng.NodeType.function},
+            0x200: {'name': 'sensor::HTS221::read(int)', 'type': ng.NodeType.function},
+            0x300: {'name': 'version', 'type': ng.NodeType.obj},
+            0x400: {'name': 'helper', 'type': ng.NodeType.function, 'unit': 'main.c'},
+            0x500: {'name': 'helper', 'type': ng.NodeType.function, 'unit': 'driver.cpp'},
+            }
+        self.assertEqual(nodes.set_stack_usage(), 4)
+        self.assertEqual(nodes.nodes[0x100]['stack'], 16)
+        self.assertEqual(nodes.nodes[0x100]['stack_qualifier'], su.StackQualifier.static)
+        self.assertEqual(nodes.nodes[0x200]['stack'], 24)
+        self.assertFalse('stack' in nodes.nodes[0x300])
+        self.assertEqual(nodes.nodes[0x400]['stack'], 8)
+        self.assertEqual(nodes.nodes[0x500]['stack'], 32)
+
+
+unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import tempfile
+
+import node_generator as ng
+from transcript_generator import Transcript, TranscriptNode, encode_bl
+
+
+class TranscriptTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.transcript = Transcript(300, handlers=8, tables=4)
+        cls.node = TranscriptNode(cls.transcript)
+        cls.node.build()
+        cls.node.link()
+
+    def test_encode_bl(self):
+        # As recorded in test_node_generator.dis.txt
+        self.assertEqual(encode_bl(0x8000100, 0x800010c), (0xf000, 0xf804))
+        self.assertEqual(encode_bl(0x800010e, 0x8000124), (0xf000, 0xf809))
+
+    def test_deterministic(self):
+        other = Transcript(300, handlers=8, tables=4)
+        self.assertEqual(list(other.get_disassembly()), list(self.transcript.get_disassembly()))
+        other = Transcript(300, handlers=8, tables=4, seed=1)
+        self.assertNotEqual(other.calls, self.transcript.calls)
+
+    def test_build(self):
+        functions = [key for key, node in self.node.nodes.items()
+                     if node['type'] == ng.NodeType.function]
+        self.assertEqual(functions, self.transcript.addresses)
+        for key, size in zip(self.transcript.addresses, self.transcript.sizes):
+            self.assertEqual(self.node.nodes[key]['size'], size)
+        self.assertEqual(self.node.nodes[0x08000000]['type'], ng.NodeType.vector_table)
+
+    def test_branches(self):
+        """ Each function branches to the functions it calls
+        """
+        addresses = self.transcript.addresses
+        for index, key in enumerate(addresses):
+            expected = list(dict.fromkeys(addresses[call] for call in self.transcript.calls[index]))
+            self.assertEqual(self.node.nodes[key]['branch'], expected)
+
+        handlers = [addresses[0], addresses[-1]] + [addresses[handler] for handler
+                                                     in self.transcript.handlers]
+        self.assertEqual(self.node.nodes[0x08000000]['branch'], handlers)
+
+    def test_pointers(self):
+        """ Functions calling through a dispatch table load its entry
+        """
+        for index, pointer in enumerate(self.transcript.pointers):
+            key = self.transcript.addresses[index]
+            if pointer is None:
+                self.assertFalse(key in self.node.function)
+            else:
+                entry = self.transcript.get_table_entry(*pointer)
+                self.assertEqual(self.node.function[key], [entry])
+                table = self.transcript.tables[pointer[0]]
+                self.assertEqual(self.node.dispatch_table[entry]['function'],
+                                 self.transcript.addresses[table[pointer[1]]])
+
+        self.assertEqual(self.node.reference[self.transcript.reference_address],
+                         self.transcript.table_addresses)
+
+    def test_indirect(self):
+        """ Calls through an entry resolve to its function, through the
+            first entry to any function of the table
+        """
+        addresses = self.transcript.addresses
+        for index, pointer in enumerate(self.transcript.pointers):
+            node = self.node.nodes[addresses[index]]
+            if pointer is None:
+                self.assertFalse('indirect' in node)
+                continue
+            table, entry = pointer
+            functions = self.transcript.tables[table]
+            if entry != 0:
+                functions = [functions[entry]]
+            self.assertEqual(node['indirect'],
+                             list(dict.fromkeys(addresses[function] for function in functions)))
+
+    def test_call_sites(self):
+        """ Each blx resolves through the entry loaded from the literal
+            pool, as the loads of test_indirect
+        """
+        addresses = self.transcript.addresses
+        sites = {}
+        for index, pointer in enumerate(self.transcript.pointers):
+            if pointer is not None:
+                site = addresses[index] + 2 + 4 * len(self.transcript.calls[index]) + 2
+                sites[site] = self.node.nodes[addresses[index]]['indirect']
+        self.assertEqual(self.node.call_sites, sites)
+
+    def test_shards(self):
+        """ Address ranges are generated as objdump limits its output
+        """
+        node = TranscriptNode(self.transcript, jobs=3)
+        node.build()
+        node.link()
+        self.assertEqual(node.nodes, self.node.nodes)
+        self.assertEqual(node.dispatch_table, self.node.dispatch_table)
+        self.assertEqual(node.call_sites, self.node.call_sites)
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.transcript.save(directory)
+            node = TranscriptNode(self.transcript, directory)
+            node.build()
+            node.link()
+        self.assertEqual(node.nodes, self.node.nodes)
+
+
+unittest.main()
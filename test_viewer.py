@@ -0,0 +1,83 @@
+import unittest
+import json
+import sys
+
+import converter as conv
+import viewer as view
+from stack_checker import StackChecker
+
+
+class SourceTestCase(unittest.TestCase):
+    """ A fully expanded graph and a converter must serve the same nodes
+    """
+    @classmethod
+    def setUpClass(cls):
+        """ Run one-time before any testing is performed in this class
+        """
+        cls.converter = conv.Converter()
+        cls.converter.load("test_recursion.json")
+        with open("test_recursion.expected.json", 'r') as handle:
+            cls.graph = view.GraphSource(json.load(handle))
+
+    def walk(self, source, nodes, path):
+        """ Returns every (path, node) pair below a path
+        """
+        result = []
+        for node in nodes:
+            node_path = path + [node['address']]
+            result.append((view.get_item(node_path), node))
+            self.assertEqual(source.has_children(node_path),
+                len(source.get_children(node_path)) > 0)
+            result += self.walk(source, source.get_children(node_path), node_path)
+        return result
+
+    def test_sources(self):
+        def strip(node):
+            return {key: value for key, value in node.items() if isinstance(key, str)
+                    and not key.isdigit()}
+
+        expected = [(item, strip(node)) for item, node in
+                    self.walk(self.graph, self.graph.get_roots(), [])]
+        result = [(item, strip(node)) for item, node in
+                  self.walk(self.converter, self.converter.get_roots(), [])]
+        self.assertEqual(sorted(expected, key=lambda pair: pair[0]),
+                         sorted(result, key=lambda pair: pair[0]))
+
+    def test_nodes(self):
+        """ The node list rebuilt from a graph must find the same paths
+        """
+        expected = view.SearchIndex(self.converter.get_nodes())
+        result = view.SearchIndex(self.graph.get_nodes())
+        for address in [1001, 1006, 2005, 3001, 4002]:
+            self.assertEqual(sorted(expected.paths_to(address)),
+                             sorted(result.paths_to(address)))
+
+    def test_items(self):
+        self.assertEqual(view.get_item([1002, 1003, 1004]), "1002/1003/1004")
+        self.assertEqual(view.get_path("1002/1003/1004"), [1002, 1003, 1004])
+
+
+class OptionTestCase(unittest.TestCase):
+
+    def parse(self, *options):
+        """ Returns the options of a stack_checker command line
+        """
+        argv = sys.argv
+        sys.argv = ['stack_checker.py', '-i', 'test_recursion.json'] + list(options)
+        try:
+            stack = StackChecker()
+            stack.cli()
+        finally:
+            sys.argv = argv
+        return stack
+
+    def test_prune(self):
+        """ Pruning collapsed items is an option of stack_checker too
+        """
+        self.assertFalse(self.parse().prune)
+        stack = self.parse('--prune')
+        self.assertTrue(stack.prune)
+        self.assertTrue(stack.get_options()['prune'])
+
+
+unittest.main()
@@ -0,0 +1,283 @@
+""" Generates synthetic objdump transcripts of an ARM Cortex-M firmware
+    image, so the parsers can be measured at any scale without an ARM
+    toolchain or a real ELF file.
+
+    The image holds a vector table, Thumb functions calling each other with
+    BL, functions calling through a dispatch table entry loaded from their
+    literal pool, dispatch tables and tables referencing them. The same
+    parameters always produce the same transcripts.
+
+    python transcript_generator.py -n 100000 -o synthetic
+"""
+import argparse
+import random
+from pathlib import Path
+
+import node_generator as ng
+
+
+STACK_POINTER = 0x20020000
+VECTOR_BASE = 0x08000000
+STACK_VECTORS = 16 # Reset, faults and system handlers, Cortex-M
+
+MODULES = ['HAL_UART', 'HAL_I2C', 'HAL_SPI', 'HAL_DMA', 'HAL_GPIO', 'HAL_TIM',
+           'HAL_RCC', 'HAL_ADC', 'Sensor', 'Motor', 'Comms', 'Storage', 'Shell']
+ACTIONS = ['Init', 'DeInit', 'Start', 'Stop', 'Transmit', 'Receive', 'Config',
+           'Read', 'Write', 'Process', 'Callback', 'Update', 'Reset']
+
+
+def encode_bl(address, target):
+    """ Returns the two halfwords of a Thumb BL instruction
+    """
+    offset = ((target - address - 4) >> 1) & 0xFFFFFF
+    sign = offset >> 23
+    j1 = ~((offset >> 22) ^ sign) & 1
+    j2 = ~((offset >> 21) ^ sign) & 1
+    return (0xF000 | (sign << 10) | ((offset >> 11) & 0x3FF),
+            0xD000 | (j1 << 13) | (j2 << 11) | (offset & 0x7FF))
+
+
+class Transcript:
+    """ Layout of a synthetic image, and the objdump transcripts describing
+        it.
+
+        functions: number of functions
+        handlers: number of interrupt handlers, listed in the vector table
+        tables: number of dispatch tables, one per 100 functions by default
+    """
+    def __init__(self, functions=1000, handlers=64, tables=None, seed=0):
+        rng = random.Random(seed)
+        functions = max(functions, 2)
+        handlers = min(handlers, functions - 2)
+        if tables is None:
+            tables = max(functions // 100, 1)
+
+        self.vector_size = 4 * (1 + STACK_VECTORS + handlers)
+        self.text_base = (VECTOR_BASE + self.vector_size + 0xFF) & ~0xFF
+
+        # Each function's name, calls (function indices) and optional
+        # dispatch table entry (table index, entry index) called through
+        self.names = ['Reset_Handler', 'main']
+        for index in range(2, functions):
+            name = rng.choice(MODULES) + '_' + rng.choice(ACTIONS) + str(index)
+            if index < handlers + 2:
+                name = name + '_IRQHandler'
+            self.names.append(name)
+
+        self.calls = [[1], []]
+        self.pointers = [None, None]
+        for index in range(2, functions):
+            calls = []
+            for _ in range(rng.choice((0, 0, 1, 1, 2, 2, 3, 4))):
+                if rng.random() < 0.01:
+                    # Recursion, direct or through a caller
+                    calls.append(rng.randint(2, index))
+                elif index + 1 < functions:
+                    # Callees are nearby, as the linker places a module's
+                    # functions together
+                    calls.append(rng.randint(index + 1, min(index + 64, functions - 1)))
+            self.calls.append(calls)
+            self.pointers.append(None)
+
+        # main calls into every module
+        self.calls[1] = sorted(rng.sample(range(2, functions), min(8, functions - 2)))
+
+        self.tables = []
+        for _ in range(tables):
+            self.tables.append([rng.randint(2, functions - 1)
+                                for _ in range(rng.randint(2, 8))])
+        for index in range(2, functions):
+            if rng.random() < 0.1:
+                table = rng.randrange(tables)
+                self.pointers[index] = (table, rng.randrange(len(self.tables[table])))
+
+        self.handlers = list(range(2, 2 + handlers))
+
+        # Function addresses and sizes
+        self.addresses = []
+        self.sizes = []
+        address = self.text_base
+        for index in range(functions):
+            size = 2 + 4 * len(self.calls[index]) + 2
+            if self.pointers[index] is not None:
+                size += 4
+            size = (size + 3) & ~3
+            if self.pointers[index] is not None:
+                size += 4 # literal pool
+            self.addresses.append(address)
+            self.sizes.append(size)
+            address += size
+
+        # Dispatch tables, then one table referencing each dispatch table
+        self.rodata_base = (address + 0xFF) & ~0xFF
+        self.table_addresses = []
+        address = self.rodata_base
+        for table in self.tables:
+            self.table_addresses.append(address)
+            address += 4 * len(table)
+        self.reference_address = address
+
+    def get_table_entry(self, table, entry):
+        return self.table_addresses[table] + 4 * entry
+
+    def get_objects(self):
+        """ Returns (address, name, words) of each object in .rodata
+        """
+        objects = []
+        for number, table in enumerate(self.tables):
+            objects.append((self.table_addresses[number], 'dispatch_table' + str(number),
+                            [self.addresses[function] | 1 for function in table]))
+        objects.append((self.reference_address, 'table_refs', list(self.table_addresses)))
+        return objects
+
+    def get_vectors(self):
+        """ Returns the words of the vector table
+        """
+        words = [STACK_POINTER, self.addresses[0] | 1]
+        words += [self.addresses[-1] | 1] * (STACK_VECTORS - 1)
+        words += [self.addresses[handler] | 1 for handler in self.handlers]
+        return words
+
+    def get_symbols(self):
+        """ Yields the lines of objdump --syms
+        """
+        yield b'synthetic.elf:     file format elf32-littlearm'
+        yield b''
+        yield b'SYMBOL TABLE:'
+        yield b'%08x l    d  .isr_vector\t00000000 .isr_vector' % VECTOR_BASE
+        yield b'%08x l    d  .text\t00000000 .text' % self.text_base
+        yield b'%08x l    d  .rodata\t00000000 .rodata' % self.rodata_base
+        yield b'00000000 l    df *ABS*\t00000000 synthetic.o'
+        for index, name in enumerate(self.names):
+            scope = b'l' if index % 7 == 6 else b'g'
+            yield b'%08x %s     F .text\t%08x %s' % (
+                self.addresses[index], scope, self.sizes[index], name.encode())
+        for address, name, words in self.get_objects():
+            yield b'%08x g     O .rodata\t%08x %s' % (address, 4 * len(words), name.encode())
+        yield b'%08x g     O .isr_vector\t%08x g_pfnVectors' % (VECTOR_BASE, self.vector_size)
+
+    def get_function(self, index):
+        """ Yields the disassembly lines of a function
+        """
+        address = self.addresses[index]
+        yield b''
+        yield b'%08x <%s>:' % (address, self.names[index].encode())
+        yield b' %7x:\tb510      \tpush\t{r4, lr}' % address
+        address += 2
+        for call in self.calls[index]:
+            first, second = encode_bl(address, self.addresses[call])
+            yield b' %7x:\t%04x %04x \tbl\t%x <%s>' % (address, first, second,
+                self.addresses[call], self.names[call].encode())
+            address += 4
+
+        pointer = self.pointers[index]
+        if pointer is not None:
+            literal = self.addresses[index] + self.sizes[index] - 4
+            offset = literal - ((address + 4) & ~3)
+            yield b' %7x:\t%04x      \tldr\tr3, [pc, #%d]\t; (%x <%s+0x%x>)' % (
+                address, 0x4B00 | (offset >> 2), offset, literal,
+                self.names[index].encode(), literal - self.addresses[index])
+            yield b' %7x:\t4798      \tblx\tr3' % (address + 2)
+            address += 4
+
+        yield b' %7x:\tbd10      \tpop\t{r4, pc}' % address
+        address += 2
+        if address % 4:
+            yield b' %7x:\tbf00      \tnop' % address
+            address += 2
+        if pointer is not None:
+            yield b' %7x:\t%08x \t.word\t0x%08x' % ((address,) + (self.get_table_entry(*pointer),) * 2)
+
+    def get_words(self, address, name, words):
+        """ Yields the disassembly lines of an object, as objdump
+            --disassemble-all decodes data
+        """
+        yield b''
+        yield b'%08x <%s>:' % (address, name.encode())
+        for offset, word in enumerate(words):
+            yield b' %7x:\t%08x \tstmdaeq\tr0, {r0}' % (address + 4 * offset, word)
+
+    def get_disassembly(self, start=None, stop=None):
+        """ Yields the lines of objdump --disassemble-all, optionally limited
+            to the nodes in the address range [start, stop)
+        """
+        def selected(address):
+            return ((start is None or address >= start) and
+                    (stop is None or address < stop))
+
+        yield b''
+        yield b'synthetic.elf:     file format elf32-littlearm'
+        yield b''
+        yield b''
+        yield b'Disassembly of section .isr_vector:'
+        if selected(VECTOR_BASE):
+            yield from self.get_words(VECTOR_BASE, 'g_pfnVectors', self.get_vectors())
+
+        yield b''
+        yield b'Disassembly of section .text:'
+        for index, address in enumerate(self.addresses):
+            if selected(address):
+                yield from self.get_function(index)
+
+        yield b''
+        yield b'Disassembly of section .rodata:'
+        for address, name, words in self.get_objects():
+            if selected(address):
+                yield from self.get_words(address, name, words)
+
+    def save(self, path):
+        """ Writes the transcripts to path/synthetic.syms.txt and
+            path/synthetic.dis.txt
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for suffix, lines in (('.syms.txt', self.get_symbols()),
+                              ('.dis.txt', self.get_disassembly())):
+            with open(path / ('synthetic' + suffix), 'wb') as handle:
+                for line in lines:
+                    handle.write(line + b'\n')
+
+
+class TranscriptNode(ng.Node):
+    """ Sources objdump output from a synthetic transcript. Transcripts
+        saved to files are streamed from them, as from objdump.
+    """
+    def __init__(self, transcript, path=None, **kwargs):
+        super().__init__(vector='g_pfnVectors', symbol_reader='objdump', **kwargs)
+        self.transcript = transcript
+        self.path = Path(path) if path is not None else None
+
+    def read(self, suffix):
+        with open(self.path / ('synthetic' + suffix), 'rb') as handle:
+            for line in handle:
+                yield line.rstrip(b'\r\n')
+
+    def get_symbols(self):
+        if self.path is not None:
+            return self.read('.syms.txt')
+        return self.transcript.get_symbols()
+
+    def get_disassembly(self, start=None, stop=None):
+        if self.path is not None and start is None and stop is None:
+            return self.read('.dis.txt')
+        return self.transcript.get_disassembly(start, stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write synthetic objdump transcripts of an ARM firmware image.")
+    parser.add_argument('-n', '--functions', type=int, default=1000,
+        help="Number of functions")
+    parser.add_argument('-ih', '--handlers', type=int, default=64,
+        help="Number of interrupt handlers")
+    parser.add_argument('-s', '--seed', type=int, default=0,
+        help="Seed of the random layout")
+    parser.add_argument('-o', '--output_path', type=Path, default=Path('.'),
+        help="Directory to store the transcripts")
+    args = parser.parse_args()
+
+    Transcript(args.functions, args.handlers, seed=args.seed).save(args.output_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,25 +5,93 @@ import argparse
 import json
 from pathlib import Path
 
-import uuid
 import tkinter as tk
 from tkinter import ttk
 
+import binary_format
+from search_index import SearchIndex
+
+
+# Suffix of the item id standing in for the children of an unopened item
+PLACEHOLDER = '/'
+
+
+class GraphSource:
+    """ Serves the nodes of a fully expanded call graph (nested dictionary)
+        one level at a time, as Converter does from a flat node list
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def get_node(self, path):
+        """ Returns the node at the end of a path of addresses
+        """
+        node = self.graph
+        for address in path:
+            # Keys are strings when the graph was read from a JSON file
+            child = node.get(address)
+            node = child if child is not None else node[str(address)]
+        return node
+
+    def get_roots(self):
+        return list(self.graph.values())
+
+    def get_children(self, path):
+        return [child for child in self.get_node(path).values()
+                if isinstance(child, dict)]
+
+    def has_children(self, path):
+        return any(isinstance(child, dict) for child in self.get_node(path).values())
+
+    def get_nodes(self):
+        """ Returns a flat node list (name, type, root and branch) rebuilt
+            from the graph
+        """
+        nodes = {}
+        work = [(None, node) for node in self.graph.values()]
+        while work:
+            parent, node = work.pop()
+            address = node['address']
+            if not address in nodes:
+                nodes[address] = {'name': node['name'], 'type': node['type'],
+                                  'root': False, 'branch': []}
+            if parent is None:
+                nodes[address]['root'] = True
+            elif not address in nodes[parent]['branch']:
+                nodes[parent]['branch'].append(address)
+            work.extend((address, child) for child in node.values()
+                        if isinstance(child, dict))
+        return nodes
+
+
 class Viewer:
-    """ Displays a call graph from a nested dictionary
+    """ Displays a call graph from a nested dictionary, or from a Converter
+        expanding the graph as the user navigates
     """
     def __init__(self):
         self.infile = Path()
         self.call_stacks = {}
+        self.source = None
+        self.prune = False
 
     def set_graph(self, graph):
         """ Reference a call graph from a memory location
         """
         self.call_stacks = graph
+        self.source = None
+
+    def set_converter(self, converter):
+        """ Reference a converter, used to expand the call graph on request
+        """
+        self.source = converter
 
     def load(self):
-        """ Get call graph
+        """ Get call graph, JSON or binary
         """
+        if binary_format.is_binary(self.infile):
+            self.call_stacks = binary_format.load_graph(self.infile)
+            return
+
         with open(self.infile, 'r') as handle:
             self.call_stacks = json.load(handle)
         handle.close()
@@ -32,7 +100,10 @@ class Viewer:
     def show(self):
         """ Display call graph to user
         """
-        tk_tree_view(self.call_stacks)
+        source = self.source
+        if source is None:
+            source = GraphSource(self.call_stacks)
+        tk_tree_view(source, self.prune)
 
 
     def cli(self):
@@ -41,41 +112,148 @@ class Viewer:
         parser = argparse.ArgumentParser()
 
         parser.add_argument('-i', '--infile', 
-                            help="input file, JSON format", metavar="FILE",
+                            help="input file, JSON or binary format", metavar="FILE",
                             type=argparse.FileType('r', encoding='UTF-8'), 
                             required=True)
 
+        parser.add_argument('-p', '--prune', action='store_true',
+                            help="Remove the children of collapsed items")
+
         args = parser.parse_args()
 
         # Validate user input file is readable and close.
         args.infile.close()
 
         self.infile = Path(args.infile.name).absolute()
+        self.prune = args.prune
 
 
 
-def j_tree(tree, parent, dic):
-    """ Build the nested dictionary elements into a tree format
+def get_item(path):
+    """ Returns the tree item id of a path of addresses. An address may be
+        listed in several places of the tree, but each path is unique.
     """
-    for key, field in dic.items():
-        uid = uuid.uuid4()
-        if isinstance(dic[key], dict):
-            tree.insert(parent, 'end', uid, text=field['name'], value=(field['level'], field['recursion']))
-            j_tree(tree, uid, dic[key])
+    return '/'.join(str(address) for address in path)
 
 
-def tk_tree_view(data):
+def get_path(item):
+    """ Returns the path of addresses of a tree item id
+    """
+    return [int(address) for address in item.split('/')]
+
+
+def insert_nodes(tree, source, parent, nodes):
+    """ Inserts nodes into the tree below a parent item. Nodes with
+        branches get a placeholder child, so they can be opened.
+    """
+    path = get_path(parent) if parent else []
+    for node in nodes:
+        node_path = path + [node['address']]
+        item = get_item(node_path)
+        tree.insert(parent, 'end', item, text=node['name'],
+                    value=(node['level'], node['recursion']))
+        if source.has_children(node_path):
+            tree.insert(item, 'end', item + PLACEHOLDER, text='...')
+
+
+def open_item(tree, source, item):
+    """ Replaces the placeholder of an item with its children
+    """
+    if tree.exists(item + PLACEHOLDER):
+        tree.delete(item + PLACEHOLDER)
+        insert_nodes(tree, source, item, source.get_children(get_path(item)))
+
+
+def close_item(tree, item):
+    """ Replaces the children of an item with a placeholder, bounding the
+        number of items held by the tree
+    """
+    children = tree.get_children(item)
+    if children and not tree.exists(item + PLACEHOLDER):
+        tree.delete(*children)
+        tree.insert(item, 'end', item + PLACEHOLDER, text='...')
+
+
+def reveal_path(tree, source, path):
+    """ Opens each item along a path, then selects the last item. Stops at
+        the deepest item found, should the path be cut short by recursion.
+    """
+    item = get_item(path[:1])
+    for length in range(2, len(path) + 1):
+        open_item(tree, source, item)
+        tree.item(item, open=True)
+        child = get_item(path[:length])
+        if not tree.exists(child):
+            break
+        item = child
+
+    tree.selection_set(item)
+    tree.focus(item)
+    tree.see(item)
+
+
+def tk_search_view(frame, tree, source):
+    """ Adds a search field, listing the functions matching the text typed
+        and the call paths leading to the selected function
+    """
+    index = []
+    matches = []
+    paths = []
+
+    query = tk.StringVar()
+    entry = ttk.Entry(frame, textvariable=query)
+    entry.pack(fill=tk.X)
+    match_list = tk.Listbox(frame, height=6, exportselection=False)
+    match_list.pack(side='left', fill=tk.BOTH, expand=1)
+    path_list = tk.Listbox(frame, height=6, exportselection=False)
+    path_list.pack(side='left', fill=tk.BOTH, expand=1)
+
+    def get_index():
+        # Built on the first search, the tree is shown without waiting
+        if not index:
+            index.append(SearchIndex(source.get_nodes()))
+        return index[0]
+
+    def on_query(*args):
+        matches[:] = get_index().find(query.get())
+        match_list.delete(0, tk.END)
+        match_list.insert(tk.END, *(name for name, address in matches))
+        paths.clear()
+        path_list.delete(0, tk.END)
+
+    def on_match(event):
+        selection = match_list.curselection()
+        if selection:
+            search = get_index()
+            paths[:] = search.paths_to(matches[selection[0]][1])
+            path_list.delete(0, tk.END)
+            path_list.insert(tk.END, *(' > '.join(search.nodes[address]['name']
+                                       for address in path) for path in paths))
+
+    def on_path(event):
+        selection = path_list.curselection()
+        if selection:
+            reveal_path(tree, source, paths[selection[0]])
+
+    query.trace_add('write', on_query)
+    match_list.bind('<<ListboxSelect>>', on_match)
+    path_list.bind('<<ListboxSelect>>', on_path)
+
+
+def tk_tree_view(source, prune=False):
     """ Initialize how the call graph will be visually displayed
     """
     # Setup the root UI
     root = tk.Tk()
     root.title("Call Graph")
     root.columnconfigure(0, weight=1)
-    root.rowconfigure(0, weight=1)
+    root.rowconfigure(1, weight=1)
 
     # Setup the Frames
+    search_frame = ttk.Frame(root, padding="3")
+    search_frame.grid(row=0, column=0, sticky=tk.EW)
     tree_frame = ttk.Frame(root, padding="3")
-    tree_frame.grid(row=0, column=0, sticky=tk.NSEW)
+    tree_frame.grid(row=1, column=0, sticky=tk.NSEW)
 
     # Setup the Tree
     style = ttk.Style()
@@ -101,10 +279,16 @@ def tk_tree_view(data):
     tree.configure(yscrollcommand=vsb.set)
 
 
-    # Fill tree with data
-    j_tree(tree, '', data)
+    # Fill tree with the root nodes, children are inserted as items are
+    # opened
+    insert_nodes(tree, source, '', source.get_roots())
+    tree.bind('<<TreeviewOpen>>', lambda event: open_item(tree, source, tree.focus()))
+    if prune:
+        tree.bind('<<TreeviewClose>>', lambda event: close_item(tree, tree.focus()))
     tree.pack(fill=tk.BOTH, expand=1)
 
+    tk_search_view(search_frame, tree, source)
+
     # Limit windows minimum dimensions
     root.update_idletasks()
     root.minsize(2 * root.winfo_reqwidth(), root.winfo_reqheight())